@@ -0,0 +1,101 @@
+"""
+Coalesced tracking of when a signed-in user was last active.
+
+``UserActivityMiddleware`` needs the time of a user's last request to log out
+inactive sessions, but writing it on every request makes every page view and
+AJAX cart call save the session. The tracker only persists a new timestamp
+once the stored one is ``USER_ACTIVITY_GRANULARITY`` seconds old.
+
+``USER_ACTIVITY_STORE`` picks where timestamps are kept:
+
+    "session"  In the session, as before, but written at most once per
+               granularity period
+    "cache"    One integer per session key in the default cache, so tracking
+               activity never saves the session; the cache must be shared
+               by all worker processes
+"""
+
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+
+SESSION_KEY = "last_activity"
+CACHE_KEY_PREFIX = "user_activity"
+
+
+class SessionActivityStore:
+    """Timestamps kept in the session, as ISO 8601 strings"""
+
+    def get(self, request):
+        value = request.session.get(SESSION_KEY)
+        return datetime.datetime.fromisoformat(value) if value else None
+
+    def set(self, request, when):
+        request.session[SESSION_KEY] = when.isoformat()
+
+
+class CacheActivityStore:
+    """Timestamps kept in the cache as epoch seconds, keyed by session"""
+
+    def key(self, request):
+        return f"{CACHE_KEY_PREFIX}:{request.session.session_key}"
+
+    def get(self, request):
+        if not request.session.session_key:
+            return None
+        value = cache.get(self.key(request))
+        if value is None:
+            return None
+        return datetime.datetime.fromtimestamp(value, tz=datetime.timezone.utc)
+
+    def set(self, request, when):
+        if request.session.session_key:
+            # Outlive any session, so a missing entry never hides inactivity
+            cache.set(
+                self.key(request), int(when.timestamp()), settings.SESSION_COOKIE_AGE
+            )
+
+
+STORES = {
+    "session": SessionActivityStore,
+    "cache": CacheActivityStore,
+}
+
+
+class ActivityTracker:
+    """Reads and coalesces the last activity time of a request's session"""
+
+    def __init__(self, store=None, granularity=None):
+        self.store = STORES[store or settings.USER_ACTIVITY_STORE]()
+        self.granularity = datetime.timedelta(
+            seconds=(
+                settings.USER_ACTIVITY_GRANULARITY
+                if granularity is None
+                else granularity
+            )
+        )
+
+    def last_activity(self, request):
+        return self.store.get(request)
+
+    def is_inactive(self, last, timeout, now):
+        """
+        Whether a session last active at ``last`` has been idle too long.
+
+        The stored time can lag the real last request by up to the
+        granularity, which is allowed for so a session is never ended early.
+        """
+        return last is not None and now - last > timeout + self.granularity
+
+    def touch(self, request, last, now):
+        """
+        Record activity at ``now`` unless ``last`` is within the granularity.
+
+        Returns:
+            bool: Whether a new time was written
+        """
+        if last is not None and now - last < self.granularity:
+            return False
+        self.store.set(request, now)
+        return True
@@ -0,0 +1,127 @@
+"""
+Security header policies, built once per process.
+
+``build_header_policy`` turns the directives for the environment (production
+or development) into ready-made header strings when the middleware is
+loaded, so responses only copy strings. A CSP with a nonce is pieced
+together from a precomputed prefix and suffix, and the nonce itself is only
+generated when a template reads ``request.csp_nonce``: responses that never
+render an inline script, and all non-HTML responses, skip it entirely.
+"""
+
+import secrets
+from dataclasses import dataclass
+
+# Directives per environment, in header order
+CSP_DIRECTIVES = {
+    "production": {
+        "default-src": ["'self'"],
+        "script-src": ["'self'"],
+        "style-src": ["'self'"],
+        "img-src": ["'self'", "data:"],
+        "font-src": ["'self'"],
+        "connect-src": ["'self'"],
+        "frame-src": ["'none'"],
+        "object-src": ["'none'"],
+        "base-uri": ["'self'"],
+        "form-action": ["'self'"],
+    },
+    # More permissive for development
+    "development": {
+        "default-src": ["'self'"],
+        "script-src": [
+            "'self'",
+            "'unsafe-inline'",
+            "'unsafe-eval'",
+            "cdn.jsdelivr.net",
+        ],
+        "style-src": [
+            "'self'",
+            "'unsafe-inline'",
+            "fonts.googleapis.com",
+            "cdnjs.cloudflare.com",
+        ],
+        "img-src": ["'self'", "data:"],
+        "font-src": ["'self'", "fonts.gstatic.com", "cdnjs.cloudflare.com"],
+        "connect-src": ["'self'"],
+        "frame-src": ["'self'"],
+        "object-src": ["'none'"],
+    },
+}
+
+STATIC_HEADERS = {
+    # Limit information passed to other sites when navigating away
+    "Referrer-Policy": "strict-origin-when-cross-origin",
+    # Restrict browser features to mitigate risks
+    "Permissions-Policy": "camera=(), microphone=(), geolocation=()",
+}
+
+
+def _join(directives):
+    return (
+        "; ".join(f"{name} {' '.join(sources)}" for name, sources in directives.items())
+        + ";"
+    )
+
+
+@dataclass(frozen=True)
+class HeaderPolicy:
+    """Precomputed header values for one environment"""
+
+    csp: str
+    # The CSP with a nonce is csp_nonce_prefix + nonce + csp_nonce_suffix
+    csp_nonce_prefix: str
+    csp_nonce_suffix: str
+    static_headers: tuple
+
+    def csp_for(self, nonce=None):
+        """The CSP header, allowing scripts with ``nonce`` when one is given"""
+        if nonce is None:
+            return self.csp
+        return f"{self.csp_nonce_prefix}{nonce}{self.csp_nonce_suffix}"
+
+
+def build_header_policy(is_production):
+    directives = CSP_DIRECTIVES["production" if is_production else "development"]
+    marker = "\0"
+    with_nonce = dict(directives)
+    with_nonce["script-src"] = [f"'nonce-{marker}'", *directives["script-src"]]
+    prefix, suffix = _join(with_nonce).split(marker)
+    return HeaderPolicy(
+        csp=_join(directives),
+        csp_nonce_prefix=prefix,
+        csp_nonce_suffix=suffix,
+        static_headers=tuple(STATIC_HEADERS.items()),
+    )
+
+
+class LazyNonce:
+    """A CSP nonce that is only generated the first time it is read"""
+
+    def __init__(self):
+        self._value = None
+
+    @property
+    def generated(self):
+        return self._value is not None
+
+    def __str__(self):
+        if self._value is None:
+            self._value = secrets.token_urlsafe(32)
+        return self._value
+
+    def __html__(self):
+        return str(self)
+
+    def __eq__(self, other):
+        return str(self) == str(other)
+
+    def __hash__(self):
+        return hash(str(self))
+
+
+def wants_csp(response):
+    """Whether a response is an HTML page a browser will render"""
+    if 300 <= response.status_code < 400:
+        return False
+    return response.get("Content-Type", "").startswith("text/html")
@@ -1,9 +1,14 @@
 from django.utils import timezone
 from django.contrib.auth import logout
 from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from core import metrics
+from .activity import ActivityTracker
+from .headers import LazyNonce, build_header_policy, wants_csp
+from core.profiling import instrument, profile_request
 import datetime
 import logging
-import secrets
+import time
 
 logger = logging.getLogger("security")
 
@@ -13,38 +18,35 @@ class UserActivityMiddleware:
     Middleware to track user activity and automatically log out inactive users.
 
     This helps improve security by ensuring users are not left logged in
-    indefinitely if they are inactive for a certain period of time.
+    indefinitely if they are inactive for a certain period of time. Activity
+    is recorded through ``accounts.activity.ActivityTracker``, which only
+    writes when the stored time is older than USER_ACTIVITY_GRANULARITY.
     """
 
     def __init__(self, get_response):
         self.get_response = get_response
+        self.tracker = ActivityTracker()
 
     def __call__(self, request):
         if request.user.is_authenticated:
-            # Get the last activity time from the session
-            last_activity = request.session.get("last_activity")
+            now = timezone.now()
+            last_activity = self.tracker.last_activity(request)
 
             # Get the inactivity timeout from settings with a default of 30 minutes
             timeout_minutes = getattr(settings, "USER_INACTIVITY_TIMEOUT", 30)
+            timeout = datetime.timedelta(minutes=timeout_minutes)
 
-            if last_activity:
-                # Convert the string timestamp to datetime
-                last_activity_time = datetime.datetime.fromisoformat(last_activity)
+            # If the user has been inactive for too long, log them out
+            if self.tracker.is_inactive(last_activity, timeout, now):
+                logout(request)
+                logger.info(
+                    f"User {request.user.username} logged out due to inactivity after {timeout_minutes} minutes"
+                )
+                # Don't update the activity as they're being logged out
+                return self.get_response(request)
 
-                # Calculate time difference
-                time_elapsed = timezone.now() - last_activity_time
-
-                # If the user has been inactive for too long, log them out
-                if time_elapsed.total_seconds() > (timeout_minutes * 60):
-                    logout(request)
-                    logger.info(
-                        f"User {request.user.username} logged out due to inactivity after {timeout_minutes} minutes"
-                    )
-                    # Don't update the activity as they're being logged out
-                    return self.get_response(request)
-
-            # Update the last activity time
-            request.session["last_activity"] = timezone.now().isoformat()
+            # Update the last activity time, at most once per granularity
+            self.tracker.touch(request, last_activity, now)
 
         # Process the request
         response = self.get_response(request)
@@ -56,78 +58,45 @@ class SecurityHeadersMiddleware:
     Middleware to add security headers to all responses.
 
     This enhances security by setting headers that help protect against
-    common web vulnerabilities like XSS, clickjacking, etc.
+    common web vulnerabilities like XSS, clickjacking, etc. The header values
+    are built once, when the middleware is loaded (see accounts.headers), and
+    the Content Security Policy is only sent with HTML pages.
     """
 
     def __init__(self, get_response):
         self.get_response = get_response
+        self.policy = build_header_policy(getattr(settings, "IS_PRODUCTION", False))
 
     def __call__(self, request):
         response = self.get_response(request)
 
-        # Content Security Policy (CSP)
-        # This is a basic policy - in production, you should customize it
-        # based on your specific needs and third-party integrations
-        if not response.has_header("Content-Security-Policy"):
-            response["Content-Security-Policy"] = self._get_csp_policy()
-
-        # Referrer Policy
-        # Limit information passed to other sites when navigating away
-        if not response.has_header("Referrer-Policy"):
-            response["Referrer-Policy"] = "strict-origin-when-cross-origin"
+        # Content Security Policy (CSP), with a nonce if the page used one
+        if wants_csp(response) and not response.has_header("Content-Security-Policy"):
+            nonce = getattr(request, "csp_nonce", None)
+            used = isinstance(nonce, LazyNonce) and nonce.generated
+            response["Content-Security-Policy"] = self.policy.csp_for(
+                str(nonce) if used else None
+            )
 
-        # Permissions Policy (formerly Feature Policy)
-        # Restrict browser features to mitigate risks
-        if not response.has_header("Permissions-Policy"):
-            response["Permissions-Policy"] = "camera=(), microphone=(), geolocation=()"
+        # Referrer and Permissions policies
+        for header, value in self.policy.static_headers:
+            if not response.has_header(header):
+                response[header] = value
 
         # Add strict transport security header if not already set
         # This is now handled by SECURE_HSTS_SECONDS in settings.py
 
         return response
 
-    def _get_csp_policy(self):
-        """
-        Generate a Content Security Policy based on the environment.
-
-        In production, this should be carefully tailored to your application's needs.
-        """
-        is_production = getattr(settings, "IS_PRODUCTION", False)
-
-        if is_production:
-            # Stricter policy for production
-            return (
-                "default-src 'self'; "
-                "script-src 'self'; "
-                "style-src 'self'; "
-                "img-src 'self' data:; "
-                "font-src 'self'; "
-                "connect-src 'self'; "
-                "frame-src 'none'; "
-                "object-src 'none'; "
-                "base-uri 'self'; "
-                "form-action 'self';"
-            )
-        else:
-            # More permissive for development
-            return (
-                "default-src 'self'; "
-                "script-src 'self' 'unsafe-inline' 'unsafe-eval' cdn.jsdelivr.net; "
-                "style-src 'self' 'unsafe-inline' fonts.googleapis.com cdnjs.cloudflare.com; "
-                "img-src 'self' data:; "
-                "font-src 'self' fonts.gstatic.com cdnjs.cloudflare.com; "
-                "connect-src 'self'; "
-                "frame-src 'self'; "
-                "object-src 'none';"
-            )
-
 
 class CSPNonceMiddleware:
     """
-    Middleware that adds a random nonce to each request for Content Security Policy.
+    Middleware that adds a Content Security Policy nonce to each request.
 
     This allows using the nonce in CSP headers to authorize inline scripts
-    without using 'unsafe-inline', which is more secure.
+    without using 'unsafe-inline', which is more secure. The nonce is only
+    generated when something reads it, and SecurityHeadersMiddleware only
+    adds it to the policy of pages that did.
 
     To use the nonce in templates, use the {% csp_nonce request %} template tag:
     <script nonce="{% csp_nonce request %}">...</script>
@@ -137,24 +106,64 @@ class CSPNonceMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
-        # Generate a random nonce
-        nonce = secrets.token_urlsafe(32)
+        request.csp_nonce = LazyNonce()
+        return self.get_response(request)
 
-        # Attach the nonce to the request object
-        request.csp_nonce = nonce
 
-        # Get the response
-        response = self.get_response(request)
+class MetricsMiddleware:
+    """
+    Middleware recording request metrics for the /metrics endpoint.
 
-        # Update the CSP header with the nonce if it exists
-        if response.has_header("Content-Security-Policy"):
-            csp = response["Content-Security-Policy"]
+    Latency, status, SQL query count and time are recorded per view, along
+    with cache hits and misses. Staff users (and everyone when DEBUG is on)
+    also get a Server-Timing header, so browser dev tools show where the
+    time of a request went.
+    """
 
-            # Add the nonce to script-src and style-src
-            if "script-src" in csp:
-                csp = csp.replace("script-src", f"script-src 'nonce-{nonce}'")
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICS_ENABLED", True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        instrument()
 
-            # Update the header
-            response["Content-Security-Policy"] = csp
+    def __call__(self, request):
+        started = time.perf_counter()
+        with profile_request() as profile:
+            # The profile is shared with the profiling middleware when both
+            # run, so only count what happens from here on
+            sql_count, sql_seconds = profile.sql_count, profile.sql_seconds
+            template_seconds = profile.template_seconds
+            hits, misses = profile.cache_hits, profile.cache_misses
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        sql_count = profile.sql_count - sql_count
+        sql_seconds = profile.sql_seconds - sql_seconds
+        template_seconds = profile.template_seconds - template_seconds
+        hits, misses = profile.cache_hits - hits, profile.cache_misses - misses
+
+        # Unresolved URLs share one label so 404 probes cannot flood the series
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "unresolved"
+        metrics.REQUEST_LATENCY.observe(total, view=view, method=request.method)
+        metrics.REQUESTS.inc(
+            view=view, method=request.method, status=response.status_code
+        )
+        metrics.REQUEST_DB_QUERIES.observe(sql_count, view=view)
+        metrics.DB_QUERY_SECONDS.inc(sql_seconds, view=view)
+        if hits:
+            metrics.CACHE_REQUESTS.inc(hits, result="hit")
+        if misses:
+            metrics.CACHE_REQUESTS.inc(misses, result="miss")
+        metrics.REGISTRY.flush()
+
+        user = getattr(request, "user", None)
+        if settings.DEBUG or (user is not None and user.is_staff):
+            response["Server-Timing"] = (
+                f'db;dur={sql_seconds * 1000:.1f};desc="{sql_count} queries", '
+                f"tpl;dur={template_seconds * 1000:.1f}, "
+                f'cache;desc="{hits} hits, {misses} misses", '
+                f"total;dur={total * 1000:.1f}"
+            )
 
         return response
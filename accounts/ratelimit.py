@@ -0,0 +1,151 @@
+"""
+Sliding-window login rate limiting on the cache.
+
+Failed logins are counted per username and per client IP in
+``WINDOW_BUCKETS`` time buckets covering the last ``LOGIN_LOCKOUT_TIME``
+minutes. Each bucket is a cache counter bumped with the atomic ``incr``, so
+concurrent attempts cannot overwrite each other's counts. Once the buckets of
+a username or IP add up to ``MAX_LOGIN_ATTEMPTS`` a lock entry holding the
+time the lock ends is written; checking a login is then a single
+``get_many`` of the two lock entries, and no cache TTL introspection (which
+most backends, LocMem included, do not offer) is needed.
+
+Counters live in the default cache, so limits apply across worker processes
+as long as that cache is shared between them (Redis, Memcached or the
+database cache rather than LocMem).
+"""
+
+import hashlib
+import math
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Buckets the window is split into; more buckets slide more smoothly
+WINDOW_BUCKETS = 10
+
+KEY_PREFIX = "login_rl"
+
+
+def window_seconds():
+    return settings.LOGIN_LOCKOUT_TIME * 60
+
+
+def _bucket_seconds():
+    return max(1, window_seconds() // WINDOW_BUCKETS)
+
+
+def _digest(identifier):
+    # Usernames are user input; keep keys short and safe for every backend
+    return hashlib.sha256(str(identifier).encode()).hexdigest()[:32]
+
+
+def _lock_key(scope, identifier):
+    return f"{KEY_PREFIX}:lock:{scope}:{_digest(identifier)}"
+
+
+def _bucket_key(scope, identifier, bucket):
+    return f"{KEY_PREFIX}:count:{scope}:{_digest(identifier)}:{bucket}"
+
+
+def _window_keys(scope, identifier, now):
+    current = int(now // _bucket_seconds())
+    return [
+        _bucket_key(scope, identifier, bucket)
+        for bucket in range(current - WINDOW_BUCKETS + 1, current + 1)
+    ]
+
+
+def _incr(key, timeout):
+    """Atomically add one to a counter, creating it if needed"""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Missing counter: add() only succeeds for one of several racers
+        if cache.add(key, 1, timeout):
+            return 1
+        return cache.incr(key)
+
+
+@dataclass(frozen=True)
+class LoginLimit:
+    """Outcome of checking or recording a login attempt"""
+
+    locked: bool = False
+    # Seconds until the lock ends, 0 when not locked
+    retry_after: int = 0
+    # Failures in the window for the username, when known
+    attempts: int = 0
+
+    @property
+    def retry_after_minutes(self):
+        return math.ceil(self.retry_after / 60)
+
+
+def _scopes(username, ip_address):
+    return [("username", username), ("ip", ip_address)]
+
+
+def check_login(username, ip_address):
+    """Whether the username or IP is locked out, in one cache round trip"""
+    now = time.time()
+    keys = [_lock_key(scope, ident) for scope, ident in _scopes(username, ip_address)]
+    locks = cache.get_many(keys)
+    until = max((value for value in locks.values()), default=0)
+    if until > now:
+        return LoginLimit(locked=True, retry_after=math.ceil(until - now))
+    return LoginLimit()
+
+
+def record_failure(username, ip_address):
+    """
+    Count a failed login and lock the username or IP if it hit the limit.
+
+    Returns:
+        LoginLimit: Whether the failure caused a lock, and the username's
+        failures in the window
+    """
+    now = time.time()
+    window = window_seconds()
+    timeout = window + _bucket_seconds()
+    scopes = _scopes(username, ip_address)
+
+    current = {}
+    for scope, ident in scopes:
+        key = _window_keys(scope, ident, now)[-1]
+        current[key] = _incr(key, timeout)
+
+    # The earlier buckets of both windows in one round trip
+    earlier = [
+        key for scope, ident in scopes for key in _window_keys(scope, ident, now)[:-1]
+    ]
+    counts = {**cache.get_many(earlier), **current}
+
+    totals = {
+        scope: sum(counts.get(key, 0) for key in _window_keys(scope, ident, now))
+        for scope, ident in scopes
+    }
+    over = [
+        (scope, ident)
+        for scope, ident in scopes
+        if totals[scope] >= settings.MAX_LOGIN_ATTEMPTS
+    ]
+    if over:
+        cache.set_many(
+            {_lock_key(scope, ident): now + window for scope, ident in over},
+            window,
+        )
+        return LoginLimit(locked=True, retry_after=window, attempts=totals["username"])
+    return LoginLimit(attempts=totals["username"])
+
+
+def reset(username, ip_address):
+    """Forget the failures and locks of a username and IP"""
+    now = time.time()
+    keys = []
+    for scope, ident in _scopes(username, ip_address):
+        keys.append(_lock_key(scope, ident))
+        keys.extend(_window_keys(scope, ident, now))
+    cache.delete_many(keys)
@@ -13,7 +13,8 @@ def csp_nonce(request):
 
     Usage: <script nonce="{% csp_nonce request %}">...</script>
     """
-    return getattr(request, "csp_nonce", "")
+    # Reading the nonce is what makes the middleware generate and send it
+    return str(getattr(request, "csp_nonce", ""))
 
 
 @register.simple_tag
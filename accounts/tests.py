@@ -1,3 +1,205 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse, JsonResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts import ratelimit
+from accounts.activity import CacheActivityStore
+from accounts.headers import build_header_policy
+from accounts.middleware import CSPNonceMiddleware, SecurityHeadersMiddleware
+from accounts.backends import RateLimitedAuthenticationBackend
+
+
+@override_settings(MAX_LOGIN_ATTEMPTS=3, LOGIN_LOCKOUT_TIME=10)
+class LoginRateLimitTest(TestCase):
+    """Tests for the sliding-window login rate limiter"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="shopper", password="right")
+
+    def setUp(self):
+        cache.clear()
+        self.backend = RateLimitedAuthenticationBackend()
+        self.factory = RequestFactory()
+
+    def login(self, password, ip="10.0.0.1", username="shopper"):
+        request = self.factory.post("/accounts/login/", REMOTE_ADDR=ip)
+        return self.backend.authenticate(request, username=username, password=password)
+
+    def test_locks_after_max_failures(self):
+        for _ in range(3):
+            self.assertIsNone(self.login("wrong"))
+
+        # Locked: even the right password is refused
+        self.assertIsNone(self.login("right"))
+        limit = ratelimit.check_login("shopper", "10.0.0.1")
+        self.assertTrue(limit.locked)
+        self.assertEqual(limit.retry_after_minutes, 10)
+
+    def test_success_resets_failures(self):
+        self.login("wrong")
+        self.login("wrong")
+        self.assertEqual(self.login("right"), self.user)
+        self.login("wrong")
+        self.assertEqual(self.login("right"), self.user)
+
+    def test_ip_is_limited_across_usernames(self):
+        for name in ("a", "b", "c"):
+            self.login("wrong", username=name)
+        self.assertTrue(ratelimit.check_login("someone-else", "10.0.0.1").locked)
+        self.assertFalse(ratelimit.check_login("someone-else", "10.0.0.2").locked)
+
+    def test_failures_slide_out_of_the_window(self):
+        now = time.time()
+        with patch("accounts.ratelimit.time.time", return_value=now):
+            ratelimit.record_failure("shopper", "10.0.0.1")
+            ratelimit.record_failure("shopper", "10.0.0.1")
+        # Ten minutes on, both failures have left the window
+        with patch("accounts.ratelimit.time.time", return_value=now + 11 * 60):
+            limit = ratelimit.record_failure("shopper", "10.0.0.1")
+        self.assertFalse(limit.locked)
+        self.assertEqual(limit.attempts, 1)
+
+    def test_check_is_one_cache_round_trip(self):
+        with patch.object(cache, "get_many", wraps=cache.get_many) as get_many:
+            ratelimit.check_login("shopper", "10.0.0.1")
+        get_many.assert_called_once()
+
+    def test_concurrent_failures_are_all_counted(self):
+        """Test that increments racing on a new counter are not lost"""
+        key = ratelimit._window_keys("username", "shopper", time.time())[-1]
+        real_add = cache.add
+
+        def add_after_rival(*args, **kwargs):
+            # Another worker creates the counter between our incr and add
+            real_add(key, 1, 60)
+            return real_add(*args, **kwargs)
+
+        with patch.object(cache, "add", side_effect=add_after_rival):
+            self.assertEqual(ratelimit._incr(key, 60), 2)
+
+
+@override_settings(USER_INACTIVITY_TIMEOUT=30, USER_ACTIVITY_GRANULARITY=60)
+class UserActivityTest(TestCase):
+    """Tests for coalesced activity tracking in UserActivityMiddleware"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="shopper", password="right")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.now = timezone.now()
+
+    def get(self, after=timedelta()):
+        """Request a page ``after`` the test's start, returning session writes"""
+        with patch(
+            "accounts.middleware.timezone.now", return_value=self.now + after
+        ), CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("core:about"))
+        return [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith("UPDATE") and "django_session" in query["sql"]
+        ]
+
+    def test_writes_are_coalesced(self):
+        self.assertEqual(len(self.get()), 1)
+        self.assertEqual(self.get(timedelta(seconds=30)), [])
+        self.assertEqual(len(self.get(timedelta(seconds=61))), 1)
+
+    def test_inactive_user_is_logged_out(self):
+        self.get()
+        self.get(timedelta(minutes=20))
+        self.assertIn("_auth_user_id", self.client.session)
+
+        self.get(timedelta(minutes=52))
+        self.assertNotIn("_auth_user_id", self.client.session)
+
+    @override_settings(USER_ACTIVITY_STORE="cache")
+    def test_cache_store_never_saves_the_session(self):
+        self.assertEqual(self.get(), [])
+        self.assertEqual(self.get(timedelta(minutes=5)), [])
+        self.assertNotIn("last_activity", self.client.session)
+
+        request = RequestFactory().get("/")
+        request.session = self.client.session
+        stored = CacheActivityStore().get(request)
+        self.assertEqual(
+            int(stored.timestamp()), int((self.now + timedelta(minutes=5)).timestamp())
+        )
+
+        self.get(timedelta(minutes=40))
+        self.assertNotIn("_auth_user_id", self.client.session)
+
+
+class SecurityHeadersTest(TestCase):
+    """Tests for precomputed security headers and lazy CSP nonces"""
+
+    def respond(self, view):
+        """Run ``view`` through the CSP nonce and security header middleware"""
+        middleware = SecurityHeadersMiddleware(CSPNonceMiddleware(view))
+        return middleware(RequestFactory().get("/"))
+
+    def test_production_policy(self):
+        self.assertEqual(
+            build_header_policy(is_production=True).csp,
+            "default-src 'self'; script-src 'self'; style-src 'self'; "
+            "img-src 'self' data:; font-src 'self'; connect-src 'self'; "
+            "frame-src 'none'; object-src 'none'; base-uri 'self'; "
+            "form-action 'self';",
+        )
+
+    def test_html_without_nonce_gets_plain_policy(self):
+        response = self.respond(lambda request: HttpResponse("<p>hi</p>"))
+        self.assertEqual(
+            response["Content-Security-Policy"],
+            build_header_policy(is_production=False).csp,
+        )
+        self.assertEqual(response["Referrer-Policy"], "strict-origin-when-cross-origin")
+
+    def test_nonce_is_sent_when_read(self):
+        nonces = []
+
+        def view(request):
+            nonces.append(str(request.csp_nonce))
+            return HttpResponse(f'<script nonce="{nonces[0]}"></script>')
+
+        response = self.respond(view)
+        self.assertIn(
+            f"script-src 'nonce-{nonces[0]}' 'self'",
+            response["Content-Security-Policy"],
+        )
+
+    def test_non_html_responses_skip_csp(self):
+        for view in (
+            lambda request: JsonResponse({"ok": True}),
+            lambda request: HttpResponse(status=302, headers={"Location": "/"}),
+        ):
+            response = self.respond(view)
+            self.assertFalse(response.has_header("Content-Security-Policy"))
+            self.assertTrue(response.has_header("Permissions-Policy"))
+
+    def test_template_tag_reads_the_nonce(self):
+        template = Template(
+            '{% load security_tags %}<script nonce="{% csp_nonce request %}"></script>'
+        )
+
+        def view(request):
+            return HttpResponse(template.render(Context({"request": request})))
+
+        response = self.respond(view)
+        nonce = response.content.decode().split('"')[1]
+        self.assertTrue(nonce)
+        self.assertIn(f"'nonce-{nonce}'", response["Content-Security-Policy"])
@@ -1,4 +1,8 @@
+from decimal import Decimal
+
 from django.contrib import admin
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce
 from .models import Cart, CartItem, Coupon
 
 
@@ -13,8 +17,8 @@ class CartAdmin(admin.ModelAdmin):
         "id",
         "user",
         "session_id",
-        "total_items",
-        "total_price",
+        "get_total_items",
+        "get_total_price",
         "created_at",
     ]
     list_filter = ["created_at"]
@@ -22,6 +26,35 @@ class CartAdmin(admin.ModelAdmin):
     inlines = [CartItemInline]
     readonly_fields = ["total_price", "total_items"]
     date_hierarchy = "created_at"
+    list_select_related = ["user"]
+
+    def get_queryset(self, request):
+        # Same totals as Cart.total_items/total_price, computed in the query
+        line_price = Coalesce("items__price", "items__product__price") * F(
+            "items__quantity"
+        )
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                items_total=Coalesce(Sum("items__quantity"), 0),
+                price_total=Coalesce(
+                    Sum(line_price, output_field=DecimalField()), Decimal("0")
+                ),
+            )
+        )
+
+    def get_total_items(self, obj):
+        return obj.items_total
+
+    get_total_items.short_description = "Total items"
+    get_total_items.admin_order_field = "items_total"
+
+    def get_total_price(self, obj):
+        return obj.price_total
+
+    get_total_price.short_description = "Total price"
+    get_total_price.admin_order_field = "price_total"
 
 
 class CartItemAdmin(admin.ModelAdmin):
@@ -29,6 +62,8 @@ class CartItemAdmin(admin.ModelAdmin):
     list_filter = ["added_at"]
     search_fields = ["cart__user__username", "product__name"]
     readonly_fields = ["total_price"]
+    # Cart.__str__ shows the cart's user
+    list_select_related = ["cart__user", "product"]
     date_hierarchy = "added_at"
 
 
@@ -150,14 +185,13 @@ class CouponAdmin(admin.ModelAdmin):
 
     def extend_validity(self, request, queryset):
         """Extend validity period by 30 days"""
+        from django.db.models import F
         from django.utils import timezone
         from datetime import timedelta
 
-        updated = 0
-        for coupon in queryset:
-            coupon.valid_to = coupon.valid_to + timedelta(days=30)
-            coupon.save()
-            updated += 1
+        updated = queryset.update(
+            valid_to=F("valid_to") + timedelta(days=30), updated_at=timezone.now()
+        )
 
         self.message_user(
             request,
@@ -207,23 +241,19 @@ class CouponAdmin(admin.ModelAdmin):
 
         extra_context = extra_context or {}
 
-        # Add statistics
-        total_coupons = Coupon.objects.count()
-        active_coupons = Coupon.objects.filter(
-            is_active=True, valid_from__lte=timezone.now(), valid_to__gte=timezone.now()
-        ).count()
-        expired_coupons = Coupon.objects.filter(valid_to__lt=timezone.now()).count()
-
-        extra_context.update(
-            {
-                "coupon_stats": {
-                    "total": total_coupons,
-                    "active": active_coupons,
-                    "expired": expired_coupons,
-                }
-            }
+        # Add statistics, counted in one query
+        now = timezone.now()
+        coupon_stats = Coupon.objects.aggregate(
+            total=Count("id"),
+            active=Count(
+                "id",
+                filter=Q(is_active=True, valid_from__lte=now, valid_to__gte=now),
+            ),
+            expired=Count("id", filter=Q(valid_to__lt=now)),
         )
 
+        extra_context.update({"coupon_stats": coupon_stats})
+
         return super().changelist_view(request, extra_context=extra_context)
 
     def delete_view(self, request, object_id, extra_context=None):
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from products.models import Product
 from django.utils import timezone
@@ -29,6 +29,56 @@ class Cart(models.Model):
         """Calculate total number of items in cart"""
         return sum(item.quantity for item in self.items.all())
 
+    def sync_items(self, session_cart):
+        """
+        Bring the cart items in line with a session cart ({slug: quantity}).
+
+        Only the difference is written: new lines are bulk-created, lines whose
+        quantity or product price changed are bulk-updated and lines no longer
+        in the session are removed with one filtered delete, all inside a
+        single transaction.
+        Slugs that don't match a product are skipped.
+        """
+        with transaction.atomic():
+            existing_items = {
+                item.product.slug: item for item in self.items.select_related("product")
+            }
+
+            new_slugs = [slug for slug in session_cart if slug not in existing_items]
+            items_to_create = [
+                CartItem(
+                    cart=self,
+                    product=product,
+                    quantity=session_cart[product.slug],
+                    price=product.price,
+                )
+                for product in (
+                    Product.objects.filter(slug__in=new_slugs) if new_slugs else []
+                )
+            ]
+
+            now = timezone.now()
+            items_to_update = []
+            stale_ids = []
+            for slug, item in existing_items.items():
+                quantity = session_cart.get(slug)
+                if quantity is None:
+                    stale_ids.append(item.id)
+                elif item.quantity != quantity or item.price != item.product.price:
+                    item.quantity = quantity
+                    item.price = item.product.price
+                    item.updated_at = now
+                    items_to_update.append(item)
+
+            if stale_ids:
+                self.items.filter(id__in=stale_ids).delete()
+            if items_to_update:
+                CartItem.objects.bulk_update(
+                    items_to_update, ["quantity", "price", "updated_at"]
+                )
+            if items_to_create:
+                CartItem.objects.bulk_create(items_to_create)
+
     class Meta:
         verbose_name = "Cart"
         verbose_name_plural = "Carts"
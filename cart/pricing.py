@@ -0,0 +1,146 @@
+"""
+Cart pricing service.
+
+Prices a session cart (a ``{product_slug: quantity}`` dict) with a single
+``slug__in`` query, so every cart view and AJAX endpoint shares one code path
+and a cart interaction costs a constant number of queries regardless of how
+many lines the cart holds.
+"""
+
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Optional
+
+from products.models import Product
+
+SHIPPING_COST = Decimal("5.99")  # Default shipping cost for Malaysia
+TAX_RATE = Decimal("0.06")  # 6% GST in Malaysia
+
+
+@dataclass(frozen=True)
+class CartLine:
+    """A single priced line of the cart"""
+
+    product: Product
+    quantity: int
+    subtotal: Decimal
+
+
+@dataclass(frozen=True)
+class CartPricing:
+    """Priced cart with line subtotals and order totals"""
+
+    lines: list = field(default_factory=list)
+    missing_slugs: list = field(default_factory=list)
+    total: Decimal = Decimal("0.00")
+    discount: Decimal = Decimal("0.00")
+    subtotal: Decimal = Decimal("0.00")
+    shipping_cost: Decimal = Decimal("0.00")
+    tax: Decimal = Decimal("0.00")
+    final_total: Decimal = Decimal("0.00")
+    coupon: Optional[object] = None
+
+    @property
+    def items_count(self):
+        """Total number of units across all priced lines"""
+        return sum(line.quantity for line in self.lines)
+
+    def get_line(self, slug):
+        """Return the line for the given product slug, or None"""
+        for line in self.lines:
+            if line.product.slug == slug:
+                return line
+        return None
+
+    def as_template_items(self):
+        """Lines in the shape expected by ``cart/cart.html``"""
+        return [
+            {
+                "product": line.product,
+                "quantity": line.quantity,
+                "subtotal": line.subtotal,
+            }
+            for line in self.lines
+        ]
+
+    def coupon_data(self):
+        """JSON-serializable summary of the applied coupon"""
+        if not self.coupon:
+            return None
+        return {
+            "code": self.coupon.code,
+            "value": float(self.coupon.value),
+            "discount_type": self.coupon.discount_type,
+        }
+
+
+def calculate_discount(total, coupon):
+    """Calculate discount amount based on coupon"""
+    if not coupon or total < coupon.min_purchase:
+        return Decimal("0.00")
+
+    if coupon.discount_type == "percentage":
+        return Decimal(total) * (coupon.value / Decimal("100"))
+    else:  # fixed amount
+        return min(coupon.value, total)  # Don't allow discount greater than total
+
+
+def fetch_cart_products(slugs):
+    """Fetch all products for the given slugs in one query, keyed by slug"""
+    if not slugs:
+        return {}
+    return {
+        product.slug: product
+        for product in Product.objects.filter(slug__in=list(slugs)).select_related(
+            "category"
+        )
+    }
+
+
+def price_cart(session_cart, coupon=None):
+    """
+    Price a session cart.
+
+    Args:
+        session_cart (dict): Mapping of product slug to quantity
+        coupon: Optional applied Coupon instance
+
+    Returns:
+        CartPricing: Priced lines plus discount, tax, shipping and final total.
+        Slugs that no longer match a product are reported in ``missing_slugs``
+        so callers can prune them from the session.
+    """
+    products_by_slug = fetch_cart_products(session_cart.keys())
+
+    lines = []
+    missing_slugs = []
+    total = Decimal("0.00")
+
+    for product_slug, quantity in session_cart.items():
+        product = products_by_slug.get(product_slug)
+        if product is None:
+            missing_slugs.append(product_slug)
+            continue
+        line_subtotal = product.price * quantity
+        lines.append(
+            CartLine(product=product, quantity=quantity, subtotal=line_subtotal)
+        )
+        total += line_subtotal
+
+    discount = calculate_discount(total, coupon)
+    subtotal = total - discount
+    shipping_cost = SHIPPING_COST if total > 0 else Decimal("0.00")
+    tax = subtotal * TAX_RATE
+    final_total = subtotal + shipping_cost + tax
+
+    return CartPricing(
+        lines=lines,
+        missing_slugs=missing_slugs,
+        total=total,
+        discount=discount,
+        subtotal=subtotal,
+        shipping_cost=shipping_cost,
+        tax=tax,
+        final_total=final_total,
+        coupon=coupon,
+    )
@@ -0,0 +1,220 @@
+"""
+Where the shopper's working cart ({product_slug: quantity}) is kept.
+
+``CART_STORE`` selects the backend:
+
+    "session"  The cart is a dict in the session, saved by the session engine
+               (the database by default). Every change re-serializes and
+               writes the whole session.
+    "cache"    The cart is a hash per cart id in the ``CART_CACHE_ALIAS``
+               cache: one field per product, updated field by field, with
+               its own ``CART_STORE_TTL``. On Redis (Django's RedisCache) it
+               is a native hash; other caches keep the hash as one entry. The
+               session only holds the cart id, written once per cart.
+    "local"    The same hash layout in an in-process dict, for tests and
+               single-process development.
+
+Views go through ``get_cart_store()``; every method takes the session, which
+identifies the cart.
+"""
+
+import secrets
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+
+SESSION_CART_KEY = "cart"
+SESSION_CART_ID_KEY = "cart_id"
+HASH_KEY_PREFIX = "cart"
+
+
+class SessionCartStore:
+    """Carts kept in the session itself"""
+
+    def load(self, session):
+        return dict(session.get(SESSION_CART_KEY, {}))
+
+    def replace(self, session, items):
+        session[SESSION_CART_KEY] = dict(items)
+
+    def set_quantity(self, session, slug, quantity):
+        items = self.load(session)
+        items[slug] = quantity
+        self.replace(session, items)
+
+    def remove(self, session, *slugs):
+        items = self.load(session)
+        for slug in slugs:
+            items.pop(slug, None)
+        self.replace(session, items)
+
+    def clear(self, session):
+        self.replace(session, {})
+
+
+class LocalHashClient:
+    """In-process stand-in for the Redis hash commands the store uses"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hashes = {}
+        self.expires = {}
+
+    def _live(self, key):
+        if key in self.expires and self.expires[key] <= time.monotonic():
+            self.hashes.pop(key, None)
+            self.expires.pop(key, None)
+        return self.hashes.get(key)
+
+    def hgetall(self, key):
+        with self.lock:
+            return dict(self._live(key) or {})
+
+    def hset(self, key, mapping, ttl):
+        with self.lock:
+            fields = self._live(key)
+            if fields is None:
+                fields = self.hashes[key] = {}
+            fields.update(mapping)
+            self.expires[key] = time.monotonic() + ttl
+
+    def hdel(self, key, fields, ttl):
+        with self.lock:
+            existing = self._live(key)
+            if existing is not None:
+                for field in fields:
+                    existing.pop(field, None)
+                self.expires[key] = time.monotonic() + ttl
+
+    def delete(self, key):
+        with self.lock:
+            self.hashes.pop(key, None)
+            self.expires.pop(key, None)
+
+
+class RedisHashClient:
+    """Hash commands on the Redis server behind a Django RedisCache"""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def _client(self, key):
+        # RedisCache shards by key; make_and_validate_key applies the prefix
+        key = self.cache.make_and_validate_key(key)
+        return key, self.cache._cache.get_client(key, write=True)
+
+    def hgetall(self, key):
+        key, client = self._client(key)
+        return {
+            field.decode(): int(value) for field, value in client.hgetall(key).items()
+        }
+
+    def hset(self, key, mapping, ttl):
+        key, client = self._client(key)
+        pipe = client.pipeline()
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, ttl)
+        pipe.execute()
+
+    def hdel(self, key, fields, ttl):
+        key, client = self._client(key)
+        pipe = client.pipeline()
+        pipe.hdel(key, *fields)
+        pipe.expire(key, ttl)
+        pipe.execute()
+
+    def delete(self, key):
+        key, client = self._client(key)
+        client.delete(key)
+
+
+class CacheHashClient:
+    """
+    Hashes kept as one dict entry of any Django cache.
+
+    Field updates read and rewrite the entry, so two simultaneous changes to
+    the same cart can race; use Redis where that matters.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def hgetall(self, key):
+        return self.cache.get(key) or {}
+
+    def hset(self, key, mapping, ttl):
+        self.cache.set(key, {**self.hgetall(key), **mapping}, ttl)
+
+    def hdel(self, key, fields, ttl):
+        fields_left = self.hgetall(key)
+        for field in fields:
+            fields_left.pop(field, None)
+        self.cache.set(key, fields_left, ttl)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+
+class HashCartStore:
+    """Carts kept as hashes keyed by a cart id stored in the session"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def _key(self, session, create=False):
+        cart_id = session.get(SESSION_CART_ID_KEY)
+        if cart_id is None and create:
+            cart_id = session[SESSION_CART_ID_KEY] = secrets.token_urlsafe(16)
+        return f"{HASH_KEY_PREFIX}:{cart_id}" if cart_id else None
+
+    def load(self, session):
+        key = self._key(session)
+        return self.client.hgetall(key) if key else {}
+
+    def replace(self, session, items):
+        key = self._key(session, create=bool(items))
+        if key is None:
+            return
+        self.client.delete(key)
+        if items:
+            self.client.hset(key, dict(items), settings.CART_STORE_TTL)
+
+    def set_quantity(self, session, slug, quantity):
+        key = self._key(session, create=True)
+        self.client.hset(key, {slug: quantity}, settings.CART_STORE_TTL)
+
+    def remove(self, session, *slugs):
+        key = self._key(session)
+        if key and slugs:
+            self.client.hdel(key, slugs, settings.CART_STORE_TTL)
+
+    def clear(self, session):
+        key = self._key(session)
+        if key:
+            self.client.delete(key)
+
+
+def _cache_hash_client():
+    cache = caches[settings.CART_CACHE_ALIAS]
+    if hasattr(cache, "_cache") and hasattr(cache._cache, "get_client"):
+        return RedisHashClient(cache)
+    return CacheHashClient(cache)
+
+
+@lru_cache(maxsize=None)
+def _build_store(name):
+    if name == "session":
+        return SessionCartStore()
+    if name == "cache":
+        return HashCartStore(_cache_hash_client())
+    if name == "local":
+        return HashCartStore(LocalHashClient())
+    raise ValueError(f"Unknown CART_STORE: {name}")
+
+
+def get_cart_store():
+    """The cart store selected by the CART_STORE setting"""
+    return _build_store(settings.CART_STORE)
@@ -1,3 +1,272 @@
-from django.test import TestCase
+import json
+from decimal import Decimal
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from products.models import Category, Product
+from .pricing import price_cart
+from .storage import (
+    CacheHashClient,
+    HashCartStore,
+    LocalHashClient,
+    SessionCartStore,
+    get_cart_store,
+)
+
+
+class CartPricingTest(TestCase):
+    """Tests for the batched cart pricing service"""
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Pantry")
+        self.products = [
+            Product.objects.create(
+                name=f"Product {i}",
+                slug=f"product-{i}",
+                price=Decimal("2.50"),
+                category=self.category,
+            )
+            for i in range(10)
+        ]
+
+    def test_price_cart_totals(self):
+        """Test that line subtotals, tax and shipping are computed"""
+        pricing = price_cart({"product-0": 2, "product-1": 1})
+
+        self.assertEqual(len(pricing.lines), 2)
+        self.assertEqual(pricing.total, Decimal("7.50"))
+        self.assertEqual(pricing.shipping_cost, Decimal("5.99"))
+        self.assertEqual(pricing.tax, Decimal("7.50") * Decimal("0.06"))
+        self.assertEqual(pricing.items_count, 3)
+
+    def test_price_cart_reports_missing_products(self):
+        """Test that slugs without a product are reported, not priced"""
+        pricing = price_cart({"product-0": 1, "no-such-product": 3})
+
+        self.assertEqual(pricing.missing_slugs, ["no-such-product"])
+        self.assertEqual(pricing.total, Decimal("2.50"))
+
+    def test_price_cart_uses_single_query(self):
+        """Test that pricing cost does not grow with the number of lines"""
+        cart = {product.slug: 1 for product in self.products}
+
+        with self.assertNumQueries(1):
+            pricing = price_cart(cart)
+
+        self.assertEqual(len(pricing.lines), 10)
+
+    def test_empty_cart_has_no_shipping(self):
+        """Test that an empty cart is free"""
+        pricing = price_cart({})
+
+        self.assertEqual(pricing.final_total, Decimal("0.00"))
+
+    def test_view_cart_query_count_is_constant(self):
+        """Test that the cart page does not query once per line"""
+        session = self.client.session
+        session["cart"] = {product.slug: 1 for product in self.products}
+        session.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("cart:view_cart"), HTTP_X_REQUESTED_WITH="XMLHttpRequest"
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["products_count"], 10)
+        self.assertLess(len(queries), len(self.products))
+
+
+class CartSyncTest(TestCase):
+    """Tests for the diff-based session to Cart model sync"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from .models import Cart
+
+        self.user = User.objects.create_user(username="shopper", password="secret")
+        self.cart = Cart.objects.create(user=self.user)
+        self.category = Category.objects.create(name="Dairy")
+        for i in range(5):
+            Product.objects.create(
+                name=f"Milk {i}",
+                slug=f"milk-{i}",
+                price=Decimal("4.20"),
+                category=self.category,
+            )
+
+    def quantities(self):
+        return dict(self.cart.items.values_list("product__slug", "quantity"))
+
+    def test_sync_creates_updates_and_deletes(self):
+        """Test that the Cart model mirrors the session cart"""
+        self.cart.sync_items({"milk-0": 1, "milk-1": 2, "milk-2": 3})
+        self.cart.sync_items({"milk-0": 1, "milk-1": 5, "milk-3": 1})
+
+        self.assertEqual(self.quantities(), {"milk-0": 1, "milk-1": 5, "milk-3": 1})
+
+    def test_sync_keeps_unchanged_rows(self):
+        """Test that unchanged lines are not rewritten"""
+        self.cart.sync_items({"milk-0": 1, "milk-1": 2})
+        original_ids = set(self.cart.items.values_list("id", flat=True))
+
+        self.cart.sync_items({"milk-0": 1, "milk-1": 4})
+
+        self.assertEqual(
+            set(self.cart.items.values_list("id", flat=True)), original_ids
+        )
+
+    def test_sync_refreshes_prices(self):
+        """Test that existing lines pick up the current product price"""
+        self.cart.sync_items({"milk-0": 1, "milk-1": 2})
+        Product.objects.filter(slug="milk-0").update(price=Decimal("3.90"))
+
+        self.cart.sync_items({"milk-0": 1, "milk-1": 2})
+
+        self.assertEqual(
+            self.cart.items.get(product__slug="milk-0").price, Decimal("3.90")
+        )
+
+    def test_sync_skips_unknown_products(self):
+        """Test that slugs without a product are ignored"""
+        self.cart.sync_items({"milk-0": 1, "no-such-product": 2})
+
+        self.assertEqual(self.quantities(), {"milk-0": 1})
+
+    def test_noop_sync_does_not_write(self):
+        """Test that an unchanged cart costs a single read"""
+        self.cart.sync_items({"milk-0": 1, "milk-1": 2})
+
+        with CaptureQueriesContext(connection) as queries:
+            self.cart.sync_items({"milk-0": 1, "milk-1": 2})
+
+        writes = [
+            q
+            for q in queries
+            if not q["sql"].startswith(("SELECT", "SAVEPOINT", "RELEASE"))
+        ]
+        self.assertEqual(writes, [])
+
+
+class CartStoreTest(TestCase):
+    """Tests for the session and hash cart store backends"""
+
+    def backends(self):
+        return {
+            "session": SessionCartStore(),
+            "local": HashCartStore(LocalHashClient()),
+            "cache": HashCartStore(CacheHashClient(cache)),
+        }
+
+    def test_backends_agree(self):
+        for name, store in self.backends().items():
+            with self.subTest(name):
+                session = SessionStore()
+                self.assertEqual(store.load(session), {})
+
+                store.set_quantity(session, "apple", 2)
+                store.set_quantity(session, "pear", 1)
+                store.set_quantity(session, "apple", 3)
+                self.assertEqual(store.load(session), {"apple": 3, "pear": 1})
+
+                store.remove(session, "pear", "missing")
+                self.assertEqual(store.load(session), {"apple": 3})
+
+                store.replace(session, {"plum": 4})
+                self.assertEqual(store.load(session), {"plum": 4})
+
+                store.clear(session)
+                self.assertEqual(store.load(session), {})
+
+    def test_hash_store_keeps_only_the_cart_id_in_the_session(self):
+        store = HashCartStore(LocalHashClient())
+        session = SessionStore()
+        store.set_quantity(session, "apple", 2)
+        self.assertEqual(list(session.keys()), ["cart_id"])
+
+        # Later changes leave the session untouched
+        session.modified = False
+        store.set_quantity(session, "apple", 5)
+        store.remove(session, "apple")
+        self.assertFalse(session.modified)
+
+    @override_settings(CART_STORE_TTL=60)
+    def test_local_hash_expires(self):
+        store = HashCartStore(LocalHashClient())
+        session = SessionStore()
+        with patch("cart.storage.time.monotonic", return_value=1000):
+            store.set_quantity(session, "apple", 2)
+        with patch("cart.storage.time.monotonic", return_value=1059):
+            self.assertEqual(store.load(session), {"apple": 2})
+        with patch("cart.storage.time.monotonic", return_value=1061):
+            self.assertEqual(store.load(session), {})
+
+
+@override_settings(CART_STORE="local")
+class HashCartViewsTest(TestCase):
+    """Tests that cart views write to the configured store, not the session"""
+
+    def setUp(self):
+        category = Category.objects.create(name="Pantry")
+        for slug in ("apple", "pear"):
+            Product.objects.create(
+                name=slug.title(), slug=slug, price=Decimal("2.00"), category=category
+            )
+
+    def test_cart_changes_do_not_save_the_session(self):
+        self.client.post(reverse("cart:add_to_cart", args=["apple"]), {"quantity": 1})
+        self.assertNotIn("cart", self.client.session)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(
+                reverse("cart:add_to_cart", args=["pear"]),
+                {"quantity": 2},
+                HTTP_X_REQUESTED_WITH="XMLHttpRequest",
+            )
+            self.client.post(
+                reverse("cart:update_quantity", args=["apple"]), {"quantity": 4}
+            )
+        self.assertFalse(
+            [
+                q
+                for q in queries
+                if "django_session" in q["sql"] and "UPDATE" in q["sql"]
+            ]
+        )
+        self.assertEqual(
+            get_cart_store().load(self.client.session), {"apple": 4, "pear": 2}
+        )
+
+        response = self.client.get(reverse("cart:view_cart"))
+        self.assertEqual(response.context["items_count"], 6)
+
+    def test_sync_drops_malformed_quantities(self):
+        """Test that a posted cart is cleaned before it reaches the store"""
+        cart = {
+            "apple": 2.5,
+            "pear": 99,
+            "plum": None,
+            "fig": [1],
+            "kiwi": {"n": 1},
+            "lime": "abc",
+            "date": -3,
+            "lemon": True,
+        }
+
+        response = self.client.post(
+            reverse("cart:sync_cart"),
+            json.dumps({"cart": cart}),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            get_cart_store().load(self.client.session), {"apple": 2, "pear": 20}
+        )
+        self.assertEqual(self.client.get(reverse("cart:view_cart")).status_code, 200)
@@ -7,8 +7,10 @@ from django.urls import reverse
 import json
 from datetime import datetime, timedelta
 from products.models import Product
-from decimal import Decimal
 from .models import Cart, CartItem, Coupon
+from .pricing import price_cart, calculate_discount
+from .storage import get_cart_store
+from core import metrics
 import logging
 from django.utils import timezone
 
@@ -19,24 +21,43 @@ logger = logging.getLogger("security")
 
 
 def get_session_cart(request):
-    """Get the cart from session or initialize it"""
-    return request.session.get("cart", {})
+    """Get the shopper's cart from the configured cart store"""
+    return get_cart_store().load(request.session)
 
 
 def calculate_cart_total(request):
     """Calculate the total value of the cart"""
-    cart = get_session_cart(request)
-    total = Decimal("0.00")
+    return price_cart(get_session_cart(request)).total
+
+
+def get_cart_pricing(request, coupon=None):
+    """Price the session cart, including any applied coupon"""
+    if coupon is None:
+        coupon = get_applied_coupon(request)
+    return price_cart(get_session_cart(request), coupon)
+
 
-    for product_slug, quantity in cart.items():
+def clean_synced_cart(cart):
+    """
+    Keep only well-formed lines of a cart posted by the browser.
+
+    Quantities are coerced to whole numbers and clamped to 1-20, as when
+    adding to the cart; lines whose slug or quantity can't be used are
+    dropped, so nothing malformed reaches the cart store.
+    """
+    if not isinstance(cart, dict):
+        return {}
+    cleaned = {}
+    for slug, quantity in cart.items():
+        if not slug or isinstance(quantity, bool):
+            continue
         try:
-            product = Product.objects.get(slug=product_slug)
-            total += product.price * quantity
-        except Product.DoesNotExist:
-            # Skip products that don't exist
+            quantity = int(quantity)
+        except (TypeError, ValueError, OverflowError):
             continue
-
-    return total
+        if quantity > 0:
+            cleaned[slug] = min(quantity, 20)
+    return cleaned
 
 
 def sync_session_to_model(request):
@@ -46,23 +67,13 @@ def sync_session_to_model(request):
     if not request.user.is_authenticated:
         return
 
-    session_cart = request.session.get("cart", {})
+    session_cart = get_session_cart(request)
 
     # Get or create Cart model for the user
     cart, created = Cart.objects.get_or_create(user=request.user)
 
-    # Sync session cart to Cart model
-    # Clear existing cart items first
-    CartItem.objects.filter(cart=cart).delete()
-
-    # Add items from session cart
-    for product_slug, quantity in session_cart.items():
-        try:
-            product = Product.objects.get(slug=product_slug)
-            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
-        except Product.DoesNotExist:
-            # Skip products that don't exist
-            pass
+    # Apply only the changes between the session cart and the Cart model
+    cart.sync_items(session_cart)
 
 
 # Simple cart implementation using session and localStorage
@@ -85,7 +96,6 @@ def add_to_cart(request, slug=None):
         session_cart = get_session_cart(request)
 
         # DEBUG: Log session state before adding
-        print(f"DEBUG: Session before adding - cart: {request.session.get('cart', {})}")
         print(f"DEBUG: Session keys: {list(request.session.keys())}")
         print(f"DEBUG: Session cart from helper: {session_cart}")
 
@@ -115,18 +125,17 @@ def add_to_cart(request, slug=None):
                 updated_qty = 20
                 messages.warning(request, "Maximum quantity per product is 20 items.")
             session_cart[slug] = updated_qty
+            get_cart_store().set_quantity(request.session, slug, updated_qty)
             messages.success(request, f"Updated {product.name} quantity in your cart.")
         else:
             # Add product to cart
             session_cart[slug] = quantity
+            get_cart_store().set_quantity(request.session, slug, quantity)
             messages.success(request, f"Added {product.name} to your cart.")
 
-        # Save the updated cart to session
-        request.session["cart"] = session_cart
-        request.session.modified = True
+        metrics.CART_OPERATIONS.inc(operation="add")
 
         # DEBUG: Log session state after adding
-        print(f"DEBUG: Session after adding - cart: {request.session.get('cart', {})}")
         print(f"DEBUG: Session modified flag: {request.session.modified}")
         print(f"DEBUG: Session cart after save: {session_cart}")
 
@@ -176,72 +185,23 @@ def get_applied_coupon(request):
     return None
 
 
-def calculate_discount(total, coupon):
-    """Calculate discount amount based on coupon"""
-    if not coupon or total < coupon.min_purchase:
-        return Decimal("0.00")
-
-    if coupon.discount_type == "percentage":
-        return Decimal(total) * (coupon.value / Decimal("100"))
-    else:  # fixed amount
-        return min(coupon.value, total)  # Don't allow discount greater than total
-
-
 def view_cart(request):
     """
     View to display the cart contents
     """
-    cart = request.session.get("cart", {})
-    total = Decimal("0.00")
-    products = []
-
-    # Create a list of items to remove (to avoid modifying dict during iteration)
-    items_to_remove = []
-
-    # First pass - collect data and items to remove
-    for product_slug, quantity in list(cart.items()):
-        try:
-            product = Product.objects.get(slug=product_slug)
-            products.append(
-                {
-                    "product": product,
-                    "quantity": quantity,
-                    "subtotal": product.price * quantity,
-                }
-            )
-            total += product.price * quantity
-        except Product.DoesNotExist:
-            # Add to removal list instead of removing immediately
-            items_to_remove.append(product_slug)
+    cart = get_session_cart(request)
+    pricing = price_cart(cart, get_applied_coupon(request))
 
-    # Second pass - remove non-existent products
-    for product_slug in items_to_remove:
+    # Remove products that no longer exist from the cart
+    for product_slug in pricing.missing_slugs:
         del cart[product_slug]
         messages.warning(
             request, f"We removed a product that's no longer available from your cart."
         )
 
-    # Update the session if we removed any items
-    if items_to_remove:
-        request.session["cart"] = cart
-        request.session.modified = True
-
-    # Get any applied coupon
-    coupon = get_applied_coupon(request)
-
-    # Calculate discount
-    discount = calculate_discount(total, coupon)
-
-    # Calculate subtotal (after discount)
-    subtotal = total - discount
-
-    # Calculate shipping, tax, and total
-    shipping_cost = (
-        Decimal("5.99") if total > 0 else Decimal("0.00")
-    )  # Default shipping cost for Malaysia
-    tax_rate = Decimal("0.06")  # 6% GST in Malaysia
-    tax = subtotal * tax_rate
-    final_total = subtotal + shipping_cost + tax
+    # Update the cart store if we removed any items
+    if pricing.missing_slugs:
+        get_cart_store().remove(request.session, *pricing.missing_slugs)
 
     # Count total items
     items_count = sum(cart.values())
@@ -251,36 +211,28 @@ def view_cart(request):
         return JsonResponse(
             {
                 "success": True,
-                "cart_total": float(total),
-                "discount": float(discount),
-                "subtotal": float(subtotal),
-                "shipping": float(shipping_cost),
-                "tax": float(tax),
-                "final_total": float(final_total),
+                "cart_total": float(pricing.total),
+                "discount": float(pricing.discount),
+                "subtotal": float(pricing.subtotal),
+                "shipping": float(pricing.shipping_cost),
+                "tax": float(pricing.tax),
+                "final_total": float(pricing.final_total),
                 "items_count": items_count,
-                "products_count": len(products),
-                "coupon": (
-                    {
-                        "code": coupon.code,
-                        "value": float(coupon.value),
-                        "discount_type": coupon.discount_type,
-                    }
-                    if coupon
-                    else None
-                ),
+                "products_count": len(pricing.lines),
+                "coupon": pricing.coupon_data(),
             }
         )
 
     context = {
-        "products": products,
-        "total": total,
+        "products": pricing.as_template_items(),
+        "total": pricing.total,
         "items_count": items_count,
-        "coupon": coupon,
-        "discount": discount,
-        "subtotal": subtotal,
-        "shipping_cost": shipping_cost,
-        "tax": tax,
-        "final_total": final_total,
+        "coupon": pricing.coupon,
+        "discount": pricing.discount,
+        "subtotal": pricing.subtotal,
+        "shipping_cost": pricing.shipping_cost,
+        "tax": pricing.tax,
+        "final_total": pricing.final_total,
     }
 
     return render(request, "cart/cart.html", context)
@@ -290,80 +242,38 @@ def remove_from_cart(request, slug):
     """Remove a product from the cart."""
     if request.method == "POST":
         try:
-            # Get the cart from session
-            cart = request.session.get("cart", {})
+            # Get the cart from the cart store
+            cart = get_session_cart(request)
 
             # Check if the product exists in the cart
             if slug in cart:
                 # Remove the product from the cart
-                del cart[slug]
-
-                # Update the cart in session
-                request.session["cart"] = cart
-                request.session.modified = True
+                get_cart_store().remove(request.session, slug)
+                metrics.CART_OPERATIONS.inc(operation="remove")
 
                 # Sync with model cart if user is authenticated
                 if request.user.is_authenticated:
                     sync_session_to_model(request)
 
-                # Calculate the new cart total
-                cart_total = 0
-                # Calculate total items count
-                total_items = 0
-
-                for product_slug, quantity in cart.items():
-                    try:
-                        product = Product.objects.get(slug=product_slug)
-                        cart_total += float(product.price) * quantity
-                        total_items += quantity
-                    except Product.DoesNotExist:
-                        # Skip products that don't exist
-                        continue
-
-                # Get coupon and calculate discount
-                coupon = get_applied_coupon(request)
-                discount = 0
-                if coupon:
-                    if coupon.discount_type == "percentage":
-                        discount = cart_total * (float(coupon.value) / 100)
-                    else:  # fixed amount
-                        discount = min(
-                            float(coupon.value), cart_total
-                        )  # Don't exceed cart total
-
-                # Calculate subtotal after discount
-                subtotal = cart_total - discount
-
-                # Calculate tax and shipping
-                shipping_cost = 5.99 if cart_total > 0 else 0.00
-                tax_rate = 0.06  # 6% GST in Malaysia
-                tax = subtotal * tax_rate
-                final_total = subtotal + shipping_cost + tax
-
                 # Check if this is an AJAX request
                 is_ajax = request.headers.get("X-Requested-With") == "XMLHttpRequest"
 
                 if is_ajax:
+                    # Recalculate the cart totals
+                    pricing = get_cart_pricing(request)
+
                     return JsonResponse(
                         {
                             "success": True,
-                            "cart_total": cart_total,
-                            "subtotal": subtotal,
-                            "discount": discount,
-                            "shipping_cost": shipping_cost,
-                            "tax": tax,
-                            "final_total": final_total,
-                            "total_items": total_items,
+                            "cart_total": float(pricing.total),
+                            "subtotal": float(pricing.subtotal),
+                            "discount": float(pricing.discount),
+                            "shipping_cost": float(pricing.shipping_cost),
+                            "tax": float(pricing.tax),
+                            "final_total": float(pricing.final_total),
+                            "total_items": pricing.items_count,
                             "message": "Product removed from cart",
-                            "coupon": (
-                                {
-                                    "code": coupon.code,
-                                    "value": float(coupon.value),
-                                    "discount_type": coupon.discount_type,
-                                }
-                                if coupon
-                                else None
-                            ),
+                            "coupon": pricing.coupon_data(),
                         }
                     )
                 else:
@@ -408,13 +318,12 @@ def sync_cart(request):
     """Synchronize localStorage cart with session"""
     try:
         data = json.loads(request.body)
-        cart = data.get("cart", {})
+        cart = clean_synced_cart(data.get("cart", {}))
 
-        # Update session cart
-        request.session["cart"] = cart
-
-        # Set session expiry
-        request.session.set_expiry(60 * 60 * 24 * 30)  # 30 days
+        # Replace the stored cart; the browser keeps its own copy in
+        # localStorage, so the session no longer needs a 30-day expiry
+        get_cart_store().replace(request.session, cart)
+        metrics.CART_OPERATIONS.inc(operation="sync")
 
         # Also sync with model cart if user is authenticated
         if request.user.is_authenticated:
@@ -433,69 +342,54 @@ def sync_cart(request):
 
 def api_get_session_cart(request):
     """Get the cart from session for syncing with localStorage"""
-    cart = request.session.get("cart", {})
+    cart = get_session_cart(request)
+    pricing = price_cart(cart)
 
     # Also get product details for each item in cart
-    cart_items = []
-    total = 0
-
-    # Create a copy of the cart to avoid modification during iteration
-    cart_copy = cart.copy()
-    modified = False
-
-    for product_slug, quantity in cart_copy.items():
-        try:
-            # Use filter instead of get to handle non-existent products gracefully
-            product = Product.objects.filter(slug=product_slug).first()
-            if product:
-                subtotal = product.price * quantity
-                total += subtotal
-                cart_items.append(
-                    {
-                        "id": product.id,
-                        "product": {
-                            "id": product.id,
-                            "name": product.name,
-                            "slug": product.slug,
-                            "price": float(product.price),
-                            "image": product.image.url if product.image else None,
-                        },
-                        "quantity": quantity,
-                        "subtotal": float(subtotal),
-                    }
-                )
-            else:
-                # If product doesn't exist, remove it from cart
-                del cart[product_slug]
-                modified = True
-        except Exception as e:
-            # Log any unexpected errors
-            print(f"Error processing cart item with slug {product_slug}: {str(e)}")
-            # Remove problematic item from cart
+    cart_items = [
+        {
+            "id": line.product.id,
+            "product": {
+                "id": line.product.id,
+                "name": line.product.name,
+                "slug": line.product.slug,
+                "price": float(line.product.price),
+                "image": line.product.image.url if line.product.image else None,
+            },
+            "quantity": line.quantity,
+            "subtotal": float(line.subtotal),
+        }
+        for line in pricing.lines
+    ]
+
+    # If a product doesn't exist anymore, remove it from cart
+    if pricing.missing_slugs:
+        for product_slug in pricing.missing_slugs:
             del cart[product_slug]
-            modified = True
-
-    # Update session if cart was modified
-    if modified:
-        request.session["cart"] = cart
-        request.session.modified = True
+        get_cart_store().remove(request.session, *pricing.missing_slugs)
 
     return JsonResponse(
-        {"success": True, "cart": cart, "cart_items": cart_items, "total": float(total)}
+        {
+            "success": True,
+            "cart": cart,
+            "cart_items": cart_items,
+            "total": float(pricing.total),
+        }
     )
 
 
 @login_required
 def clear_cart(request):
     """Clear the cart"""
-    # Clear the cart in session
-    request.session["cart"] = {}
+    # Clear the stored cart
+    get_cart_store().clear(request.session)
 
     # Clear any applied coupon
     if "coupon_id" in request.session:
         del request.session["coupon_id"]
 
     request.session.modified = True
+    metrics.CART_OPERATIONS.inc(operation="clear")
 
     # Also clear the model cart if user is authenticated
     if request.user.is_authenticated:
@@ -548,64 +442,39 @@ def update_quantity(request, slug):
         except (ValueError, TypeError):
             quantity = 1
 
-        # Get the cart from session directly (not using get_session_cart function)
-        session_cart = request.session.get("cart", {})
+        session_cart = get_session_cart(request)
 
-        # Update quantity in session cart
+        # Update quantity in the stored cart
         if slug in session_cart:
             session_cart[slug] = quantity
-            request.session["cart"] = session_cart
-            request.session.modified = True
+            get_cart_store().set_quantity(request.session, slug, quantity)
+            metrics.CART_OPERATIONS.inc(operation="update")
 
             # Sync with model if user is authenticated
             if request.user.is_authenticated:
                 sync_session_to_model(request)
 
-            # Calculate updated cart total
-            cart_total = calculate_cart_total(request)
-
-            # Get coupon and calculate discount
-            coupon = get_applied_coupon(request)
-            discount = calculate_discount(cart_total, coupon)
-
-            # Calculate subtotal (after discount)
-            subtotal = cart_total - discount
+            # Recalculate the cart totals
+            pricing = get_cart_pricing(request)
 
             # Calculate item subtotal
             item_subtotal = product.price * quantity
 
-            # Calculate tax (6%)
-            tax = subtotal * Decimal("0.06")
-
-            # Calculate shipping cost
-            shipping_cost = Decimal("5.99") if cart_total > 0 else Decimal("0.00")
-
-            # Calculate final total
-            final_total = subtotal + tax + shipping_cost
-
             # Count total items
             items_count = sum(session_cart.values())
 
             return JsonResponse(
                 {
                     "success": True,
-                    "cart_total": float(cart_total),
+                    "cart_total": float(pricing.total),
                     "item_subtotal": float(item_subtotal),
-                    "discount": float(discount),
-                    "subtotal": float(subtotal),
-                    "tax": float(tax),
-                    "shipping": float(shipping_cost),
-                    "final_total": float(final_total),
+                    "discount": float(pricing.discount),
+                    "subtotal": float(pricing.subtotal),
+                    "tax": float(pricing.tax),
+                    "shipping": float(pricing.shipping_cost),
+                    "final_total": float(pricing.final_total),
                     "items_count": items_count,
-                    "coupon": (
-                        {
-                            "code": coupon.code,
-                            "value": float(coupon.value),
-                            "discount_type": coupon.discount_type,
-                        }
-                        if coupon
-                        else None
-                    ),
+                    "coupon": pricing.coupon_data(),
                 }
             )
         else:
@@ -737,21 +606,18 @@ def remove_coupon(request):
     # Check if AJAX request
     if request.headers.get("X-Requested-With") == "XMLHttpRequest":
         # Recalculate cart totals
-        cart_total = calculate_cart_total(request)
-        shipping_cost = Decimal("5.99") if cart_total > 0 else Decimal("0.00")
-        tax = cart_total * Decimal("0.06")
-        final_total = cart_total + shipping_cost + tax
+        pricing = price_cart(get_session_cart(request))
 
         return JsonResponse(
             {
                 "success": True,
                 "message": "Coupon has been removed.",
-                "cart_total": float(cart_total),
-                "subtotal": float(cart_total),
+                "cart_total": float(pricing.total),
+                "subtotal": float(pricing.subtotal),
                 "discount": 0,
-                "shipping": float(shipping_cost),
-                "tax": float(tax),
-                "final_total": float(final_total),
+                "shipping": float(pricing.shipping_cost),
+                "tax": float(pricing.tax),
+                "final_total": float(pricing.final_total),
             }
         )
 
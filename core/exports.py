@@ -0,0 +1,146 @@
+"""
+Streaming CSV and NDJSON exports for admin actions.
+
+Rows are read with ``QuerySet.iterator(chunk_size=...)`` and written straight
+to a ``StreamingHttpResponse``, so memory use stays flat however many rows
+are exported. Forward relations are fetched with ``select_related`` and
+reverse ones with ``prefetch_related``, which Django applies per chunk, so
+an export costs a few queries per chunk rather than several per row.
+"""
+
+import csv
+import json
+from dataclasses import dataclass
+from typing import Callable
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models.fields.files import FieldFile
+from django.http import StreamingHttpResponse
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+# Rows written per chunk of the response body
+ROWS_PER_WRITE = 100
+
+
+@dataclass(frozen=True)
+class Column:
+    """An exported column: its header and how to read it from an object"""
+
+    name: str
+    get: Callable
+    # Optional CSV rendering for values that are not plain scalars
+    to_text: Callable = None
+
+
+def model_columns(model):
+    """
+    One column per concrete field of ``model``.
+
+    Relations export as the related object: its string form in CSV and its
+    primary key in NDJSON.
+    """
+    return [
+        Column(field.name, lambda obj, name=field.name: getattr(obj, name))
+        for field in model._meta.fields
+    ]
+
+
+def related_fields(model):
+    """Names of the forward relations of ``model``, for select_related"""
+    return [field.name for field in model._meta.fields if field.is_relation]
+
+
+class Echo:
+    """File-like object whose write() returns the line instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+class ExportEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        if isinstance(o, models.Model):
+            return o.pk
+        if isinstance(o, FieldFile):
+            return o.name or None
+        return super().default(o)
+
+
+def _csv_value(column, obj):
+    value = column.get(obj)
+    return column.to_text(value) if column.to_text else value
+
+
+def _csv_lines(rows, columns):
+    writer = csv.writer(Echo())
+    yield writer.writerow([column.name for column in columns])
+    buffer = []
+    for obj in rows:
+        buffer.append(writer.writerow([_csv_value(column, obj) for column in columns]))
+        if len(buffer) >= ROWS_PER_WRITE:
+            yield "".join(buffer)
+            buffer = []
+    if buffer:
+        yield "".join(buffer)
+
+
+def _ndjson_lines(rows, columns):
+    buffer = []
+    for obj in rows:
+        record = {column.name: column.get(obj) for column in columns}
+        buffer.append(json.dumps(record, cls=ExportEncoder) + "\n")
+        if len(buffer) >= ROWS_PER_WRITE:
+            yield "".join(buffer)
+            buffer = []
+    if buffer:
+        yield "".join(buffer)
+
+
+def stream_export(
+    queryset,
+    filename,
+    fmt="csv",
+    columns=None,
+    select_related=None,
+    prefetch_related=(),
+    chunk_size=2000,
+):
+    """
+    Stream ``queryset`` as a CSV or NDJSON attachment.
+
+    Args:
+        queryset: Objects to export
+        filename (str): Attachment name without extension
+        fmt (str): "csv" or "ndjson"
+        columns (list): Columns to write; defaults to every concrete field
+        select_related (list): Forward relations to join; defaults to all
+            forward relations of the model
+        prefetch_related (tuple): Lookups prefetched for each chunk
+        chunk_size (int): Rows fetched from the database at a time
+
+    Returns:
+        StreamingHttpResponse: The export, written as it is read
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    model = queryset.model
+    if columns is None:
+        columns = model_columns(model)
+    if select_related is None:
+        select_related = related_fields(model)
+
+    if select_related:
+        # select_related() without arguments would follow every relation
+        queryset = queryset.select_related(*select_related)
+    rows = queryset.prefetch_related(*prefetch_related).iterator(chunk_size=chunk_size)
+    lines = _csv_lines(rows, columns) if fmt == "csv" else _ndjson_lines(rows, columns)
+
+    response = StreamingHttpResponse(lines, content_type=FORMATS[fmt])
+    response["Content-Disposition"] = f"attachment; filename={filename}.{fmt}"
+    return response
@@ -0,0 +1,64 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import read_profiles, summarize_profiles
+
+# Longest SQL shown in the text report
+SQL_WIDTH = 120
+
+
+class Command(BaseCommand):
+    help = (
+        "Summarize the request profiling log: the slowest views and the most "
+        "repeated SQL queries"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "logs",
+            nargs="*",
+            help="Log files to read (default: logs/profiling.log and its backups)",
+        )
+        parser.add_argument("--top", type=int, default=10, help="Rows per table")
+        parser.add_argument("--json", action="store_true", help="Print JSON")
+
+    def handle(self, *args, **options):
+        paths = options["logs"] or sorted(
+            Path(settings.LOGS_DIR).glob("profiling.log*")
+        )
+        missing = [str(path) for path in paths if not Path(path).is_file()]
+        if not paths or missing:
+            raise CommandError(
+                f"No profiling log found: {', '.join(missing) or settings.LOGS_DIR}"
+            )
+
+        summary = summarize_profiles(read_profiles(paths), top=options["top"])
+        if options["json"]:
+            self.stdout.write(json.dumps(summary, indent=2))
+            return
+
+        self.stdout.write(self.style.MIGRATE_HEADING("Slowest views (by p95)"))
+        self.stdout.write(
+            f"{'view':<40} {'reqs':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} "
+            f"{'sql':>6} {'sql ms':>8} {'tpl ms':>8} {'hit/miss':>10}"
+        )
+        for row in summary["views"]:
+            self.stdout.write(
+                f"{row['view'][:40]:<40} {row['requests']:>6} {row['p50_ms']:>9.1f} "
+                f"{row['p95_ms']:>9.1f} {row['max_ms']:>9.1f} "
+                f"{row['mean_sql_count']:>6} {row['mean_sql_ms']:>8.1f} "
+                f"{row['mean_template_ms']:>8.1f} "
+                f"{row['cache_hits']:>5}/{row['cache_misses']:<4}"
+            )
+
+        self.stdout.write("")
+        self.stdout.write(self.style.MIGRATE_HEADING("Most repeated queries"))
+        self.stdout.write(f"{'count':>7} {'requests':>8} {'total ms':>9}  sql")
+        for row in summary["queries"]:
+            self.stdout.write(
+                f"{row['count']:>7} {row['requests']:>8} {row['ms']:>9.1f}  "
+                f"{row['sql'][:SQL_WIDTH]}"
+            )
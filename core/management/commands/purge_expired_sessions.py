@@ -0,0 +1,60 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired sessions in bounded batches, so the sweep never holds "
+        "a long lock on django_session"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Sessions deleted per batch"
+        )
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            default=0,
+            help="Stop after this many batches (0: until none are left)",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.0,
+            help="Seconds to sleep between batches, to leave room for requests",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1")
+        if options["max_batches"] < 0:
+            raise CommandError("--max-batches cannot be negative")
+        if options["pause"] < 0:
+            raise CommandError("--pause cannot be negative")
+
+        now = timezone.now()
+        expired = Session.objects.filter(expire_date__lt=now)
+
+        deleted = batches = 0
+        while not options["max_batches"] or batches < options["max_batches"]:
+            # Each batch is its own short DELETE by primary key
+            keys = list(expired.values_list("session_key", flat=True)[:batch_size])
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            batches += 1
+            if len(keys) < batch_size:
+                break
+            if options["pause"]:
+                time.sleep(options["pause"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {deleted} expired sessions in {batches} batches"
+            )
+        )
@@ -0,0 +1,65 @@
+import json
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.seed import SHOPPER_PASSWORD, seed_store
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a fresh database with a catalog, shoppers and orders for "
+        "scripts/benchmark_flows.py, and write the fixture the benchmark reads"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--root-categories", type=int, default=10)
+        parser.add_argument("--subcategories", type=int, default=3)
+        parser.add_argument("--products-per-category", type=int, default=50)
+        parser.add_argument(
+            "--shoppers",
+            type=int,
+            default=50,
+            help="Shopper accounts, one per concurrent virtual user",
+        )
+        parser.add_argument("--orders-per-shopper", type=int, default=10)
+        parser.add_argument("--stock", type=int, default=100000)
+        parser.add_argument(
+            "--output",
+            default="benchmark_fixture.json",
+            help="Where to write the fixture (default: benchmark_fixture.json)",
+        )
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username="shopper0").exists():
+            raise CommandError(
+                "Benchmark data is already present; seed a fresh database instead"
+            )
+
+        with transaction.atomic():
+            store = seed_store(
+                root_categories=options["root_categories"],
+                subcategories=options["subcategories"],
+                products_per_category=options["products_per_category"],
+                shoppers=options["shoppers"],
+                orders_per_shopper=options["orders_per_shopper"],
+                stock=options["stock"],
+            )
+
+        fixture = {
+            "password": SHOPPER_PASSWORD,
+            "shoppers": [user.username for user in store["shoppers"]],
+            "categories": [category.slug for category in store["categories"]],
+            "products": [product.slug for product in store["products"]],
+        }
+        with open(options["output"], "w") as f:
+            json.dump(fixture, f, indent=2)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {len(fixture['products'])} products and "
+                f"{len(fixture['shoppers'])} shoppers; fixture written to "
+                f"{options['output']}"
+            )
+        )
@@ -0,0 +1,234 @@
+"""
+In-process metrics exposed in the Prometheus text format.
+
+Counters and histograms are kept as flat samples in the process that records
+them. With ``METRICS_MULTIPROCESS_DIR`` set, each worker process also writes
+its samples to ``<dir>/metrics_<pid>.json`` (at most every
+``METRICS_FLUSH_INTERVAL`` seconds, and when it exits) and the exposition
+sums the files of every worker, so a scrape sees the whole server whichever
+worker answers it. Like other multiprocess collectors, the directory should
+be emptied when the server is (re)started.
+"""
+
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return "{" + pairs + "}"
+
+
+class Registry:
+    """Samples of every metric in this process, keyed by (name, labels)"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.samples = defaultdict(float)
+        self.pid = os.getpid()
+        self.flushed_at = 0.0
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def add(self, updates):
+        """Add each (sample name, labels, amount) of ``updates`` atomically"""
+        with self.lock:
+            if os.getpid() != self.pid:
+                # Forked worker: samples copied from the parent are not ours
+                self.samples.clear()
+                self.pid = os.getpid()
+            for name, labels, amount in updates:
+                self.samples[(name, labels)] += amount
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.samples)
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+    # Multiprocess mode
+
+    def directory(self):
+        path = getattr(settings, "METRICS_MULTIPROCESS_DIR", None)
+        return Path(path) if path else None
+
+    def flush(self, force=False):
+        """Write this process's samples to the multiprocess directory"""
+        directory = self.directory()
+        now = time.monotonic()
+        if directory is None or (
+            not force and now - self.flushed_at < settings.METRICS_FLUSH_INTERVAL
+        ):
+            return
+        self.flushed_at = now
+        rows = [
+            [name, labels, value] for (name, labels), value in self.snapshot().items()
+        ]
+
+        directory.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so readers never see a half-written file
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(rows, f)
+        os.replace(tmp, directory / f"metrics_{os.getpid()}.json")
+
+    def collect(self):
+        """Samples of the whole server: every worker's file, or this process"""
+        directory = self.directory()
+        if directory is None:
+            return self.snapshot()
+
+        self.flush(force=True)
+        totals = defaultdict(float)
+        for path in directory.glob("metrics_*.json"):
+            try:
+                with open(path) as f:
+                    rows = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in rows:
+                totals[(name, tuple(tuple(pair) for pair in labels))] += value
+        return totals
+
+    def exposition(self):
+        """All metrics in the Prometheus text format"""
+        samples = self.collect()
+        lines = []
+        for metric in sorted(self.metrics.values(), key=lambda m: m.name):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels in sorted(key for key in samples if metric.owns(key[0])):
+                lines.append(
+                    f"{name}{_format_labels(labels)} "
+                    f"{_format_value(samples[(name, labels)])}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        registry.register(self)
+
+    def owns(self, sample_name):
+        return sample_name == self.name
+
+    def _labels(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {self.labelnames}")
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+
+class Counter(Metric):
+    """A value that only goes up; name it with a ``_total`` suffix"""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        self.registry.add([(self.name, self._labels(labels), amount)])
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets, with their sum and count"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def owns(self, sample_name):
+        return sample_name in (
+            f"{self.name}_bucket",
+            f"{self.name}_sum",
+            f"{self.name}_count",
+        )
+
+    def observe(self, value, **labels):
+        labels = self._labels(labels)
+        updates = [
+            (f"{self.name}_bucket", labels + (("le", _format_value(bound)),), 1)
+            for bound in self.buckets
+            if value <= bound
+        ]
+        updates += [
+            (f"{self.name}_bucket", labels + (("le", "+Inf"),), 1),
+            (f"{self.name}_sum", labels, value),
+            (f"{self.name}_count", labels, 1),
+        ]
+        self.registry.add(updates)
+
+
+REQUEST_LATENCY = Histogram(
+    "grocerygo_request_duration_seconds",
+    "Time to handle a request, by view",
+    ["view", "method"],
+)
+REQUESTS = Counter(
+    "grocerygo_requests_total",
+    "Requests handled, by view and status code",
+    ["view", "method", "status"],
+)
+REQUEST_DB_QUERIES = Histogram(
+    "grocerygo_request_db_queries",
+    "SQL queries run per request, by view",
+    ["view"],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+DB_QUERY_SECONDS = Counter(
+    "grocerygo_db_query_seconds_total",
+    "Time spent running SQL queries, by view",
+    ["view"],
+)
+CACHE_REQUESTS = Counter(
+    "grocerygo_cache_requests_total",
+    "Cache lookups by result (hit or miss)",
+    ["result"],
+)
+CHECKOUT_COMMITS = Counter(
+    "grocerygo_checkout_commits_total",
+    "Checkout commits by outcome",
+    ["outcome"],
+)
+CART_OPERATIONS = Counter(
+    "grocerygo_cart_operations_total",
+    "Changes made to shopping carts, by operation",
+    ["operation"],
+)
+
+atexit.register(REGISTRY.flush, force=True)
@@ -0,0 +1,279 @@
+"""
+Opt-in request profiling.
+
+When ``REQUEST_PROFILING_ENABLED`` is set, ``ProfilingMiddleware`` samples
+``REQUEST_PROFILING_SAMPLE_RATE`` of requests and writes one JSON line per
+sampled request to the "profiling" logger (a rotating file, see LOGGING):
+the view name, status, total time, SQL query count and time, template render
+time, cache hits and misses, and the most repeated SQL statements. The
+``profile_summary`` command aggregates the log into the slowest views and
+the most repeated queries.
+
+When profiling is disabled the middleware removes itself at startup, so
+unsampled production traffic pays nothing.
+"""
+
+import json
+import logging
+import math
+import random
+import re
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+logger = logging.getLogger("profiling")
+
+# Repeated statements kept per request, most executed first
+TOP_QUERIES = 10
+
+_current = ContextVar("request_profile", default=None)
+
+_IN_LIST = re.compile(r"\((?:%s, )+%s\)")
+
+
+def normalize_sql(sql):
+    """Collapse IN lists so statements differing only in list length match"""
+    return _IN_LIST.sub("(%s, ...)", sql)
+
+
+class RequestProfile:
+    """Counters collected while one sampled request is handled"""
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.queries = defaultdict(lambda: [0, 0.0])
+        self.template_seconds = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        """Database execute wrapper timing every statement"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.sql_count += 1
+            self.sql_seconds += elapsed
+            entry = self.queries[normalize_sql(sql)]
+            entry[0] += 1
+            entry[1] += elapsed
+
+    def record(self, request, response, total_seconds):
+        match = getattr(request, "resolver_match", None)
+        repeated = sorted(self.queries.items(), key=lambda item: -item[1][0])
+        return {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "total_ms": round(total_seconds * 1000, 2),
+            "sql_count": self.sql_count,
+            "sql_ms": round(self.sql_seconds * 1000, 2),
+            "template_ms": round(self.template_seconds * 1000, 2),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "queries": [
+                {"sql": sql, "count": count, "ms": round(seconds * 1000, 2)}
+                for sql, (count, seconds) in repeated[:TOP_QUERIES]
+            ],
+        }
+
+
+def _profile_template_render(render):
+    @wraps(render)
+    def wrapper(self, context):
+        profile = _current.get()
+        if profile is None:
+            return render(self, context)
+        # Included templates render inside their parent; time the outermost
+        profile.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            profile.template_depth -= 1
+            if not profile.template_depth:
+                profile.template_seconds += time.perf_counter() - started
+
+    wrapper._profiled = True
+    return wrapper
+
+
+def _profile_cache_get(get):
+    @wraps(get)
+    def wrapper(self, key, default=None, version=None):
+        value = get(self, key, default, version)
+        profile = _current.get()
+        # get_many of most backends calls get per key; count those lookups once
+        if profile is not None and not profile.cache_depth:
+            if value is default:
+                profile.cache_misses += 1
+            else:
+                profile.cache_hits += 1
+        return value
+
+    wrapper._profiled = True
+    return wrapper
+
+
+def _profile_cache_get_many(get_many):
+    @wraps(get_many)
+    def wrapper(self, keys, version=None):
+        profile = _current.get()
+        if profile is None:
+            return get_many(self, keys, version)
+        keys = list(keys)
+        profile.cache_depth += 1
+        try:
+            found = get_many(self, keys, version)
+        finally:
+            profile.cache_depth -= 1
+        if not profile.cache_depth:
+            profile.cache_hits += len(found)
+            profile.cache_misses += len(keys) - len(found)
+        return found
+
+    wrapper._profiled = True
+    return wrapper
+
+
+def instrument():
+    """Patch template rendering and the configured cache backends, once"""
+    if not getattr(Template.render, "_profiled", False):
+        Template.render = _profile_template_render(Template.render)
+    for alias in settings.CACHES:
+        backend_class = type(caches[alias])
+        if not getattr(backend_class.get, "_profiled", False):
+            backend_class.get = _profile_cache_get(backend_class.get)
+        if not getattr(backend_class.get_many, "_profiled", False):
+            backend_class.get_many = _profile_cache_get_many(backend_class.get_many)
+
+
+@contextmanager
+def profile_request():
+    """
+    Collect a RequestProfile for the block.
+
+    Blocks nested in one another share the outermost profile, so the
+    profiling and metrics middleware can both be installed. ``instrument()``
+    must have been called for template and cache figures to be collected.
+    """
+    profile = _current.get()
+    if profile is not None:
+        yield profile
+        return
+
+    profile = RequestProfile()
+    token = _current.set(profile)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile.execute))
+            yield profile
+    finally:
+        _current.reset(token)
+
+
+class ProfilingMiddleware:
+    """
+    Middleware profiling a sample of requests; place it first in MIDDLEWARE
+    so the total time covers the other middleware too.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.REQUEST_PROFILING_SAMPLE_RATE
+        instrument()
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        with profile_request() as profile:
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+
+        logger.info(json.dumps(profile.record(request, response, total)))
+        return response
+
+
+def read_profiles(paths):
+    """Yield the records of profiling logs, skipping lines that are not JSON"""
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def _percentile(sorted_values, pct):
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize_profiles(records, top=10):
+    """
+    Aggregate profiling records.
+
+    Returns:
+        dict: "views", the ``top`` slowest views by p95 total time, and
+        "queries", the ``top`` statements executed most often overall
+    """
+    views = defaultdict(list)
+    queries = defaultdict(lambda: {"count": 0, "ms": 0.0, "requests": 0})
+    for record in records:
+        views[record.get("view") or record["path"]].append(record)
+        for query in record.get("queries", []):
+            entry = queries[query["sql"]]
+            entry["count"] += query["count"]
+            entry["ms"] += query["ms"]
+            entry["requests"] += 1
+
+    view_rows = []
+    for view, samples in views.items():
+        totals = sorted(sample["total_ms"] for sample in samples)
+        count = len(samples)
+        view_rows.append(
+            {
+                "view": view,
+                "requests": count,
+                "p50_ms": _percentile(totals, 50),
+                "p95_ms": _percentile(totals, 95),
+                "max_ms": totals[-1],
+                "mean_sql_count": round(
+                    sum(s["sql_count"] for s in samples) / count, 1
+                ),
+                "mean_sql_ms": round(sum(s["sql_ms"] for s in samples) / count, 2),
+                "mean_template_ms": round(
+                    sum(s["template_ms"] for s in samples) / count, 2
+                ),
+                "cache_hits": sum(s["cache_hits"] for s in samples),
+                "cache_misses": sum(s["cache_misses"] for s in samples),
+            }
+        )
+    view_rows.sort(key=lambda row: -row["p95_ms"])
+
+    query_rows = [
+        {"sql": sql, **entry, "ms": round(entry["ms"], 2)}
+        for sql, entry in queries.items()
+    ]
+    query_rows.sort(key=lambda row: -row["count"])
+    return {"views": view_rows[:top], "queries": query_rows[:top]}
@@ -0,0 +1,166 @@
+"""
+Seed data of realistic shape for query budgets and load benchmarks.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.contrib.auth.tokens import default_token_generator
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from cart.models import Cart, CartItem, Coupon
+from orders.models import Address, Checkout, CheckoutItem
+from orders.rollups import rebuild_sales_rollups
+from products.counts import rebuild_category_counts
+from products.families import family_key
+from products.models import Category, Product
+from products.search import rebuild_search_index
+
+SHOPPER_PASSWORD = "budget-pass-123"
+
+
+def _address(user, **kwargs):
+    return Address.objects.create(
+        user=user,
+        address_type="shipping",
+        full_name=user.username.title(),
+        street_address="1 Jalan Budget",
+        city="Kuala Lumpur",
+        state="Wilayah Persekutuan",
+        postal_code="50000",
+        country="Malaysia",
+        **kwargs,
+    )
+
+
+def seed_store(
+    root_categories=4,
+    subcategories=2,
+    products_per_category=20,
+    shoppers=10,
+    orders_per_shopper=3,
+    items_per_order=3,
+    cart_items=8,
+    stock=100,
+):
+    """
+    Create a catalog, shoppers with order histories and one full cart.
+
+    Products and orders are bulk-created, then the denormalized counts,
+    search index and sales rollups are rebuilt once.
+
+    Every shopper's password is ``SHOPPER_PASSWORD``.
+
+    Returns:
+        dict: The main ``shopper``, their ``session_cart``, the ``context``
+            used to fill the placeholders of budget entries, and every
+            seeded ``shoppers``, ``categories`` and ``products``
+    """
+    categories = []
+    for i in range(root_categories):
+        root = Category.objects.create(name=f"Aisle {i}")
+        categories.append(root)
+        for j in range(subcategories):
+            categories.append(
+                Category.objects.create(name=f"Aisle {i} Shelf {j}", parent=root)
+            )
+
+    products = []
+    for category in categories:
+        for k in range(products_per_category):
+            name = f"{category.name} Item {k} ({k % 3 + 1}kg)"
+            products.append(
+                Product(
+                    name=name,
+                    slug=f"{category.slug}-item-{k}",
+                    description=f"Fresh {name.lower()} from the {category.name} aisle",
+                    category=category,
+                    family_key=family_key(name),
+                    price=Decimal("1.50") + k,
+                    discount_price=Decimal("1.00") + k if k % 4 == 0 else None,
+                    stock=stock,
+                    is_featured=k < 2,
+                )
+            )
+    products = Product.objects.bulk_create(products)
+    rebuild_category_counts()
+    rebuild_search_index()
+
+    users = [
+        User.objects.create_user(
+            f"shopper{n}", f"shopper{n}@example.com", SHOPPER_PASSWORD
+        )
+        for n in range(shoppers)
+    ]
+    addresses = {user.pk: _address(user, is_default=True) for user in users}
+
+    checkouts = Checkout.objects.bulk_create(
+        [
+            Checkout(
+                user=user,
+                shipping_address=addresses[user.pk],
+                payment_method="cash_on_delivery",
+                subtotal=Decimal("0.00"),
+                shipping_cost=Decimal("5.99"),
+                tax=Decimal("0.00"),
+                total=Decimal("0.00"),
+                status="pending" if n == 0 else "delivered",
+            )
+            for user in users
+            for n in range(orders_per_shopper)
+        ]
+    )
+    items = []
+    for n, checkout in enumerate(checkouts):
+        for m in range(items_per_order):
+            product = products[(n * items_per_order + m) % len(products)]
+            items.append(
+                CheckoutItem(
+                    checkout=checkout,
+                    product=product,
+                    quantity=m + 1,
+                    price=product.price,
+                )
+            )
+    CheckoutItem.objects.bulk_create(items)
+    rebuild_sales_rollups()
+
+    shopper = users[0]
+    cart = Cart.objects.create(user=shopper)
+    cart_products = products[:cart_items]
+    CartItem.objects.bulk_create(
+        [
+            CartItem(cart=cart, product=product, quantity=2, price=product.price)
+            for product in cart_products
+        ]
+    )
+    coupon = Coupon.objects.create(
+        code="BUDGET10",
+        value=Decimal("10"),
+        valid_from=timezone.now() - timedelta(days=1),
+        valid_to=timezone.now() + timedelta(days=30),
+    )
+    spare_address = _address(shopper)
+
+    order = Checkout.objects.filter(user=shopper, status="pending").first()
+    return {
+        "shopper": shopper,
+        "shoppers": users,
+        "categories": categories,
+        "products": products,
+        "session_cart": {product.slug: 2 for product in cart_products},
+        "context": {
+            "product_slug": products[0].slug,
+            "cart_product_slug": cart_products[0].slug,
+            "category_slug": categories[0].slug,
+            "order_id": order.pk,
+            "address_id": addresses[shopper.pk].pk,
+            "spare_address_id": spare_address.pk,
+            "coupon_code": coupon.code,
+            "uidb64": urlsafe_base64_encode(force_bytes(shopper.pk)),
+            "token": default_token_generator.make_token(shopper),
+        },
+    }
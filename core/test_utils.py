@@ -0,0 +1,149 @@
+"""
+Query and wall-time budget harness for the public URLs.
+
+``core.seed.seed_store`` fills the database with a catalog, shoppers, a cart
+and an order history of realistic shape. ``QueryBudgetTestCase`` then requests
+every URL listed in ``query_budgets.json`` and fails when a view runs more
+SQL queries or takes longer than its budget, so an N+1 regression shows up
+as a failing test naming the view and its new query count.
+
+Each budget entry names a URL and may give:
+
+    kwargs        URL kwargs; "{placeholders}" are filled from the seed
+    method        "get" (default) or "post"
+    data          Form data for the request, formatted like kwargs
+    json          JSON body for the request
+    user          "shopper" to request as the seeded, logged-in shopper, or
+                  "staff" as a logged-in staff member
+    session_cart  true to put the shopper's cart in the session first
+    max_queries   Upper bound on SQL queries for the request
+    max_ms        Upper bound on wall time (defaults to the file's default)
+
+Requests run with a cold cache, inside a savepoint that is rolled back
+afterwards, so entries cannot affect each other.
+"""
+
+import json
+import time
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from cart.storage import get_cart_store
+
+from .seed import seed_store
+
+BUDGETS_FILE = Path(__file__).with_name("query_budgets.json")
+
+# URL namespaces held to a budget; the admin has its own changelist test
+BUDGETED_NAMESPACES = {"core", "accounts", "products", "cart", "orders"}
+
+
+def load_budgets(path=BUDGETS_FILE):
+    """Read the budget file, filling in the default wall-time budget"""
+    with open(path) as f:
+        budgets = json.load(f)
+    default_ms = budgets["default_max_ms"]
+    return [{"max_ms": default_ms, **entry} for entry in budgets["urls"]]
+
+
+def budgeted_url_names():
+    """Every URL name the budget file is expected to cover"""
+
+    def walk(patterns, namespace=None):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                inner = pattern.namespace or namespace
+                if inner in BUDGETED_NAMESPACES:
+                    yield from walk(pattern.url_patterns, inner)
+            elif isinstance(pattern, URLPattern) and pattern.name:
+                if namespace:
+                    yield f"{namespace}:{pattern.name}"
+                elif not pattern.pattern.regex.pattern.startswith("^__"):
+                    yield pattern.name
+
+    return set(walk(get_resolver().url_patterns))
+
+
+def _fill(values, context):
+    return {
+        key: value.format(**context) if isinstance(value, str) else value
+        for key, value in (values or {}).items()
+    }
+
+
+class QueryBudgetTestCase(TestCase):
+    """TestCase that seeds the store once and measures budget entries"""
+
+    seed_options = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.store = seed_store(**cls.seed_options)
+        cls.staff = User.objects.create_user(
+            username="budget-staff", password="pass", is_staff=True
+        )
+
+    def measure(self, entry):
+        """
+        Request one budget entry with a cold cache.
+
+        Returns:
+            tuple: (response, number of queries, wall time in ms)
+        """
+        context = self.store["context"]
+        # Cleared first, as the cart store may keep carts in the cache
+        cache.clear()
+        client = Client()
+        if entry.get("user") == "shopper":
+            client.force_login(self.store["shopper"])
+        elif entry.get("user") == "staff":
+            client.force_login(self.staff)
+        if entry.get("session_cart"):
+            session = client.session
+            get_cart_store().replace(session, self.store["session_cart"])
+            session.save()
+
+        url = reverse(entry["name"], kwargs=_fill(entry.get("kwargs"), context))
+        method = getattr(client, entry.get("method", "get"))
+        if "json" in entry:
+            request_kwargs = {
+                "data": json.dumps(entry["json"]),
+                "content_type": "application/json",
+            }
+        else:
+            request_kwargs = {"data": _fill(entry.get("data"), context)}
+
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = method(url, **request_kwargs)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        return response, len(queries), elapsed_ms
+
+    def assertWithinBudget(self, entry):
+        """Request an entry, roll its writes back and check its budgets"""
+        savepoint = transaction.savepoint()
+        try:
+            response, query_count, elapsed_ms = self.measure(entry)
+        finally:
+            transaction.savepoint_rollback(savepoint)
+
+        name = entry["name"]
+        self.assertLess(
+            response.status_code, 400, f"{name} returned {response.status_code}"
+        )
+        self.assertLessEqual(
+            query_count,
+            entry["max_queries"],
+            f"{name} ran {query_count} queries, budget is {entry['max_queries']}",
+        )
+        self.assertLessEqual(
+            elapsed_ms,
+            entry["max_ms"],
+            f"{name} took {elapsed_ms:.0f}ms, budget is {entry['max_ms']}ms",
+        )
@@ -1,3 +1,515 @@
-from django.test import TestCase
+import json
+import tempfile
+import threading
+import time
+from io import StringIO
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.cached_db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from cart.models import Cart, CartItem, Coupon
+from core import metrics
+from core.profiling import (
+    instrument,
+    normalize_sql,
+    profile_request,
+    summarize_profiles,
+)
+from core.test_utils import QueryBudgetTestCase, budgeted_url_names, load_budgets
+from grocerygo.admin import admin_site
+from orders.models import Address, Checkout, CheckoutItem, OrderStatusHistory
+from products.models import Category, Product, StockReservation
+
+from grocerygo.dashboard import cached_payload, get_system_status, run_health_probes
+
+
+@override_settings(ADMIN_DASHBOARD_CACHE_TTL=60, ADMIN_DASHBOARD_STALE_TTL=600)
+class DashboardCacheTest(TestCase):
+    """Tests for the stale-while-revalidate admin dashboard cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+        # Background refreshes are queued here instead of starting threads
+        self.queued = []
+        patcher = patch(
+            "grocerygo.dashboard.run_in_background", side_effect=self.queued.append
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_fresh_values_are_served_from_cache(self):
+        """Test that a cold cache computes once and later reads hit the cache"""
+        self.assertEqual(cached_payload("stats", self.compute), 1)
+        self.assertEqual(cached_payload("stats", self.compute), 1)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(self.queued, [])
+
+    def test_stale_values_are_served_while_one_refresh_runs(self):
+        """Test that stale entries are returned and refreshed in the background"""
+        cached_payload("stats", self.compute)
+
+        with patch("grocerygo.dashboard.time.time", return_value=time.time() + 61):
+            self.assertEqual(cached_payload("stats", self.compute), 1)
+            self.assertEqual(cached_payload("stats", self.compute), 1)
+
+        self.assertEqual(len(self.queued), 1)
+        self.queued[0]()
+        self.assertEqual(cached_payload("stats", self.compute), 2)
+
+    def test_system_status_never_probes_in_the_request(self):
+        """Test that a cold health lookup returns placeholders immediately"""
+        status = get_system_status()
+
+        self.assertEqual({info["status"] for info in status.values()}, {"checking"})
+        self.assertEqual(len(self.queued), 1)
+
+    def test_slow_probes_time_out(self):
+        """Test that a hung probe is reported without waiting for it"""
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        status = run_health_probes(
+            {"Fast": lambda: {"status": "good", "message": "OK"}, "Hung": release.wait},
+            timeout=0.1,
+        )
+
+        self.assertEqual(status["Fast"]["status"], "good")
+        self.assertEqual(status["Hung"]["status"], "error")
+        self.assertIn("Timed out", status["Hung"]["message"])
+
+    def test_admin_index_uses_cached_stats(self):
+        """Test that repeated admin home loads reuse the cached stats"""
+        User.objects.create_superuser("admin", "admin@example.com", "adminpass")
+        self.client.login(username="admin", password="adminpass")
+
+        response = self.client.get("/admin/")
+        self.assertContains(response, "Checking...")
+
+        with patch(
+            "grocerygo.admin.CustomAdminSite.compute_dashboard_stats"
+        ) as compute:
+            self.client.get("/admin/")
+        compute.assert_not_called()
+
+
+class AdminChangelistQueryTest(TestCase):
+    """Tests that admin changelists cost a fixed number of queries"""
+
+    # Session, user, count, page rows and per-admin extras (filters,
+    # date hierarchy, coupon stats); none of them grow with the page
+    QUERY_BUDGET = 10
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            "admin", "admin@example.com", "adminpass"
+        )
+        self.client.login(username="admin", password="adminpass")
+        # Record activity now, so the first measured request does not write it
+        self.client.get(reverse("core:about"))
+        self.parent = Category.objects.create(name="Food")
+        self.rows = 0
+
+    def populate(self, count):
+        """Add ``count`` rows to every model with an admin"""
+        for _ in range(count):
+            self.rows += 1
+            n = self.rows
+            user = User.objects.create_user(f"shopper{n}", f"s{n}@example.com")
+            category = Category.objects.create(name=f"Aisle {n}", parent=self.parent)
+            product = Product.objects.create(
+                name=f"Item {n}",
+                slug=f"item-{n}",
+                price=Decimal("2.00"),
+                category=category,
+            )
+            address = Address.objects.create(
+                user=user,
+                address_type="shipping",
+                full_name=f"Shopper {n}",
+                street_address="1 Test St",
+                city="Test City",
+                state="Test State",
+                postal_code="12345",
+                country="Malaysia",
+            )
+            checkout = Checkout.objects.create(
+                user=user,
+                shipping_address=address,
+                payment_method="cash_on_delivery",
+                subtotal=Decimal("4.00"),
+                tax=Decimal("0.00"),
+                total=Decimal("4.00"),
+            )
+            CheckoutItem.objects.create(
+                checkout=checkout, product=product, quantity=2, price=product.price
+            )
+            OrderStatusHistory.objects.create(
+                checkout=checkout, status="pending", created_by=self.admin
+            )
+            StockReservation.objects.create(
+                product=product,
+                user=user,
+                quantity=1,
+                expires_at=timezone.now() + timedelta(minutes=15),
+            )
+            cart = Cart.objects.create(user=user)
+            CartItem.objects.create(
+                cart=cart, product=product, quantity=3, price=product.price
+            )
+            Coupon.objects.create(
+                code=f"SAVE{n}",
+                value=Decimal("10"),
+                valid_from=timezone.now(),
+                valid_to=timezone.now() + timedelta(days=7),
+            )
+
+    def changelist_queries(self):
+        counts = {}
+        for model in admin_site._registry:
+            url = reverse(
+                f"admin:{model._meta.app_label}_{model._meta.model_name}_changelist"
+            )
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            counts[url] = len(queries)
+        return counts
+
+    def test_changelists_stay_within_budget(self):
+        """Test that query counts are bounded and independent of row count"""
+        self.populate(2)
+        few = self.changelist_queries()
+        self.populate(6)
+        many = self.changelist_queries()
+
+        self.assertEqual(few, many)
+        for url, count in many.items():
+            self.assertLessEqual(count, self.QUERY_BUDGET, url)
+
+    def test_cart_totals_match_the_model(self):
+        """Test that the annotated cart totals agree with Cart's properties"""
+        self.populate(1)
+        cart_admin = admin_site._registry[Cart]
+        request = self.client.get("/").wsgi_request
+        request.user = self.admin
+
+        cart = cart_admin.get_queryset(request).get()
+
+        self.assertEqual(cart_admin.get_total_items(cart), cart.total_items)
+        self.assertEqual(cart_admin.get_total_price(cart), cart.total_price)
+
+
+class QueryBudgetTest(QueryBudgetTestCase):
+    """Tests holding every public URL to its query and wall-time budget"""
+
+    def test_budget_file_covers_every_url(self):
+        """Test that new URLs cannot be added without a budget"""
+        budgeted = {entry["name"] for entry in load_budgets()}
+        self.assertEqual(budgeted_url_names() - budgeted, set())
+
+    def test_views_stay_within_budget(self):
+        """Test each budgeted request against its limits"""
+        for entry in load_budgets():
+            with self.subTest(entry["name"], method=entry.get("method", "get")):
+                self.assertWithinBudget(entry)
+
+
+@override_settings(REQUEST_PROFILING_ENABLED=True, REQUEST_PROFILING_SAMPLE_RATE=1.0)
+class ProfilingMiddlewareTest(TestCase):
+    """Tests for the opt-in request profiler and its summary command"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Fruit", slug="fruit")
+        Product.objects.create(
+            name="Apple",
+            slug="apple",
+            category=category,
+            price=Decimal("1.00"),
+            stock=10,
+        )
+
+    def profile(self, url):
+        with self.assertLogs("profiling", "INFO") as logs:
+            self.client.get(url)
+        self.assertEqual(len(logs.records), 1)
+        return json.loads(logs.records[0].getMessage())
+
+    def test_records_sampled_request(self):
+        """Test that a sampled request logs its view, SQL, templates and cache"""
+        cache.clear()
+        record = self.profile(reverse("core:home"))
+
+        self.assertEqual(record["view"], "core:home")
+        self.assertEqual(record["status"], 200)
+        self.assertGreater(record["sql_count"], 0)
+        self.assertEqual(
+            record["sql_count"], sum(query["count"] for query in record["queries"])
+        )
+        self.assertGreater(record["template_ms"], 0)
+        self.assertLessEqual(record["template_ms"], record["total_ms"])
+        self.assertGreater(record["cache_misses"], 0)
+
+        # The second render is served from what the first one cached
+        self.assertGreater(self.profile(reverse("core:home"))["cache_hits"], 0)
+
+    def test_get_many_lookups_are_counted_once(self):
+        """Test that get_many hits and misses are not counted again per key"""
+        instrument()
+        cache.clear()
+        cache.set("profiled-a", 1)
+
+        with profile_request() as profile:
+            cache.get_many(["profiled-a", "profiled-b"])
+            cache.get("profiled-a")
+
+        self.assertEqual((profile.cache_hits, profile.cache_misses), (2, 1))
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_not_logged(self):
+        with self.assertNoLogs("profiling", "INFO"):
+            self.client.get(reverse("core:home"))
+
+    @override_settings(REQUEST_PROFILING_ENABLED=False)
+    def test_disabled_by_default(self):
+        with self.assertNoLogs("profiling", "INFO"):
+            self.client.get(reverse("core:home"))
+
+    def test_normalize_sql_collapses_in_lists(self):
+        self.assertEqual(
+            normalize_sql("SELECT 1 WHERE id IN (%s, %s, %s)"),
+            normalize_sql("SELECT 1 WHERE id IN (%s, %s)"),
+        )
+
+    def test_summary_ranks_views_and_queries(self):
+        """Test the slowest views and most repeated queries come first"""
+
+        def record(view, total_ms, queries):
+            return {
+                "view": view,
+                "path": "/",
+                "total_ms": total_ms,
+                "sql_count": sum(count for _, count in queries),
+                "sql_ms": 1.0,
+                "template_ms": 1.0,
+                "cache_hits": 1,
+                "cache_misses": 0,
+                "queries": [
+                    {"sql": sql, "count": count, "ms": 0.5} for sql, count in queries
+                ],
+            }
+
+        records = [
+            record("fast", 5, [("SELECT a", 1)]),
+            record("slow", 50, [("SELECT b", 20), ("SELECT a", 1)]),
+            record("slow", 70, [("SELECT b", 20)]),
+        ]
+        summary = summarize_profiles(records, top=5)
+
+        self.assertEqual([row["view"] for row in summary["views"]], ["slow", "fast"])
+        self.assertEqual(summary["views"][0]["requests"], 2)
+        self.assertEqual(summary["views"][0]["p95_ms"], 70)
+        self.assertEqual(summary["queries"][0]["sql"], "SELECT b")
+        self.assertEqual(summary["queries"][0]["count"], 40)
+        self.assertEqual(summary["queries"][0]["requests"], 2)
+
+        with tempfile.NamedTemporaryFile("w", suffix=".log") as log:
+            log.write("\n".join(json.dumps(r) for r in records) + "\nnot json\n")
+            log.flush()
+            out = StringIO()
+            call_command("profile_summary", log.name, "--json", stdout=out)
+        self.assertEqual(json.loads(out.getvalue())["views"][0]["view"], "slow")
+
+
+class MetricsTest(TestCase):
+    """Tests for request metrics, Server-Timing and the /metrics endpoint"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            username="staff", password="pass", is_staff=True
+        )
+        category = Category.objects.create(name="Fruit", slug="fruit")
+        Product.objects.create(
+            name="Apple",
+            slug="apple",
+            category=category,
+            price=Decimal("1.00"),
+            stock=10,
+        )
+
+    def setUp(self):
+        metrics.REGISTRY.clear()
+
+    def sample(self, name, **labels):
+        key = (name, tuple((label, str(value)) for label, value in labels.items()))
+        return metrics.REGISTRY.snapshot().get(key, 0)
+
+    def test_records_requests_per_view(self):
+        self.client.get(reverse("core:home"))
+        self.client.get(reverse("core:home"))
+
+        self.assertEqual(
+            self.sample(
+                "grocerygo_requests_total", view="core:home", method="GET", status=200
+            ),
+            2,
+        )
+        self.assertEqual(
+            self.sample(
+                "grocerygo_request_duration_seconds_count",
+                view="core:home",
+                method="GET",
+            ),
+            2,
+        )
+        self.assertGreater(
+            self.sample("grocerygo_request_db_queries_sum", view="core:home"), 0
+        )
+        self.assertGreater(
+            self.sample("grocerygo_cache_requests_total", result="hit"), 0
+        )
+
+    def test_cart_operations_are_counted(self):
+        self.client.post(reverse("cart:add_to_cart", args=["apple"]), {"quantity": 1})
+        self.assertEqual(
+            self.sample("grocerygo_cart_operations_total", operation="add"), 1
+        )
+
+    def test_server_timing_is_for_staff(self):
+        response = self.client.get(reverse("core:home"))
+        self.assertFalse(response.has_header("Server-Timing"))
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("core:home"))
+        self.assertRegex(response["Server-Timing"], r'db;dur=[\d.]+;desc="\d+ queries"')
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+
+        self.client.get(reverse("core:home"))
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        body = response.content.decode()
+        self.assertIn("# TYPE grocerygo_requests_total counter", body)
+        self.assertIn(
+            'grocerygo_requests_total{view="core:home",method="GET",status="200"} 1',
+            body,
+        )
+
+    @override_settings(METRICS_TOKEN="scrape-token")
+    def test_metrics_endpoint_accepts_bearer_token(self):
+        url = reverse("metrics")
+        self.assertEqual(
+            self.client.get(url, HTTP_AUTHORIZATION="Bearer wrong").status_code, 403
+        )
+        self.assertEqual(
+            self.client.get(url, HTTP_AUTHORIZATION="Bearer scrape-token").status_code,
+            200,
+        )
+
+    def test_histogram_buckets_are_cumulative(self):
+        metrics.REQUEST_LATENCY.observe(0.03, view="v", method="GET")
+        text = metrics.REGISTRY.exposition()
+        self.assertNotIn('view="v",method="GET",le="0.025"', text)
+        self.assertIn('{view="v",method="GET",le="0.05"} 1', text)
+        self.assertIn('{view="v",method="GET",le="+Inf"} 1', text)
+        self.assertIn(
+            'grocerygo_request_duration_seconds_sum{view="v",method="GET"} 0.03', text
+        )
+
+    def test_multiprocess_mode_sums_workers(self):
+        """Test that a scrape adds up the files written by every worker"""
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(METRICS_MULTIPROCESS_DIR=directory):
+                metrics.CHECKOUT_COMMITS.inc(outcome="committed")
+                # Another worker's flushed samples
+                other = [
+                    ["grocerygo_checkout_commits_total", [["outcome", "committed"]], 2]
+                ]
+                with open(f"{directory}/metrics_999999.json", "w") as f:
+                    json.dump(other, f)
+
+                text = metrics.REGISTRY.exposition()
+
+        self.assertIn('grocerygo_checkout_commits_total{outcome="committed"} 3', text)
+
+
+class SessionTest(TestCase):
+    """Tests for cached sessions and the expired session sweeper"""
+
+    def make_sessions(self, count, expired):
+        now = timezone.now()
+        offset = timedelta(days=-1 if expired else 1)
+        Session.objects.bulk_create(
+            Session(
+                session_key=f"{'old' if expired else 'new'}{n:029d}",
+                session_data="",
+                expire_date=now + offset,
+            )
+            for n in range(count)
+        )
+
+    def purge(self, *args):
+        out = StringIO()
+        call_command("purge_expired_sessions", *args, stdout=out)
+        return out.getvalue()
+
+    def test_sessions_are_read_from_the_cache(self):
+        session = SessionStore()
+        session["cart_id"] = "abc"
+        session.create()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(SessionStore(session.session_key)["cart_id"], "abc")
+
+    def test_sessions_stay_in_the_database_without_a_shared_cache(self):
+        # The default cache is per-process LocMem
+        self.assertEqual(settings.SESSION_ENGINE, "django.contrib.sessions.backends.db")
+
+    def test_purge_deletes_only_expired_sessions(self):
+        self.make_sessions(5, expired=True)
+        self.make_sessions(2, expired=False)
+
+        output = self.purge("--batch-size", "2")
+
+        self.assertIn("Deleted 5 expired sessions in 3 batches", output)
+        self.assertEqual(Session.objects.count(), 2)
+        self.assertFalse(Session.objects.filter(expire_date__lt=timezone.now()))
+
+    def test_purge_rejects_invalid_bounds(self):
+        self.make_sessions(1, expired=True)
+
+        for args in (
+            ("--batch-size", "0"),
+            ("--batch-size", "-1"),
+            ("--max-batches", "-1"),
+            ("--pause", "-0.5"),
+        ):
+            with self.subTest(args=args), self.assertRaises(CommandError):
+                self.purge(*args)
+        self.assertEqual(Session.objects.count(), 1)
+
+    def test_purge_can_be_bounded(self):
+        self.make_sessions(5, expired=True)
+        self.purge("--batch-size", "2", "--max-batches", "1")
+        self.assertEqual(Session.objects.count(), 3)
@@ -1,6 +1,11 @@
 from django.shortcuts import render
+from django.conf import settings
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from products.models import Category, Product
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from core import metrics
+from products.category_tree import get_category_tree
+from products.models import Product
 
 # Create your views here.
 
@@ -10,17 +15,19 @@ def home(request):
     View for the home page
     """
     # Get top-level categories (no parent)
-    categories = Category.objects.filter(parent=None, active=True)[:6]
+    categories = get_category_tree().roots()[:6]
 
     # Get featured products, limit to 8
     featured_products = Product.objects.filter(
         is_featured=True, is_active=True, parent=None
-    )[:8]
+    ).select_related("category")[:8]
 
     # If we have less than 8 featured products, add some regular products
     if featured_products.count() < 8:
-        regular_products = Product.objects.filter(is_active=True, parent=None).exclude(
-            id__in=[p.id for p in featured_products]
+        regular_products = (
+            Product.objects.filter(is_active=True, parent=None)
+            .select_related("category")
+            .exclude(id__in=[p.id for p in featured_products])
         )
         needed = 8 - featured_products.count()
         featured_products = list(featured_products) + list(regular_products[:needed])
@@ -37,9 +44,11 @@ def deals(request):
     View for the deals page - displays all featured products with pagination
     """
     # Get all featured products, ordered by name
-    featured_products = Product.objects.filter(
-        is_featured=True, is_active=True, parent=None
-    ).order_by("name")
+    featured_products = (
+        Product.objects.filter(is_featured=True, is_active=True, parent=None)
+        .select_related("category")
+        .order_by("name")
+    )
 
     # Pagination - 12 products per page
     paginator = Paginator(featured_products, 12)
@@ -70,3 +79,18 @@ def about(request):
         "page_title": "About Us",
     }
     return render(request, "core/about.html", context)
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint, for staff sessions or the METRICS_TOKEN bearer
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    token_ok = bool(token) and constant_time_compare(authorization, f"Bearer {token}")
+    if not (token_ok or request.user.is_staff):
+        return HttpResponseForbidden("Staff only")
+
+    return HttpResponse(
+        metrics.REGISTRY.exposition(), content_type=metrics.CONTENT_TYPE
+    )
@@ -1,20 +1,24 @@
 from django.contrib import admin
 from django.contrib.auth.models import User
-from django.db.models import Sum, Count
-from django.db import connection
-from django.core.cache import cache
-from django.core.mail import get_connection
 from django.template.response import TemplateResponse
 from django.urls import path
-from django.utils.timezone import now
+from django.utils.timezone import localdate
 from decimal import Decimal
 import os
-import shutil
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
+from grocerygo.dashboard import cached_payload, get_system_status
 from orders.models import Checkout
+from orders.reports import (
+    order_status_counts,
+    revenue_since,
+    top_products,
+    total_orders as total_orders_placed,
+)
 from products.models import Product
 
+DASHBOARD_STATS_KEY = "admin:dashboard:stats"
+
 
 class CustomAdminSite(admin.AdminSite):
     """Custom Admin Site with dashboard functionality"""
@@ -23,41 +27,36 @@ class CustomAdminSite(admin.AdminSite):
     site_title = "GroceryGo Admin"
     index_title = "Dashboard"
 
-    def get_dashboard_stats(self):
+    def compute_dashboard_stats(self):
         """Get real-time dashboard statistics"""
-        try:
-            # Get current month start date
-            current_month_start = now().replace(
-                day=1, hour=0, minute=0, second=0, microsecond=0
-            )
+        # Get current month start date
+        current_month_start = localdate().replace(day=1)
 
-            # Total counts
-            total_orders = Checkout.objects.count()
-            total_products = Product.objects.filter(is_active=True).count()
-            total_users = User.objects.filter(is_active=True).count()
-
-            # Monthly revenue calculation
-            monthly_revenue = Checkout.objects.filter(
-                created_at__gte=current_month_start,
-                status__in=[
-                    "processing",
-                    "shipped",
-                    "delivered",
-                ],  # Only count processed orders
-            ).aggregate(total=Sum("total"))["total"] or Decimal("0.00")
-
-            # Recent orders (last 10)
-            recent_orders = Checkout.objects.select_related("user").order_by(
-                "-created_at"
-            )[:10]
+        # Total counts
+        total_orders = total_orders_placed()
+        total_products = Product.objects.filter(is_active=True).count()
+        total_users = User.objects.filter(is_active=True).count()
 
-            return {
-                "total_orders": total_orders,
-                "total_products": total_products,
-                "total_users": total_users,
-                "monthly_revenue": monthly_revenue,
-                "recent_orders": recent_orders,
-            }
+        # Monthly revenue from the daily sales rollup (processed orders only)
+        monthly_revenue = revenue_since(current_month_start) or Decimal("0.00")
+
+        # Recent orders (last 10), evaluated so they can be cached
+        recent_orders = list(
+            Checkout.objects.select_related("user").order_by("-created_at")[:10]
+        )
+
+        return {
+            "total_orders": total_orders,
+            "total_products": total_products,
+            "total_users": total_users,
+            "monthly_revenue": monthly_revenue,
+            "recent_orders": recent_orders,
+        }
+
+    def get_dashboard_stats(self):
+        """Get dashboard statistics, served from cache while revalidating"""
+        try:
+            return cached_payload(DASHBOARD_STATS_KEY, self.compute_dashboard_stats)
         except Exception as e:
             # Return default values if there's an error
             return {
@@ -70,89 +69,8 @@ class CustomAdminSite(admin.AdminSite):
             }
 
     def get_system_status(self):
-        """Get system status information"""
-        status = {
-            "Database Connection": {"status": "error", "message": "Unknown"},
-            "Cache System": {"status": "error", "message": "Unknown"},
-            "Email Service": {"status": "error", "message": "Unknown"},
-            "Storage": {"status": "error", "message": "Unknown", "usage": 0},
-        }
-
-        # Database connection test
-        try:
-            with connection.cursor() as cursor:
-                cursor.execute("SELECT 1")
-                status["Database Connection"] = {
-                    "status": "active",
-                    "message": "Connected",
-                }
-        except Exception as e:
-            status["Database Connection"] = {
-                "status": "error",
-                "message": f"Connection failed: {str(e)}",
-            }
-
-        # Cache system test
-        try:
-            cache.set("health_check", "test", 10)
-            if cache.get("health_check") == "test":
-                status["Cache System"] = {"status": "running", "message": "Working"}
-            else:
-                status["Cache System"] = {
-                    "status": "error",
-                    "message": "Cache not responding",
-                }
-        except Exception as e:
-            status["Cache System"] = {
-                "status": "error",
-                "message": f"Cache error: {str(e)}",
-            }
-
-        # Email service test
-        try:
-            connection = get_connection()
-            connection.open()
-            connection.close()
-            status["Email Service"] = {
-                "status": "operational",
-                "message": "SMTP accessible",
-            }
-        except Exception as e:
-            status["Email Service"] = {
-                "status": "error",
-                "message": f"SMTP error: {str(e)}",
-            }
-
-        # Storage status
-        try:
-            from django.conf import settings
-
-            total, used, free = shutil.disk_usage(settings.BASE_DIR)
-            usage_percent = int((used / total) * 100)
-
-            if usage_percent < 80:
-                storage_status = "good"
-                message = f"{usage_percent}% Used"
-            elif usage_percent < 90:
-                storage_status = "warning"
-                message = f"{usage_percent}% Used"
-            else:
-                storage_status = "critical"
-                message = f"{usage_percent}% Used"
-
-            status["Storage"] = {
-                "status": storage_status,
-                "message": message,
-                "usage": usage_percent,
-            }
-        except Exception as e:
-            status["Storage"] = {
-                "status": "error",
-                "message": f"Storage check failed: {str(e)}",
-                "usage": 0,
-            }
-
-        return status
+        """Get the last known system status; probes run in the background"""
+        return get_system_status()
 
     def index(self, request, extra_context=None):
         """Custom admin index view with dashboard data"""
@@ -209,58 +127,67 @@ class CustomAdminSite(admin.AdminSite):
         return custom_urls + urls
 
     def sales_trend_api(self, request, days=7):
-        """API endpoint for sales trend data"""
+        """
+        API endpoint for sales trend data.
+
+        Covers the last ``days`` local days up to today, or the inclusive
+        ``?start=YYYY-MM-DD&end=YYYY-MM-DD`` range, grouped into
+        ``?bucket=day|week|month`` buckets with a single query. The range is
+        widened to whole buckets, so no week or month is charted from only
+        part of its days.
+        """
         from django.http import JsonResponse
-        from datetime import datetime, timedelta
-        from django.db.models import Sum, Count
         from django.utils import timezone
+        from orders.reports import BUCKETS, bucket_start, next_bucket, sales_trend
 
-        # Calculate date range
-        end_date = timezone.now()
-        start_date = end_date - timedelta(days=days)
+        bucket = request.GET.get("bucket", "day")
+        try:
+            end_date = date.fromisoformat(
+                request.GET.get("end") or timezone.localdate().isoformat()
+            )
+            start_date = (
+                date.fromisoformat(request.GET["start"])
+                if request.GET.get("start")
+                else end_date - timedelta(days=max(days, 1) - 1)
+            )
+        except ValueError:
+            return JsonResponse({"error": "Dates must be YYYY-MM-DD"}, status=400)
 
-        # Get sales data for the period
-        orders_by_day = []
-        for i in range(days):
-            day_start = start_date + timedelta(days=i)
-            day_end = day_start + timedelta(days=1)
+        if bucket not in BUCKETS:
+            return JsonResponse({"error": "Unknown bucket"}, status=400)
+        if start_date > end_date or (end_date - start_date).days > 3660:
+            return JsonResponse({"error": "Invalid date range"}, status=400)
 
-            daily_sales = Checkout.objects.filter(
-                created_at__gte=day_start,
-                created_at__lt=day_end,
-                status__in=["processing", "shipped", "delivered"],
-            ).aggregate(total_sales=Sum("total"), order_count=Count("id"))
+        start_date = bucket_start(start_date, bucket)
+        end_date = next_bucket(bucket_start(end_date, bucket), bucket) - timedelta(
+            days=1
+        )
+        trend = sales_trend(start_date, end_date, bucket)
 
-            orders_by_day.append(
-                {
-                    "date": day_start.strftime("%Y-%m-%d"),
-                    "day_name": day_start.strftime("%a"),
-                    "sales": float(daily_sales["total_sales"] or 0),
-                    "orders": daily_sales["order_count"] or 0,
-                }
-            )
+        if bucket == "month":
+            label_format = "%b %Y"
+        elif bucket == "week" or len(trend) > 7:
+            label_format = "%d %b"
+        else:
+            label_format = "%a"
 
         return JsonResponse(
             {
-                "labels": [day["day_name"] for day in orders_by_day],
-                "sales_data": [day["sales"] for day in orders_by_day],
-                "order_data": [day["orders"] for day in orders_by_day],
+                "bucket": bucket,
+                "start": start_date.isoformat(),
+                "end": end_date.isoformat(),
+                "dates": [row["date"].isoformat() for row in trend],
+                "labels": [row["date"].strftime(label_format) for row in trend],
+                "sales_data": [float(row["sales"]) for row in trend],
+                "order_data": [row["orders"] for row in trend],
             }
         )
 
     def order_status_api(self, request):
         """API endpoint for order status distribution"""
         from django.http import JsonResponse
-        from django.db.models import Count
 
-        status_counts = (
-            Checkout.objects.values("status")
-            .annotate(count=Count("id"))
-            .order_by("status")
-        )
-
-        status_labels = []
-        status_data = []
+        status_counts = order_status_counts()
         status_colors = {
             "pending": "#f59e0b",
             "processing": "#3b82f6",
@@ -269,17 +196,13 @@ class CustomAdminSite(admin.AdminSite):
             "cancelled": "#ef4444",
         }
 
-        for item in status_counts:
-            status_labels.append(item["status"].title())
-            status_data.append(item["count"])
-
         return JsonResponse(
             {
-                "labels": status_labels,
-                "data": status_data,
+                "labels": [status.title() for status in status_counts],
+                "data": list(status_counts.values()),
                 "colors": [
                     status_colors.get(status.lower(), "#6b7280")
-                    for status in [item["status"] for item in status_counts]
+                    for status in status_counts
                 ],
             }
         )
@@ -287,27 +210,16 @@ class CustomAdminSite(admin.AdminSite):
     def top_products_api(self, request):
         """API endpoint for top selling products"""
         from django.http import JsonResponse
-        from django.db.models import Sum, Count
-        from orders.models import CheckoutItem
-
-        # Get top selling products by quantity
-        top_products = (
-            CheckoutItem.objects.values("product__name")
-            .annotate(
-                total_sold=Sum("quantity"),
-                order_count=Count("checkout_id", distinct=True),
-            )
-            .order_by("-total_sold")[:10]
-        )
-
-        product_names = []
-        product_sales = []
 
-        for item in top_products:
-            product_names.append(item["product__name"])
-            product_sales.append(item["total_sold"])
+        # Get top selling products by quantity from the product sales rollup
+        products = top_products(10)
 
-        return JsonResponse({"labels": product_names, "data": product_sales})
+        return JsonResponse(
+            {
+                "labels": [item["product__name"] for item in products],
+                "data": [item["total_sold"] for item in products],
+            }
+        )
 
     def low_stock_api(self, request):
         """API endpoint for low stock products"""
@@ -361,14 +273,14 @@ from orders.admin import (
     CheckoutAdmin,
     CheckoutItemAdmin,
 )
-from products.admin import CategoryAdmin, ProductAdmin
+from products.admin import CategoryAdmin, ProductAdmin, StockReservationAdmin
 from orders.models import (
     Address,
     OrderStatusHistory,
     Checkout,
     CheckoutItem,
 )
-from products.models import Category, Product
+from products.models import Category, Product, StockReservation
 from cart.models import Cart, CartItem, Coupon
 from cart.admin import CartAdmin, CartItemAdmin, CouponAdmin
 
@@ -381,6 +293,7 @@ admin_site.register(Checkout, CheckoutAdmin)
 admin_site.register(CheckoutItem, CheckoutItemAdmin)
 admin_site.register(Category, CategoryAdmin)
 admin_site.register(Product, ProductAdmin)
+admin_site.register(StockReservation, StockReservationAdmin)
 admin_site.register(Cart, CartAdmin)
 admin_site.register(CartItem, CartItemAdmin)
 admin_site.register(Coupon, CouponAdmin)
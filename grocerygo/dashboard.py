@@ -0,0 +1,210 @@
+"""
+Cached payloads for the admin dashboard.
+
+Dashboard statistics and system health are cached with stale-while-revalidate
+semantics: an entry is served as is for ``ADMIN_DASHBOARD_CACHE_TTL`` seconds,
+then served stale for up to ``ADMIN_DASHBOARD_STALE_TTL`` more seconds while a
+single background thread recomputes it. Only a cold cache computes in the
+request, and system health never does: its probes always run in the
+background, each with its own timeout, so the admin index never waits on
+SMTP or the disk.
+"""
+
+import logging
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import get_connection
+from django.db import connection, connections
+
+logger = logging.getLogger("admin")
+
+SYSTEM_STATUS_KEY = "admin:dashboard:system_status"
+
+# Shown until the first background health check completes
+CHECKING = "checking"
+
+
+def run_in_background(func):
+    """Run ``func`` in a daemon thread that releases its DB connections"""
+
+    def target():
+        try:
+            func()
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+
+def _store(key, value):
+    fresh_for = settings.ADMIN_DASHBOARD_CACHE_TTL
+    cache.set(
+        key,
+        (value, time.time() + fresh_for),
+        fresh_for + settings.ADMIN_DASHBOARD_STALE_TTL,
+    )
+
+
+def refresh(key, compute):
+    """Recompute and store a payload, returning the new value"""
+    value = compute()
+    _store(key, value)
+    return value
+
+
+def _refresh_in_background(key, compute):
+    """Start one background refresh of ``key`` unless one is running"""
+    lock = f"{key}:refreshing"
+    # Bounded so a crashed worker cannot block refreshes for good
+    if not cache.add(lock, True, settings.ADMIN_DASHBOARD_CACHE_TTL):
+        return
+
+    def task():
+        try:
+            refresh(key, compute)
+        except Exception:
+            logger.exception("Refreshing %s failed", key)
+        finally:
+            cache.delete(lock)
+
+    run_in_background(task)
+
+
+def cached_payload(key, compute, background_only=False, placeholder=None):
+    """
+    Return the cached value of ``key``, refreshing it as needed.
+
+    Args:
+        key (str): Cache key
+        compute: Callable producing the payload
+        background_only (bool): Never compute in the caller, even on a cold
+            cache; ``placeholder`` is returned until a value is ready
+        placeholder: Value returned by a cold background-only lookup
+
+    Returns:
+        The fresh or stale cached value, or a newly computed one
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until = entry
+        if time.time() >= fresh_until:
+            _refresh_in_background(key, compute)
+        return value
+    if background_only:
+        _refresh_in_background(key, compute)
+        return placeholder
+    return refresh(key, compute)
+
+
+def check_database():
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        return {"status": "active", "message": "Connected"}
+    except Exception as e:
+        return {"status": "error", "message": f"Connection failed: {str(e)}"}
+    finally:
+        # Probes run in worker threads, each with its own connection
+        connection.close()
+
+
+def check_cache():
+    try:
+        cache.set("health_check", "test", 10)
+        if cache.get("health_check") == "test":
+            return {"status": "running", "message": "Working"}
+        return {"status": "error", "message": "Cache not responding"}
+    except Exception as e:
+        return {"status": "error", "message": f"Cache error: {str(e)}"}
+
+
+def check_email():
+    try:
+        mail_connection = get_connection(timeout=settings.SYSTEM_HEALTH_PROBE_TIMEOUT)
+        mail_connection.open()
+        mail_connection.close()
+        return {"status": "operational", "message": "SMTP accessible"}
+    except Exception as e:
+        return {"status": "error", "message": f"SMTP error: {str(e)}"}
+
+
+def check_storage():
+    try:
+        total, used, free = shutil.disk_usage(settings.BASE_DIR)
+        usage_percent = int((used / total) * 100)
+
+        if usage_percent < 80:
+            storage_status = "good"
+        elif usage_percent < 90:
+            storage_status = "warning"
+        else:
+            storage_status = "critical"
+
+        return {
+            "status": storage_status,
+            "message": f"{usage_percent}% Used",
+            "usage": usage_percent,
+        }
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Storage check failed: {str(e)}",
+            "usage": 0,
+        }
+
+
+HEALTH_PROBES = {
+    "Database Connection": check_database,
+    "Cache System": check_cache,
+    "Email Service": check_email,
+    "Storage": check_storage,
+}
+
+
+def run_health_probes(probes=None, timeout=None):
+    """
+    Run health probes concurrently, giving up on any still running after
+    ``timeout`` seconds.
+
+    Returns:
+        dict: Mapping of service name to {"status", "message"[, "usage"]}
+    """
+    probes = HEALTH_PROBES if probes is None else probes
+    if timeout is None:
+        timeout = settings.SYSTEM_HEALTH_PROBE_TIMEOUT
+
+    executor = ThreadPoolExecutor(max_workers=len(probes))
+    futures = {name: executor.submit(probe) for name, probe in probes.items()}
+    wait(futures.values(), timeout=timeout)
+    # Do not wait for hung probes; their threads finish on their own
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    status = {}
+    for name, future in futures.items():
+        if not future.done():
+            status[name] = {"status": "error", "message": f"Timed out after {timeout}s"}
+        elif future.exception() is not None:
+            status[name] = {"status": "error", "message": str(future.exception())}
+        else:
+            status[name] = future.result()
+    return status
+
+
+def get_system_status():
+    """Last known system health, refreshed in the background"""
+    placeholder = {
+        name: {"status": CHECKING, "message": "Checking..."} for name in HEALTH_PROBES
+    }
+    return cached_payload(
+        SYSTEM_STATUS_KEY,
+        run_health_probes,
+        background_only=True,
+        placeholder=placeholder,
+    )
@@ -67,6 +67,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Opt-in request profiling, first so it times the whole stack
+    "core.profiling.ProfilingMiddleware",
+    "accounts.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -112,6 +115,24 @@ DATABASES = {
     }
 }
 
+# Cache
+# Per-process LocMem unless CACHE_BACKEND names a cache shared by all worker
+# processes, e.g. django.core.cache.backends.redis.RedisCache with
+# CACHE_LOCATION set to the server URL.
+
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
+    }
+}
+PROCESS_LOCAL_CACHE_BACKENDS = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -190,6 +211,22 @@ SESSION_COOKIE_AGE = int(
     os.environ.get("SESSION_COOKIE_AGE", 86400)
 )  # 1 day in seconds
 
+# Sessions are kept in the database. When SESSION_CACHE_ALIAS names a cache
+# shared by all worker processes they are also read from it and written
+# through, so most requests never query django_session. A per-process cache
+# is never used for sessions by default: a worker could serve a session
+# another has changed or ended. Expired rows are removed by
+# `manage.py purge_expired_sessions`, run from cron.
+SESSION_CACHE_ALIAS = os.environ.get("SESSION_CACHE_ALIAS", "default")
+SESSION_ENGINE = os.environ.get(
+    "SESSION_ENGINE",
+    (
+        "django.contrib.sessions.backends.db"
+        if CACHES[SESSION_CACHE_ALIAS]["BACKEND"] in PROCESS_LOCAL_CACHE_BACKENDS
+        else "django.contrib.sessions.backends.cached_db"
+    ),
+)
+
 # CSRF settings
 CSRF_COOKIE_SECURE = IS_PRODUCTION
 CSRF_COOKIE_HTTPONLY = True
@@ -229,6 +266,69 @@ USER_INACTIVITY_TIMEOUT = int(
     os.environ.get("USER_INACTIVITY_TIMEOUT", 30)
 )  # 30 minutes
 
+# Activity tracking for the inactivity timeout - the last activity time is
+# only rewritten once it is this old, and is kept in the "session" or, to stop
+# activity from saving sessions at all, in the shared "cache"
+USER_ACTIVITY_GRANULARITY = int(
+    os.environ.get("USER_ACTIVITY_GRANULARITY", 60)
+)  # 1 minute
+USER_ACTIVITY_STORE = os.environ.get("USER_ACTIVITY_STORE", "session")
+
+# Checkout stock reservations - how long items are held for a shopper
+# while they complete the checkout steps
+STOCK_RESERVATION_TTL = int(
+    os.environ.get("STOCK_RESERVATION_TTL", 15)
+)  # 15 minutes
+
+# Rendered product card fragments - stale entries are never read again once
+# the product or its category changes, this only bounds how long they linger
+PRODUCT_CARD_CACHE_TIMEOUT = int(
+    os.environ.get("PRODUCT_CARD_CACHE_TIMEOUT", 60 * 60)
+)  # 1 hour
+
+# Shopping cart storage (see cart/storage.py) - "session" keeps the cart in
+# the session, "cache" as a hash per cart in the CART_CACHE_ALIAS cache (a
+# native hash on Redis) expiring after CART_STORE_TTL, and "local" in an
+# in-process stand-in for tests
+CART_STORE = os.environ.get("CART_STORE", "session")
+CART_CACHE_ALIAS = os.environ.get("CART_CACHE_ALIAS", "default")
+CART_STORE_TTL = int(
+    os.environ.get("CART_STORE_TTL", 60 * 60 * 24 * 30)
+)  # 30 days
+
+# Admin dashboard payloads - served fresh for the TTL, then served stale for
+# up to the stale TTL while a background thread recomputes them
+ADMIN_DASHBOARD_CACHE_TTL = int(
+    os.environ.get("ADMIN_DASHBOARD_CACHE_TTL", 60)
+)  # 1 minute
+ADMIN_DASHBOARD_STALE_TTL = int(
+    os.environ.get("ADMIN_DASHBOARD_STALE_TTL", 10 * 60)
+)  # 10 minutes
+
+# Seconds each system health probe (database, cache, SMTP, disk) may take
+SYSTEM_HEALTH_PROBE_TIMEOUT = int(
+    os.environ.get("SYSTEM_HEALTH_PROBE_TIMEOUT", 3)
+)  # 3 seconds
+
+# Request profiling - when enabled, this fraction of requests is profiled and
+# logged to logs/profiling.log; summarize it with `manage.py profile_summary`
+REQUEST_PROFILING_ENABLED = os.environ.get("REQUEST_PROFILING_ENABLED") == "True"
+REQUEST_PROFILING_SAMPLE_RATE = float(
+    os.environ.get("REQUEST_PROFILING_SAMPLE_RATE", 0.1)
+)  # 10% of requests
+
+# Request metrics served at /metrics in the Prometheus text format. Staff
+# sessions can read them, as can scrapers sending "Authorization: Bearer
+# <METRICS_TOKEN>". With several worker processes, point
+# METRICS_MULTIPROCESS_DIR at a directory shared by the workers (emptied on
+# each deploy) so every scrape covers all of them.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "True") == "True"
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+METRICS_MULTIPROCESS_DIR = os.environ.get("METRICS_MULTIPROCESS_DIR")
+METRICS_FLUSH_INTERVAL = int(
+    os.environ.get("METRICS_FLUSH_INTERVAL", 5)
+)  # 5 seconds
+
 # File Upload Restrictions
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10 MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10 MB
@@ -250,6 +350,11 @@ LOGGING = {
             "format": "{asctime} {levelname} {message}",
             "style": "{",
         },
+        # Profiling records are JSON objects, one per line
+        "json_lines": {
+            "format": "{message}",
+            "style": "{",
+        },
     },
     "filters": {
         "require_debug_false": {
@@ -282,6 +387,14 @@ LOGGING = {
             "backupCount": 5,
             "formatter": "security",
         },
+        "profiling_file": {
+            "level": "INFO",
+            "class": "logging.handlers.RotatingFileHandler",
+            "filename": LOGS_DIR / "profiling.log",
+            "maxBytes": 1024 * 1024 * 10,  # 10 MB
+            "backupCount": 5,
+            "formatter": "json_lines",
+        },
         "mail_admins": {
             "level": "ERROR",
             "filters": ["require_debug_false"],
@@ -315,6 +428,11 @@ LOGGING = {
             "level": "INFO",
             "propagate": False,
         },
+        "profiling": {
+            "handlers": ["profiling_file"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
 }
 
@@ -18,7 +18,13 @@ Including another URLconf
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from products.views import categories_view, category_detail_view, product_detail_view
+from products.views import (
+    api_product_list,
+    categories_view,
+    category_detail_view,
+    product_detail_view,
+)
+from core.views import metrics_view
 from .admin import admin_site
 
 urlpatterns = [
@@ -31,8 +37,11 @@ urlpatterns = [
     path("categories/", categories_view, name="category_list"),
     path("category/<slug:slug>/", category_detail_view, name="category_detail"),
     path("product/<slug:slug>/", product_detail_view, name="product_detail"),
+    path("api/products/", api_product_list, name="api_product_list"),
     path("cart/", include("cart.urls", namespace="cart")),
     path("orders/", include("orders.urls", namespace="orders")),
+    # Prometheus metrics, staff only
+    path("metrics", metrics_view, name="metrics"),
     path("__reload__/", include("django_browser_reload.urls")),
 ]
 
@@ -6,8 +6,9 @@ from .models import (
     CheckoutItem,
 )
 from django.core.exceptions import PermissionDenied
-import csv
-from django.http import HttpResponse
+from django.db.models import Count
+from core.exports import Column, model_columns, stream_export
+from .rollups import set_order_status
 
 
 class OrderStatusHistoryInline(admin.TabularInline):
@@ -22,30 +23,24 @@ class AddressAdmin(admin.ModelAdmin):
     list_filter = ["address_type", "is_default", "city", "state", "country"]
     search_fields = ["user__username", "full_name", "street_address", "city", "phone"]
     date_hierarchy = "created_at"
-    actions = ["export_addresses_as_csv"]
+    list_select_related = ["user"]
+    actions = ["export_addresses_as_csv", "export_addresses_as_ndjson"]
 
     def export_addresses_as_csv(self, request, queryset):
         """Export selected addresses as CSV file"""
         if not request.user.is_staff:
             raise PermissionDenied("You do not have permission to perform this action")
+        return stream_export(queryset, "addresses_export", "csv")
 
-        meta = self.model._meta
-        field_names = [field.name for field in meta.fields]
-
-        response = HttpResponse(content_type="text/csv")
-        response["Content-Disposition"] = f"attachment; filename=addresses_export.csv"
-        writer = csv.writer(response)
-
-        # Add headers with column names
-        writer.writerow(field_names)
+    export_addresses_as_csv.short_description = "Export selected addresses as CSV"
 
-        # Add data rows
-        for obj in queryset:
-            writer.writerow([getattr(obj, field) for field in field_names])
+    def export_addresses_as_ndjson(self, request, queryset):
+        """Export selected addresses as newline-delimited JSON"""
+        if not request.user.is_staff:
+            raise PermissionDenied("You do not have permission to perform this action")
+        return stream_export(queryset, "addresses_export", "ndjson")
 
-        return response
-
-    export_addresses_as_csv.short_description = "Export selected addresses as CSV"
+    export_addresses_as_ndjson.short_description = "Export selected addresses as NDJSON"
 
 
 @admin.register(OrderStatusHistory)
@@ -55,6 +50,8 @@ class OrderStatusHistoryAdmin(admin.ModelAdmin):
     search_fields = ["checkout__id", "notes"]
     date_hierarchy = "created_at"
     readonly_fields = ["created_at"]
+    # Checkout.__str__ shows the buyer's username
+    list_select_related = ["checkout__user", "created_by"]
 
 
 # Register new checkout models
@@ -80,11 +77,16 @@ class CheckoutAdmin(admin.ModelAdmin):
     readonly_fields = ["get_items_count"]
     inlines = [CheckoutItemInline]
     date_hierarchy = "created_at"
+    list_select_related = ["user"]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(items_count=Count("items"))
 
     def get_items_count(self, obj):
-        return obj.items.count()
+        return obj.items_count
 
     get_items_count.short_description = "Items Count"
+    get_items_count.admin_order_field = "items_count"
 
     actions = [
         "mark_as_processing",
@@ -92,13 +94,14 @@ class CheckoutAdmin(admin.ModelAdmin):
         "mark_as_delivered",
         "mark_as_cancelled",
         "export_as_csv",
+        "export_as_ndjson",
     ]
 
     def mark_as_processing(self, request, queryset):
         """Mark selected checkouts as processing"""
         if not request.user.is_staff:
             raise PermissionDenied("You do not have permission to perform this action")
-        updated = queryset.update(status="processing")
+        updated = set_order_status(queryset, "processing")
         self.message_user(request, f"{updated} orders marked as processing.")
 
     mark_as_processing.short_description = "Mark selected orders as processing"
@@ -107,7 +110,7 @@ class CheckoutAdmin(admin.ModelAdmin):
         """Mark selected checkouts as shipped"""
         if not request.user.is_staff:
             raise PermissionDenied("You do not have permission to perform this action")
-        updated = queryset.update(status="shipped")
+        updated = set_order_status(queryset, "shipped")
         self.message_user(request, f"{updated} orders marked as shipped.")
 
     mark_as_shipped.short_description = "Mark selected orders as shipped"
@@ -116,7 +119,7 @@ class CheckoutAdmin(admin.ModelAdmin):
         """Mark selected checkouts as delivered"""
         if not request.user.is_staff:
             raise PermissionDenied("You do not have permission to perform this action")
-        updated = queryset.update(status="delivered")
+        updated = set_order_status(queryset, "delivered")
         self.message_user(request, f"{updated} orders marked as delivered.")
 
     mark_as_delivered.short_description = "Mark selected orders as delivered"
@@ -125,47 +128,53 @@ class CheckoutAdmin(admin.ModelAdmin):
         """Mark selected checkouts as cancelled"""
         if not request.user.is_staff:
             raise PermissionDenied("You do not have permission to perform this action")
-        updated = queryset.update(status="cancelled")
+        updated = set_order_status(queryset, "cancelled")
         self.message_user(request, f"{updated} orders marked as cancelled.")
 
     mark_as_cancelled.short_description = "Mark selected orders as cancelled"
 
+    def export_checkouts(self, queryset, fmt):
+        """Stream checkouts with their items, prefetched per chunk"""
+        columns = model_columns(Checkout) + [
+            Column(
+                "items",
+                lambda obj: [
+                    {
+                        "product": item.product.name,
+                        "quantity": item.quantity,
+                        "price": item.price,
+                    }
+                    for item in obj.items.all()
+                ],
+                # Checkout items as a semicolon-separated string
+                to_text=lambda items: "; ".join(
+                    f"{item['quantity']}x {item['product']}" for item in items
+                ),
+            )
+        ]
+        return stream_export(
+            queryset,
+            "checkouts_export",
+            fmt,
+            columns=columns,
+            prefetch_related=["items__product"],
+        )
+
     def export_as_csv(self, request, queryset):
         """Export selected checkouts as CSV file"""
         if not request.user.is_staff:
             raise PermissionDenied("You do not have permission to perform this action")
+        return self.export_checkouts(queryset, "csv")
 
-        meta = self.model._meta
-        field_names = [field.name for field in meta.fields]
-
-        # Add custom fields for items
-        field_names.append("items")
-
-        response = HttpResponse(content_type="text/csv")
-        response["Content-Disposition"] = f"attachment; filename=checkouts_export.csv"
-        writer = csv.writer(response)
-
-        # Add headers with column names
-        writer.writerow(field_names)
-
-        # Add data rows
-        for obj in queryset:
-            # Get basic checkout fields
-            row_data = [
-                getattr(obj, field) for field in field_names if field != "items"
-            ]
-
-            # Add checkout items as a comma-separated string
-            items_str = "; ".join(
-                [f"{item.quantity}x {item.product.name}" for item in obj.items.all()]
-            )
-            row_data.append(items_str)
-
-            writer.writerow(row_data)
+    export_as_csv.short_description = "Export selected checkouts as CSV"
 
-        return response
+    def export_as_ndjson(self, request, queryset):
+        """Export selected checkouts as newline-delimited JSON"""
+        if not request.user.is_staff:
+            raise PermissionDenied("You do not have permission to perform this action")
+        return self.export_checkouts(queryset, "ndjson")
 
-    export_as_csv.short_description = "Export selected checkouts as CSV"
+    export_as_ndjson.short_description = "Export selected checkouts as NDJSON"
 
 
 @admin.register(CheckoutItem)
@@ -174,6 +183,7 @@ class CheckoutItemAdmin(admin.ModelAdmin):
     list_filter = ["checkout__status"]
     search_fields = ["checkout__id", "product__name"]
     readonly_fields = ["get_total_price"]
+    list_select_related = ["checkout__user", "product"]
 
     def get_total_price(self, obj):
         """Display the total price for this checkout item"""
@@ -0,0 +1,28 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from orders.rollups import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily and per-product sales rollups from the order history"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--start",
+            help="First day to rebuild, as YYYY-MM-DD (default: first order)",
+        )
+        parser.add_argument(
+            "--end",
+            help="Last day to rebuild, as YYYY-MM-DD (default: last order)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options["start"]) if options["start"] else None
+            end = date.fromisoformat(options["end"]) if options["end"] else None
+        except ValueError:
+            raise CommandError("Dates must be given as YYYY-MM-DD")
+
+        days = rebuild_sales_rollups(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt sales rollups for {days} days"))
@@ -0,0 +1,80 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0006_product_family_key"),
+        ("orders", "0018_fix_test_database_phone_column"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailySales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(unique=True)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                ("revenue_order_count", models.IntegerField(default=0)),
+                ("item_count", models.IntegerField(default=0)),
+                ("order_count", models.IntegerField(default=0)),
+                ("pending_count", models.IntegerField(default=0)),
+                ("processing_count", models.IntegerField(default=0)),
+                ("shipped_count", models.IntegerField(default=0)),
+                ("delivered_count", models.IntegerField(default=0)),
+                ("cancelled_count", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "Daily sales",
+                "ordering": ["date"],
+            },
+        ),
+        migrations.CreateModel(
+            name="ProductDailySales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("quantity", models.IntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                ("order_count", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_sales",
+                        to="products.product",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Product daily sales",
+                "ordering": ["date", "product"],
+                "unique_together": {("date", "product")},
+            },
+        ),
+    ]
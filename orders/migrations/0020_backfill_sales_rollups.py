@@ -0,0 +1,88 @@
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+# Statuses as of this migration, kept here so later changes to the orders
+# app do not alter what this migration does
+STATUSES = ["pending", "processing", "shipped", "delivered", "cancelled"]
+REVENUE_STATUSES = ["processing", "shipped", "delivered"]
+
+
+def backfill_sales_rollups(apps, schema_editor):
+    """Build the daily and per-product rollups from the existing orders"""
+    Checkout = apps.get_model("orders", "Checkout")
+    CheckoutItem = apps.get_model("orders", "CheckoutItem")
+    DailySales = apps.get_model("orders", "DailySales")
+    ProductDailySales = apps.get_model("orders", "ProductDailySales")
+
+    tz = timezone.get_default_timezone()
+    orders = Checkout.objects.annotate(day=TruncDate("created_at", tzinfo=tz))
+    items = CheckoutItem.objects.annotate(
+        day=TruncDate("checkout__created_at", tzinfo=tz)
+    ).exclude(checkout__status="cancelled")
+
+    daily = defaultdict(lambda: defaultdict(int))
+    for row in (
+        orders.values("day", "status")
+        .annotate(orders=Count("id"), revenue=Sum("total"))
+        .order_by()
+    ):
+        fields = daily[row["day"]]
+        fields["order_count"] += row["orders"]
+        if row["status"] in STATUSES:
+            fields[f"{row['status']}_count"] += row["orders"]
+        if row["status"] in REVENUE_STATUSES:
+            fields["revenue"] += row["revenue"] or 0
+            fields["revenue_order_count"] += row["orders"]
+
+    for row in (
+        items.filter(checkout__status__in=REVENUE_STATUSES)
+        .values("day")
+        .annotate(units=Sum("quantity"))
+        .order_by()
+    ):
+        daily[row["day"]]["item_count"] += row["units"] or 0
+
+    product_sales = (
+        items.values("day", "product_id")
+        .annotate(
+            units=Sum("quantity"),
+            revenue=Sum(F("price") * F("quantity")),
+            orders=Count("checkout_id", distinct=True),
+        )
+        .order_by()
+    )
+
+    DailySales.objects.all().delete()
+    ProductDailySales.objects.all().delete()
+    DailySales.objects.bulk_create(
+        [DailySales(date=day, **fields) for day, fields in daily.items()],
+        batch_size=1000,
+    )
+    ProductDailySales.objects.bulk_create(
+        [
+            ProductDailySales(
+                date=row["day"],
+                product_id=row["product_id"],
+                quantity=row["units"] or 0,
+                revenue=row["revenue"] or 0,
+                order_count=row["orders"],
+            )
+            for row in product_sales
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("orders", "0019_dailysales_productdailysales"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_sales_rollups, migrations.RunPython.noop),
+    ]
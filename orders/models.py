@@ -146,3 +146,52 @@ class CheckoutItem(BaseItemModel):
 
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in Checkout #{self.checkout.id}"
+
+
+class DailySales(models.Model):
+    """
+    Per-day order totals for the admin dashboard, keyed by the local day an
+    order was placed and maintained incrementally by orders.rollups
+    """
+
+    date = models.DateField(unique=True)
+    # Revenue, revenue order and item counts only include REVENUE_STATUSES
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    revenue_order_count = models.IntegerField(default=0)
+    item_count = models.IntegerField(default=0)
+    # Every order placed that day, by its current status
+    order_count = models.IntegerField(default=0)
+    pending_count = models.IntegerField(default=0)
+    processing_count = models.IntegerField(default=0)
+    shipped_count = models.IntegerField(default=0)
+    delivered_count = models.IntegerField(default=0)
+    cancelled_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["date"]
+        verbose_name_plural = "Daily sales"
+
+    def __str__(self):
+        return f"Sales on {self.date}"
+
+
+class ProductDailySales(models.Model):
+    """Units and revenue per product and day from orders that were not cancelled"""
+
+    date = models.DateField()
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="daily_sales"
+    )
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["date", "product"]
+        unique_together = ("date", "product")
+        verbose_name_plural = "Product daily sales"
+
+    def __str__(self):
+        return f"{self.product.name} on {self.date}"
@@ -0,0 +1,122 @@
+"""
+Sales reporting queries for the admin dashboard
+"""
+
+from datetime import timedelta
+
+from django.db.models import DateField, F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .constants import STATUS_CHOICES
+from .models import DailySales, ProductDailySales
+
+# Orders that count as revenue
+REVENUE_STATUSES = ["processing", "shipped", "delivered"]
+
+BUCKETS = {
+    "day": lambda: F("date"),
+    "week": lambda: TruncWeek("date", output_field=DateField()),
+    "month": lambda: TruncMonth("date", output_field=DateField()),
+}
+
+
+def bucket_start(day, bucket):
+    """First day of the bucket containing ``day`` (weeks start on Monday)"""
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(day, bucket):
+    """First day of the bucket following the one starting on ``day``"""
+    if bucket == "week":
+        return day + timedelta(weeks=1)
+    if bucket == "month":
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def sales_trend(start, end, bucket="day"):
+    """
+    Revenue and order counts per bucket for an inclusive range of days.
+
+    Reads the DailySales rollup, whose days follow settings.TIME_ZONE, with a
+    single grouped query; buckets without orders are filled with zeros. Only
+    days within the range are counted, so when ``start`` or ``end`` falls
+    inside a week or month the first or last bucket is partial even though it
+    is labelled with the bucket's start; align the range with
+    ``bucket_start`` and ``next_bucket`` to chart whole buckets.
+
+    Args:
+        start (date): First day of the range
+        end (date): Last day of the range
+        bucket (str): "day", "week" or "month"
+
+    Returns:
+        list: Dicts with ``date`` (bucket start), ``sales`` and ``orders``
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"Unknown bucket: {bucket}")
+
+    rows = (
+        DailySales.objects.filter(date__gte=start, date__lte=end)
+        .annotate(bucket=BUCKETS[bucket]())
+        .values("bucket")
+        .annotate(sales=Sum("revenue"), orders=Sum("revenue_order_count"))
+        .order_by("bucket")
+    )
+    totals = {row["bucket"]: row for row in rows}
+
+    trend = []
+    day = bucket_start(start, bucket)
+    while day <= end:
+        row = totals.get(day, {})
+        trend.append(
+            {
+                "date": day,
+                "sales": row.get("sales") or 0,
+                "orders": row.get("orders") or 0,
+            }
+        )
+        day = next_bucket(day, bucket)
+    return trend
+
+
+def revenue_since(start):
+    """Revenue from orders placed on or after the given day"""
+    return (
+        DailySales.objects.filter(date__gte=start).aggregate(total=Sum("revenue"))[
+            "total"
+        ]
+        or 0
+    )
+
+
+def total_orders():
+    """Number of orders ever placed"""
+    return DailySales.objects.aggregate(total=Sum("order_count"))["total"] or 0
+
+
+def order_status_counts():
+    """
+    Number of orders currently in each status.
+
+    Returns:
+        dict: Mapping of status to count, for statuses with any orders
+    """
+    totals = DailySales.objects.aggregate(
+        **{status: Sum(f"{status}_count") for status, _ in STATUS_CHOICES}
+    )
+    return {status: count for status, count in sorted(totals.items()) if count}
+
+
+def top_products(limit=10):
+    """Best-selling products by units sold, as dicts with name and totals"""
+    return list(
+        ProductDailySales.objects.values("product__name")
+        .annotate(total_sold=Sum("quantity"), order_count=Sum("order_count"))
+        .filter(total_sold__gt=0)
+        .order_by("-total_sold")[:limit]
+    )
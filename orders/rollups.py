@@ -0,0 +1,267 @@
+"""
+Incrementally maintained sales rollups.
+
+DailySales and ProductDailySales hold per-day totals keyed by the local day
+(in settings.TIME_ZONE) an order was placed, so dashboard queries read a
+handful of rollup rows instead of scanning the order history.
+
+Every change is expressed as the difference between an order's contribution
+before and after it: placing an order adds its contribution, a status change
+swaps the old one for the new one and deleting an order subtracts it. The
+differences are applied with one Case/When F() UPDATE per table.
+``rebuild_sales_rollups`` recomputes a date range from scratch.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .constants import STATUS_CHOICES
+from .models import Checkout, CheckoutItem, DailySales, ProductDailySales
+from .reports import REVENUE_STATUSES
+
+STATUSES = [status for status, _ in STATUS_CHOICES]
+
+
+def order_date(created_at):
+    """Local day an order belongs to"""
+    return timezone.localdate(created_at, timezone.get_default_timezone())
+
+
+def _order_items(checkout_ids):
+    """(product id, quantity, line revenue) tuples per checkout, in one query"""
+    items = defaultdict(list)
+    for checkout_id, product_id, quantity, price in CheckoutItem.objects.filter(
+        checkout_id__in=checkout_ids
+    ).values_list("checkout_id", "product_id", "quantity", "price"):
+        items[checkout_id].append((product_id, quantity, (price or 0) * quantity))
+    return items
+
+
+def _contribute(daily, products, day, status, total, items, sign):
+    """Add (sign=1) or remove (sign=-1) one order's share of the rollups"""
+    row = daily[day]
+    row["order_count"] += sign
+    if status in STATUSES:
+        row[f"{status}_count"] += sign
+    if status in REVENUE_STATUSES:
+        row["revenue"] += sign * total
+        row["revenue_order_count"] += sign
+        row["item_count"] += sign * sum(quantity for _, quantity, _ in items)
+    if status != "cancelled":
+        for product_id, quantity, revenue in items:
+            product_row = products[(day, product_id)]
+            product_row["quantity"] += sign * quantity
+            product_row["revenue"] += sign * revenue
+            product_row["order_count"] += sign
+
+
+def _new_deltas():
+    return (
+        defaultdict(lambda: defaultdict(int)),
+        defaultdict(lambda: defaultdict(int)),
+    )
+
+
+def _apply(model, keys, deltas):
+    """
+    Apply per-row field deltas with a single UPDATE, creating missing rows.
+
+    Args:
+        model: DailySales or ProductDailySales
+        keys (tuple): Names of the fields identifying a row
+        deltas (dict): Mapping of key tuple to {field: delta}
+    """
+    deltas = {
+        key: {field: delta for field, delta in fields.items() if delta}
+        for key, fields in deltas.items()
+    }
+    deltas = {key: fields for key, fields in deltas.items() if fields}
+    if not deltas:
+        return
+
+    lookups = {key: Q(**dict(zip(keys, key))) for key in deltas}
+    model.objects.bulk_create(
+        [model(**dict(zip(keys, key))) for key in deltas], ignore_conflicts=True
+    )
+
+    field_names = {field for fields in deltas.values() for field in fields}
+    model.objects.filter(reduce(or_, lookups.values())).update(
+        updated_at=timezone.now(),
+        **{
+            field: Case(
+                *[
+                    When(lookups[key], then=F(field) + fields[field])
+                    for key, fields in deltas.items()
+                    if field in fields
+                ],
+                default=F(field),
+            )
+            for field in field_names
+        },
+    )
+
+
+def _flush(daily, products):
+    _apply(DailySales, ("date",), {(day,): row for day, row in daily.items()})
+    _apply(ProductDailySales, ("date", "product_id"), products)
+
+
+def record_orders(checkouts, sign=1):
+    """
+    Add newly placed orders to the rollups, or remove deleted ones (sign=-1).
+
+    Call once the order's items exist.
+    """
+    checkouts = list(checkouts)
+    if not checkouts:
+        return
+    items = _order_items([checkout.id for checkout in checkouts])
+    daily, products = _new_deltas()
+    for checkout in checkouts:
+        _contribute(
+            daily,
+            products,
+            order_date(checkout.created_at),
+            checkout.status,
+            checkout.total,
+            items[checkout.id],
+            sign,
+        )
+    _flush(daily, products)
+
+
+def record_status_changes(changes):
+    """
+    Move orders' contributions from their old status to their new one.
+
+    Args:
+        changes: Iterable of (checkout, old_status) pairs, where
+            ``checkout.status`` already holds the new status
+    """
+    changes = [(c, old) for c, old in changes if c.status != old]
+    if not changes:
+        return
+    items = _order_items([checkout.id for checkout, _ in changes])
+    daily, products = _new_deltas()
+    for checkout, old_status in changes:
+        day = order_date(checkout.created_at)
+        order_items = items[checkout.id]
+        _contribute(daily, products, day, old_status, checkout.total, order_items, -1)
+        _contribute(
+            daily, products, day, checkout.status, checkout.total, order_items, 1
+        )
+    _flush(daily, products)
+
+
+def set_order_status(queryset, status):
+    """
+    Bulk-update the status of some orders and adjust the rollups to match.
+
+    Returns:
+        int: Number of orders updated
+    """
+    # Lock plain rows: the admin's queryset may carry GROUP BY annotations
+    queryset = Checkout.objects.filter(pk__in=queryset.values("pk"))
+    with transaction.atomic():
+        checkouts = list(
+            queryset.select_for_update().only("id", "created_at", "total", "status")
+        )
+        previous = {checkout.id: checkout.status for checkout in checkouts}
+        updated = Checkout.objects.filter(id__in=previous).update(status=status)
+        for checkout in checkouts:
+            checkout.status = status
+        record_status_changes(
+            (checkout, previous[checkout.id]) for checkout in checkouts
+        )
+    return updated
+
+
+def rebuild_sales_rollups(start=None, end=None):
+    """
+    Recompute the rollups for an inclusive range of local days from scratch.
+
+    Args:
+        start (date): First day, or None for the first order
+        end (date): Last day, or None for the last order
+
+    Returns:
+        int: Number of daily rows written
+    """
+    tz = timezone.get_default_timezone()
+    day = TruncDate("created_at", tzinfo=tz)
+    item_day = TruncDate("checkout__created_at", tzinfo=tz)
+    orders = Checkout.objects.annotate(day=day)
+    items = CheckoutItem.objects.annotate(day=item_day).exclude(
+        checkout__status="cancelled"
+    )
+    daily_rows = DailySales.objects.all()
+    product_rows = ProductDailySales.objects.all()
+    if start:
+        orders, items = orders.filter(day__gte=start), items.filter(day__gte=start)
+        daily_rows = daily_rows.filter(date__gte=start)
+        product_rows = product_rows.filter(date__gte=start)
+    if end:
+        orders, items = orders.filter(day__lte=end), items.filter(day__lte=end)
+        daily_rows = daily_rows.filter(date__lte=end)
+        product_rows = product_rows.filter(date__lte=end)
+
+    daily = defaultdict(lambda: defaultdict(int))
+    for row in (
+        orders.values("day", "status")
+        .annotate(orders=Count("id"), revenue=Sum("total"))
+        .order_by()
+    ):
+        fields = daily[row["day"]]
+        fields["order_count"] += row["orders"]
+        if row["status"] in STATUSES:
+            fields[f"{row['status']}_count"] += row["orders"]
+        if row["status"] in REVENUE_STATUSES:
+            fields["revenue"] += row["revenue"] or Decimal("0")
+            fields["revenue_order_count"] += row["orders"]
+
+    for row in (
+        items.filter(checkout__status__in=REVENUE_STATUSES)
+        .values("day")
+        .annotate(units=Sum("quantity"))
+        .order_by()
+    ):
+        daily[row["day"]]["item_count"] += row["units"] or 0
+
+    product_sales = (
+        items.values("day", "product_id")
+        .annotate(
+            units=Sum("quantity"),
+            revenue=Sum(F("price") * F("quantity")),
+            orders=Count("checkout_id", distinct=True),
+        )
+        .order_by()
+    )
+
+    with transaction.atomic():
+        daily_rows.delete()
+        product_rows.delete()
+        DailySales.objects.bulk_create(
+            [DailySales(date=day, **fields) for day, fields in daily.items()],
+            batch_size=1000,
+        )
+        ProductDailySales.objects.bulk_create(
+            [
+                ProductDailySales(
+                    date=row["day"],
+                    product_id=row["product_id"],
+                    quantity=row["units"] or 0,
+                    revenue=row["revenue"] or 0,
+                    order_count=row["orders"],
+                )
+                for row in product_sales
+            ],
+            batch_size=1000,
+        )
+    return len(daily)
@@ -0,0 +1,143 @@
+"""
+Checkout commit and inventory services for the orders app
+"""
+
+import logging
+
+from django.db import transaction
+from django.db.models import Case, F, When
+
+from core import metrics
+from products.inventory import release_reservations, reserved_quantities
+from products.models import Product
+from .models import Checkout, CheckoutItem
+
+logger = logging.getLogger("orders")
+
+
+class InsufficientStockError(Exception):
+    """Raised when a checkout asks for more units than are in stock"""
+
+    def __init__(self, shortages):
+        # List of (product, requested_quantity, available_stock) tuples
+        self.shortages = shortages
+        names = ", ".join(product.name for product, _, _ in shortages)
+        super().__init__(f"Insufficient stock for: {names}")
+
+
+def _stock_delta_update(quantities, sign):
+    """
+    Build a single UPDATE that adjusts stock for many products at once.
+
+    Args:
+        quantities (dict): Mapping of product id to quantity
+        sign (int): -1 to decrement stock, 1 to increment it
+    """
+    return Product.objects.filter(id__in=quantities).update(
+        stock=Case(
+            *[
+                When(id=product_id, then=F("stock") + sign * quantity)
+                for product_id, quantity in quantities.items()
+            ],
+            default=F("stock"),
+        )
+    )
+
+
+def commit_checkout(
+    user, cart, shipping_address, payment_method, subtotal, shipping_cost, tax, total
+):
+    """
+    Turn a cart into a Checkout in one transaction.
+
+    The affected products are locked, oversold lines are rejected instead of
+    being clamped to zero, stock is decremented with a single F() expression
+    UPDATE and the checkout items are inserted with bulk_create. Stock held by
+    other shoppers' checkout reservations is not available to this order, and
+    the user's own reservations are released once the order is placed.
+
+    Raises:
+        InsufficientStockError: If any line asks for more than is in stock.
+            Nothing is written in that case.
+
+    Returns:
+        Checkout: The newly created checkout
+    """
+    with transaction.atomic():
+        cart_items = list(cart.items.all())
+        quantities = {}
+        for item in cart_items:
+            quantities[item.product_id] = (
+                quantities.get(item.product_id, 0) + item.quantity
+            )
+
+        products = Product.objects.select_for_update().in_bulk(list(quantities))
+        reserved = reserved_quantities(quantities, exclude_user=user)
+
+        shortages = []
+        for product_id, quantity in quantities.items():
+            available = products[product_id].stock - reserved.get(product_id, 0)
+            if available < quantity:
+                shortages.append((products[product_id], quantity, available))
+        if shortages:
+            metrics.CHECKOUT_COMMITS.inc(outcome="insufficient_stock")
+            raise InsufficientStockError(shortages)
+
+        _stock_delta_update(quantities, -1)
+
+        # Guard against a concurrent writer on backends without row locks
+        oversold = Product.objects.filter(id__in=quantities, stock__lt=0)
+        if oversold.exists():
+            metrics.CHECKOUT_COMMITS.inc(outcome="insufficient_stock")
+            raise InsufficientStockError(
+                [
+                    (
+                        product,
+                        quantities[product.id],
+                        product.stock + quantities[product.id],
+                    )
+                    for product in oversold
+                ]
+            )
+
+        checkout = Checkout.objects.create(
+            user=user,
+            shipping_address=shipping_address,
+            payment_method=payment_method,
+            subtotal=subtotal,
+            shipping_cost=shipping_cost,
+            tax=tax,
+            total=total,
+            status="pending",  # Initial status
+        )
+
+        CheckoutItem.objects.bulk_create(
+            [
+                CheckoutItem(
+                    checkout=checkout,
+                    product=products[item.product_id],
+                    price=products[item.product_id].get_effective_price(),
+                    quantity=item.quantity,
+                )
+                for item in cart_items
+            ]
+        )
+
+        cart.items.all().delete()
+        release_reservations(user)
+
+    metrics.CHECKOUT_COMMITS.inc(outcome="committed")
+    logger.info(
+        f"Committed checkout {checkout.id} with {len(cart_items)} items for user {user.username}"
+    )
+    return checkout
+
+
+def restock_checkout(checkout):
+    """Return the items of a checkout to inventory with a single UPDATE"""
+    quantities = {}
+    for product_id, quantity in checkout.items.values_list("product_id", "quantity"):
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+    if quantities:
+        _stock_delta_update(quantities, 1)
@@ -0,0 +1,49 @@
+"""
+Signal handlers keeping the sales rollups in sync with orders
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Checkout
+from .rollups import record_orders, record_status_changes
+
+
+@receiver(pre_save, sender=Checkout)
+def remember_order_status(sender, instance, raw=False, **kwargs):
+    """Record the status an order had before saving"""
+    instance._previous_status = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_status = (
+        Checkout.objects.filter(pk=instance.pk).values_list("status", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Checkout)
+def update_rollups_on_order_save(sender, instance, created, raw=False, **kwargs):
+    """Add new orders once their items are saved, and follow status changes"""
+    if raw:
+        return
+    if created:
+        # Items are written after the order, so count it once the transaction
+        # that placed it commits
+        instance._rollup_pending = True
+
+        def record():
+            instance._rollup_pending = False
+            record_orders(Checkout.objects.filter(pk=instance.pk))
+
+        transaction.on_commit(record)
+    elif not getattr(instance, "_rollup_pending", False):
+        previous = getattr(instance, "_previous_status", None)
+        if previous is not None:
+            record_status_changes([(instance, previous)])
+
+
+@receiver(pre_delete, sender=Checkout)
+def update_rollups_on_order_delete(sender, instance, **kwargs):
+    """Remove a deleted order while its items still exist"""
+    if not getattr(instance, "_rollup_pending", False):
+        record_orders([instance], sign=-1)
@@ -1,11 +1,21 @@
+from django.apps import apps
 from django.contrib.auth.models import User
-from django.db import IntegrityError
+from django.db import IntegrityError, connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.db.models import ProtectedError
+from datetime import date, datetime, timezone as dt_timezone
 from decimal import Decimal
+from importlib import import_module
+import json
 
 from products.models import Product, Category
 from .models import Address, Checkout, CheckoutItem, OrderStatusHistory
+from .reports import order_status_counts, sales_trend, top_products
+from .rollups import rebuild_sales_rollups, set_order_status
+from .models import DailySales, ProductDailySales
 from .constants import STATUS_CHOICES, PAYMENT_METHOD_CHOICES
+from .services import InsufficientStockError, commit_checkout, restock_checkout
 from .test_utils import FixedSchemaTestCase
 
 
@@ -200,3 +210,407 @@ class DeprecatedModelsTest(FixedSchemaTestCase):
 
         with self.assertRaises(LookupError):
             apps.get_model("orders", "ShippingAddress")
+
+
+class CommitCheckoutTest(TestCase):
+    """Tests for the transactional checkout commit"""
+
+    def setUp(self):
+        from cart.models import Cart, CartItem
+
+        self.user = User.objects.create_user(
+            username="testuser", email="test@example.com", password="testpassword"
+        )
+        self.address = Address.objects.create(
+            user=self.user,
+            address_type="shipping",
+            full_name="Test User",
+            street_address="123 Test St",
+            city="Test City",
+            state="Test State",
+            postal_code="12345",
+            country="Malaysia",
+        )
+        category = Category.objects.create(name="Produce")
+        self.apple = Product.objects.create(
+            name="Apple",
+            slug="apple",
+            price=Decimal("1.00"),
+            category=category,
+            stock=5,
+        )
+        self.pear = Product.objects.create(
+            name="Pear",
+            slug="pear",
+            price=Decimal("2.00"),
+            discount_price=Decimal("1.50"),
+            category=category,
+            stock=3,
+        )
+        self.cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=self.cart, product=self.apple, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.pear, quantity=3)
+
+    def commit(self):
+        return commit_checkout(
+            user=self.user,
+            cart=self.cart,
+            shipping_address=self.address,
+            payment_method="credit_card",
+            subtotal=Decimal("8.00"),
+            shipping_cost=Decimal("5.99"),
+            tax=Decimal("0.48"),
+            total=Decimal("14.47"),
+        )
+
+    def test_commit_decrements_stock_and_creates_items(self):
+        """Test that a checkout consumes stock and empties the cart"""
+        checkout = self.commit()
+
+        self.apple.refresh_from_db()
+        self.pear.refresh_from_db()
+        self.assertEqual(self.apple.stock, 3)
+        self.assertEqual(self.pear.stock, 0)
+        self.assertEqual(checkout.items.count(), 2)
+        self.assertEqual(checkout.items.get(product=self.pear).price, Decimal("1.50"))
+        self.assertFalse(self.cart.items.exists())
+
+    def test_oversold_checkout_is_rejected(self):
+        """Test that an oversold line aborts the whole checkout"""
+        Product.objects.filter(id=self.pear.id).update(stock=2)
+
+        with self.assertRaises(InsufficientStockError) as ctx:
+            self.commit()
+
+        self.assertEqual(ctx.exception.shortages[0][0], self.pear)
+        self.apple.refresh_from_db()
+        self.assertEqual(self.apple.stock, 5)
+        self.assertFalse(Checkout.objects.exists())
+        self.assertEqual(self.cart.items.count(), 2)
+
+    def test_restock_checkout_returns_inventory(self):
+        """Test that cancelling returns the units to stock"""
+        checkout = self.commit()
+
+        restock_checkout(checkout)
+
+        self.apple.refresh_from_db()
+        self.pear.refresh_from_db()
+        self.assertEqual(self.apple.stock, 5)
+        self.assertEqual(self.pear.stock, 3)
+
+
+class SalesTrendTest(TestCase):
+    """Tests for the grouped sales trend report"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="buyer", email="buyer@example.com", password="testpassword"
+        )
+        self.address = Address.objects.create(
+            user=self.user,
+            address_type="shipping",
+            full_name="Test User",
+            street_address="123 Test St",
+            city="Test City",
+            state="Test State",
+            postal_code="12345",
+            country="Malaysia",
+        )
+
+    def order(self, created_at, total="10.00", status="delivered"):
+        checkout = Checkout.objects.create(
+            user=self.user,
+            shipping_address=self.address,
+            payment_method="cash_on_delivery",
+            subtotal=Decimal(total),
+            shipping_cost=Decimal("0.00"),
+            tax=Decimal("0.00"),
+            total=Decimal(total),
+            status=status,
+        )
+        # created_at is auto_now_add, so backdate it with an update and
+        # recompute the rollups the update bypasses
+        Checkout.objects.filter(pk=checkout.pk).update(created_at=created_at)
+        rebuild_sales_rollups()
+
+    def test_daily_trend_fills_gaps_in_one_query(self):
+        """Test that days without orders are zero-filled"""
+        utc = dt_timezone.utc
+        self.order(datetime(2024, 3, 1, 9, tzinfo=utc))
+        self.order(datetime(2024, 3, 1, 18, tzinfo=utc), total="5.00")
+        self.order(datetime(2024, 3, 3, 12, tzinfo=utc))
+        self.order(datetime(2024, 3, 3, 13, tzinfo=utc), status="cancelled")
+
+        with self.assertNumQueries(1):
+            trend = sales_trend(date(2024, 3, 1), date(2024, 3, 4))
+
+        self.assertEqual([row["date"].day for row in trend], [1, 2, 3, 4])
+        self.assertEqual([row["orders"] for row in trend], [2, 0, 1, 0])
+        self.assertEqual(trend[0]["sales"], Decimal("15.00"))
+
+    def test_days_follow_local_time_zone(self):
+        """Test that a late-evening order counts towards its local day"""
+        with self.settings(TIME_ZONE="Asia/Kuala_Lumpur"):  # UTC+8
+            self.order(datetime(2024, 3, 1, 20, tzinfo=dt_timezone.utc))
+
+        trend = sales_trend(date(2024, 3, 1), date(2024, 3, 2))
+
+        self.assertEqual([row["orders"] for row in trend], [0, 1])
+
+    def test_weekly_and_monthly_buckets(self):
+        """Test that orders roll up into week and month buckets"""
+        utc = dt_timezone.utc
+        self.order(datetime(2024, 1, 31, tzinfo=utc))
+        self.order(datetime(2024, 2, 2, tzinfo=utc))
+        self.order(datetime(2024, 3, 15, tzinfo=utc))
+
+        weekly = sales_trend(date(2024, 1, 29), date(2024, 2, 11), "week")
+        monthly = sales_trend(date(2024, 1, 1), date(2024, 3, 31), "month")
+
+        self.assertEqual(
+            [(row["date"], row["orders"]) for row in weekly],
+            [(date(2024, 1, 29), 2), (date(2024, 2, 5), 0)],
+        )
+        self.assertEqual([row["orders"] for row in monthly], [1, 1, 1])
+        self.assertEqual(monthly[2]["date"], date(2024, 3, 1))
+
+    def test_sales_trend_api(self):
+        """Test the dashboard endpoint's ranges and validation"""
+        User.objects.create_superuser("admin", "admin@example.com", "adminpass")
+        self.client.login(username="admin", password="adminpass")
+
+        response = self.client.get("/admin/api/sales-trend/90/")
+        data = response.json()
+        self.assertEqual(len(data["labels"]), 90)
+        self.assertEqual(len(data["sales_data"]), 90)
+
+        response = self.client.get(
+            "/admin/api/sales-trend/7/",
+            {"start": "2024-01-01", "end": "2024-12-31", "bucket": "month"},
+        )
+        self.assertEqual(response.json()["labels"][0], "Jan 2024")
+
+        response = self.client.get("/admin/api/sales-trend/7/", {"bucket": "year"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_sales_trend_api_charts_whole_buckets(self):
+        """Test that an unaligned range is widened to whole weeks"""
+        User.objects.create_superuser("admin", "admin@example.com", "adminpass")
+        self.client.login(username="admin", password="adminpass")
+        utc = dt_timezone.utc
+        # Monday 29 January, before the requested start
+        self.order(datetime(2024, 1, 29, 12, tzinfo=utc))
+        self.order(datetime(2024, 2, 2, 12, tzinfo=utc))
+
+        data = self.client.get(
+            "/admin/api/sales-trend/7/",
+            {"start": "2024-01-31", "end": "2024-02-06", "bucket": "week"},
+        ).json()
+
+        self.assertEqual((data["start"], data["end"]), ("2024-01-29", "2024-02-11"))
+        self.assertEqual(data["dates"], ["2024-01-29", "2024-02-05"])
+        self.assertEqual(data["order_data"], [2, 0])
+
+
+class PlacedOrdersMixin:
+    """Fixtures for tests that place orders for two products"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="buyer", email="buyer@example.com", password="testpassword"
+        )
+        self.address = Address.objects.create(
+            user=self.user,
+            address_type="shipping",
+            full_name="Test User",
+            street_address="123 Test St",
+            city="Test City",
+            state="Test State",
+            postal_code="12345",
+            country="Malaysia",
+        )
+        category = Category.objects.create(name="Fruit", slug="fruit")
+        self.apple = Product.objects.create(
+            name="Apple", slug="apple", category=category, price=Decimal("2.00")
+        )
+        self.pear = Product.objects.create(
+            name="Pear", slug="pear", category=category, price=Decimal("3.00")
+        )
+
+    def order(self, *lines, status="processing"):
+        """Place an order for (product, quantity) lines and commit it"""
+        total = sum(product.price * quantity for product, quantity in lines)
+        with self.captureOnCommitCallbacks(execute=True):
+            checkout = Checkout.objects.create(
+                user=self.user,
+                shipping_address=self.address,
+                payment_method="cash_on_delivery",
+                subtotal=total,
+                shipping_cost=Decimal("0.00"),
+                tax=Decimal("0.00"),
+                total=total,
+                status=status,
+            )
+            for product, quantity in lines:
+                CheckoutItem.objects.create(
+                    checkout=checkout,
+                    product=product,
+                    quantity=quantity,
+                    price=product.price,
+                )
+        return checkout
+
+
+class SalesRollupTest(PlacedOrdersMixin, TestCase):
+    """Tests for the incrementally maintained sales rollups"""
+
+    def snapshot(self):
+        """Current rollup rows, for comparing against a rebuild"""
+        daily = list(
+            DailySales.objects.order_by("date").values(
+                "date",
+                "revenue",
+                "revenue_order_count",
+                "item_count",
+                "order_count",
+                *[f"{status}_count" for status, _ in STATUS_CHOICES],
+            )
+        )
+        products = list(
+            ProductDailySales.objects.filter(order_count__gt=0)
+            .order_by("date", "product_id")
+            .values("date", "product_id", "quantity", "revenue", "order_count")
+        )
+        return daily, products
+
+    def assertMatchesRebuild(self):
+        incremental = self.snapshot()
+        rebuild_sales_rollups()
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_new_orders_are_added_on_commit(self):
+        """Test that placing orders updates the daily and product rollups"""
+        self.order((self.apple, 2), (self.pear, 1))
+        self.order((self.apple, 1), status="pending")
+
+        day = DailySales.objects.get()
+        self.assertEqual(day.order_count, 2)
+        self.assertEqual(day.revenue, Decimal("7.00"))
+        self.assertEqual(day.revenue_order_count, 1)
+        self.assertEqual(day.item_count, 3)
+        self.assertEqual(day.processing_count, 1)
+        self.assertEqual(day.pending_count, 1)
+        apple = ProductDailySales.objects.get(product=self.apple)
+        self.assertEqual((apple.quantity, apple.order_count), (3, 2))
+        self.assertMatchesRebuild()
+
+    def test_status_changes_move_order_contributions(self):
+        """Test that saves and bulk status updates keep the rollups exact"""
+        first = self.order((self.apple, 2), status="pending")
+        second = self.order((self.pear, 1), status="pending")
+
+        first.status = "delivered"
+        first.save()
+        set_order_status(Checkout.objects.filter(pk=second.pk), "cancelled")
+
+        self.assertEqual(order_status_counts(), {"cancelled": 1, "delivered": 1})
+        day = DailySales.objects.get()
+        self.assertEqual(day.revenue, Decimal("4.00"))
+        self.assertFalse(ProductDailySales.objects.get(product=self.pear).quantity)
+        self.assertMatchesRebuild()
+
+    def test_deleting_an_order_removes_it(self):
+        """Test that a deleted order no longer counts"""
+        self.order((self.apple, 1))
+        doomed = self.order((self.pear, 4))
+
+        doomed.delete()
+
+        self.assertEqual(DailySales.objects.get().order_count, 1)
+        self.assertEqual([row["product__name"] for row in top_products()], ["Apple"])
+        self.assertMatchesRebuild()
+
+    def test_migration_backfills_existing_orders(self):
+        """Test that orders placed before the rollups existed are counted"""
+        self.order((self.apple, 2), (self.pear, 1))
+        earlier = self.order((self.pear, 3), status="pending")
+        self.order((self.apple, 1), status="cancelled")
+        expected = self.snapshot()
+        DailySales.objects.all().delete()
+        ProductDailySales.objects.all().delete()
+
+        backfill = import_module("orders.migrations.0020_backfill_sales_rollups")
+        backfill.backfill_sales_rollups(apps, None)
+
+        self.assertEqual(self.snapshot(), expected)
+        # Later status changes now apply to populated rows
+        earlier.status = "delivered"
+        earlier.save()
+        self.assertEqual(DailySales.objects.get().revenue, Decimal("16.00"))
+        self.assertMatchesRebuild()
+
+    def test_dashboard_apis_read_rollups(self):
+        """Test the status and top product endpoints"""
+        self.order((self.apple, 1), (self.pear, 5))
+        self.order((self.apple, 2), status="shipped")
+        User.objects.create_superuser("admin", "admin@example.com", "adminpass")
+        self.client.login(username="admin", password="adminpass")
+
+        with CaptureQueriesContext(connection) as queries:
+            statuses = self.client.get("/admin/api/order-status/").json()
+            products = self.client.get("/admin/api/top-products/").json()
+
+        self.assertFalse(
+            [
+                q["sql"]
+                for q in queries.captured_queries
+                if "orders_checkout" in q["sql"]
+            ]
+        )
+
+        self.assertEqual(statuses["data"], [1, 1])
+        self.assertEqual(products["labels"], ["Pear", "Apple"])
+        self.assertEqual(products["data"], [5, 3])
+
+
+class StreamingExportTest(PlacedOrdersMixin, TestCase):
+    """Tests for the streaming checkout exports"""
+
+    def export(self, fmt):
+        from django.contrib.admin.sites import site
+
+        admin = site._registry[Checkout]
+        response = admin.export_checkouts(Checkout.objects.order_by("id"), fmt)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_csv_export_streams_with_prefetched_items(self):
+        """Test that the export costs the same few queries however many orders"""
+        for _ in range(3):
+            self.order((self.apple, 2), (self.pear, 1))
+
+        # Checkouts with their user and address, items, products
+        with self.assertNumQueries(3):
+            response, content = self.export("csv")
+
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn("checkouts_export.csv", response["Content-Disposition"])
+        lines = content.splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].endswith(",items"))
+        self.assertIn("2x Apple; 1x Pear", lines[1])
+
+    def test_ndjson_export(self):
+        """Test that each checkout becomes one JSON object"""
+        checkout = self.order((self.apple, 2))
+
+        response, content = self.export("ndjson")
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        record = json.loads(content)
+        self.assertEqual(record["id"], checkout.id)
+        self.assertEqual(record["user"], self.user.id)
+        self.assertEqual(record["total"], "4.00")
+        self.assertEqual(
+            record["items"], [{"product": "Apple", "quantity": 2, "price": "2.00"}]
+        )
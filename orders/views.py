@@ -4,9 +4,12 @@ from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, Http404
 from django.urls import reverse
 from django.views.decorators.http import require_POST
-from .models import Address, Checkout, CheckoutItem
-from cart.models import Cart, CartItem
-from products.models import Product
+from django.db import transaction
+from .models import Address, Checkout
+from .services import InsufficientStockError, commit_checkout, restock_checkout
+from cart.models import Cart
+from cart.storage import get_cart_store
+from products.inventory import reserve_stock
 from decimal import Decimal
 import json
 import logging
@@ -26,22 +29,12 @@ def ensure_cart_model_exists(request):
     # Get or create Cart model for the user
     cart, created = Cart.objects.get_or_create(user=request.user)
 
-    # Get session cart
-    session_cart = request.session.get("cart", {})
+    # Get the stored cart
+    session_cart = get_cart_store().load(request.session)
 
     # Sync session cart to Cart model
     if session_cart:
-        # Clear existing cart items first
-        CartItem.objects.filter(cart=cart).delete()
-
-        # Add items from session cart
-        for product_slug, quantity in session_cart.items():
-            try:
-                product = Product.objects.get(slug=product_slug)
-                CartItem.objects.create(cart=cart, product=product, quantity=quantity)
-            except Product.DoesNotExist:
-                # Skip products that don't exist
-                pass
+        cart.sync_items(session_cart)
 
     return cart
 
@@ -59,7 +52,7 @@ def checkout_view(request):
     # Ensure cart model exists and is in sync with session
     try:
         cart = ensure_cart_model_exists(request)
-        cart_items = cart.items.all()
+        cart_items = cart.items.select_related("product")
 
         if not cart_items.exists():
             messages.warning(
@@ -67,6 +60,23 @@ def checkout_view(request):
             )
             return redirect("cart:view_cart")
 
+        # Hold the cart's stock while the shopper completes the checkout steps
+        if request.method == "GET":
+            quantities = {}
+            for item in cart_items:
+                quantities[item.product_id] = (
+                    quantities.get(item.product_id, 0) + item.quantity
+                )
+            shortages = reserve_stock(request.user, quantities)
+            if shortages:
+                for product, requested, available in shortages:
+                    messages.warning(
+                        request,
+                        f"Only {available} of {product.name} available right now "
+                        f"(you requested {requested}). Please update your cart.",
+                    )
+                return redirect("cart:view_cart")
+
         # Calculate subtotal and total
         subtotal = Decimal("0.00")
         for item in cart_items:
@@ -234,50 +244,22 @@ def checkout_view(request):
                     )
                     logger.info(f"Found shipping address: {shipping_address}")
 
-                    # Create the checkout/order
-                    checkout = Checkout(
+                    # Create the checkout/order, its items and the stock
+                    # decrements in a single transaction
+                    checkout = commit_checkout(
                         user=request.user,
+                        cart=cart,
                         shipping_address=shipping_address,
                         payment_method=payment_method,
                         subtotal=subtotal,
                         shipping_cost=shipping_cost,
                         tax=tax,
                         total=total,
-                        status="pending",  # Initial status
                     )
-                    checkout.save()
                     logger.info(f"Created new checkout with ID: {checkout.id}")
 
-                    # Create checkout items
-                    for cart_item in cart_items:
-                        checkout_item = CheckoutItem(
-                            checkout=checkout,
-                            product=cart_item.product,
-                            price=cart_item.product.get_effective_price(),
-                            quantity=cart_item.quantity,
-                        )
-                        checkout_item.save()
-                        logger.info(
-                            f"Created checkout item for product: {cart_item.product.name}, quantity: {cart_item.quantity}"
-                        )
-
-                        # Update product inventory (decrement)
-                        product = cart_item.product
-                        product.stock -= cart_item.quantity
-                        if product.stock < 0:
-                            product.stock = 0
-                        product.save()
-                        logger.info(
-                            f"Updated stock for product {product.name} to {product.stock}"
-                        )
-
-                    # Clear the cart model items
-                    cart_items.delete()
-                    logger.info("Cleared cart items")
-
-                    # Also clear the session cart
-                    request.session["cart"] = {}
-                    request.session.modified = True
+                    # Also clear the stored cart
+                    get_cart_store().clear(request.session)
                     logger.info("Cleared session cart")
 
                     # Clear checkout session data
@@ -298,6 +280,15 @@ def checkout_view(request):
                     )
                     return redirect("orders:order_confirmation", pk=checkout.id)
 
+                except InsufficientStockError as e:
+                    logger.warning(f"Order rejected: {str(e)}")
+                    for product, requested, available in e.shortages:
+                        messages.error(
+                            request,
+                            f"Only {max(available, 0)} of {product.name} left in stock "
+                            f"(you requested {requested}). Please update your cart.",
+                        )
+                    return redirect("cart:view_cart")
                 except Address.DoesNotExist:
                     logger.error(f"Shipping address not found for ID: {address_id}")
                     messages.error(
@@ -474,15 +465,11 @@ def cancel_order_view(request, pk):
             messages.error(request, "This order cannot be cancelled at this time.")
             return redirect("orders:order_detail", pk=pk)
 
-        # Update order status
-        checkout.status = "cancelled"
-        checkout.save()
-
-        # Return items to inventory
-        for item in checkout.items.all():
-            product = item.product
-            product.stock += item.quantity
-            product.save()
+        # Update order status and return items to inventory
+        with transaction.atomic():
+            checkout.status = "cancelled"
+            checkout.save()
+            restock_checkout(checkout)
 
         logger.info(f"Order cancelled: ID={checkout.id}, User={request.user.username}")
 
@@ -1,8 +1,9 @@
 from django.contrib import admin
-from .models import Category, Product
-import csv
-from django.http import HttpResponse
+from .models import Category, Product, StockReservation
+from core.exports import stream_export
+from .bulk import apply_discount_percentage, toggle_category_active
 from django.core.exceptions import PermissionDenied
+from django.utils import timezone
 from django.utils.html import format_html
 
 
@@ -14,6 +15,7 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ("name", "slug", "description")
     prepopulated_fields = {"slug": ("name",)}
     list_editable = ("active",)
+    list_select_related = ("parent",)
     readonly_fields = ("created_at", "updated_at")
     list_per_page = 10  # Set pagination to 5 items per page for testing
     fieldsets = (
@@ -32,14 +34,8 @@ class CategoryAdmin(admin.ModelAdmin):
         if not request.user.is_staff:
             raise PermissionDenied("You do not have permission to perform this action")
 
-        # Count categories that will be activated/deactivated
-        activate_count = queryset.filter(active=False).count()
-        deactivate_count = queryset.filter(active=True).count()
-
-        # Update the status
-        for category in queryset:
-            category.active = not category.active
-            category.save()
+        # Flip every selected category in one UPDATE
+        activate_count, deactivate_count = toggle_category_active(queryset)
 
         # Provide detailed feedback
         if activate_count and deactivate_count:
@@ -152,6 +148,7 @@ class ProductAdmin(admin.ModelAdmin):
         "created_at",
     )
     list_filter = ("is_active", "is_featured", "category")
+    list_select_related = ("category",)
     search_fields = ("name", "slug", "description")
     prepopulated_fields = {"slug": ("name",)}
     # list_editable = ("is_active", "is_featured")  # Temporarily disabled to test pagination
@@ -163,6 +160,7 @@ class ProductAdmin(admin.ModelAdmin):
         "mark_as_not_featured",
         "update_stock_zero",
         "export_as_csv",
+        "export_as_ndjson",
         "apply_discount_percentage",
         "clear_discount_price",
     ]
@@ -188,7 +186,7 @@ class ProductAdmin(admin.ModelAdmin):
         if not request.user.is_staff:
             raise PermissionDenied("You do not have permission to perform this action")
 
-        queryset.update(is_featured=True)
+        queryset.update(is_featured=True, updated_at=timezone.now())
         self.message_user(request, f"{queryset.count()} products marked as featured.")
 
     mark_as_featured.short_description = "Mark selected products as featured"
@@ -198,7 +196,7 @@ class ProductAdmin(admin.ModelAdmin):
         if not request.user.is_staff:
             raise PermissionDenied("You do not have permission to perform this action")
 
-        queryset.update(is_featured=False)
+        queryset.update(is_featured=False, updated_at=timezone.now())
         self.message_user(
             request, f"{queryset.count()} products marked as not featured."
         )
@@ -210,7 +208,7 @@ class ProductAdmin(admin.ModelAdmin):
         if not request.user.is_staff:
             raise PermissionDenied("You do not have permission to perform this action")
 
-        queryset.update(stock=0)
+        queryset.update(stock=0, updated_at=timezone.now())
         self.message_user(
             request, f"Stock set to zero for {queryset.count()} products."
         )
@@ -221,36 +219,29 @@ class ProductAdmin(admin.ModelAdmin):
         """Export selected products as CSV file"""
         if not request.user.is_staff:
             raise PermissionDenied("You do not have permission to perform this action")
+        return stream_export(queryset, str(self.model._meta), "csv")
 
-        meta = self.model._meta
-        field_names = [field.name for field in meta.fields]
-
-        response = HttpResponse(content_type="text/csv")
-        response["Content-Disposition"] = f"attachment; filename={meta}.csv"
-        writer = csv.writer(response)
-
-        # Add headers with column names
-        writer.writerow(field_names)
-
-        # Add data rows
-        for obj in queryset:
-            writer.writerow([getattr(obj, field) for field in field_names])
+    export_as_csv.short_description = "Export selected products as CSV"
 
-        return response
+    def export_as_ndjson(self, request, queryset):
+        """Export selected products as newline-delimited JSON"""
+        if not request.user.is_staff:
+            raise PermissionDenied("You do not have permission to perform this action")
+        return stream_export(queryset, str(self.model._meta), "ndjson")
 
-    export_as_csv.short_description = "Export selected products as CSV"
+    export_as_ndjson.short_description = "Export selected products as NDJSON"
 
     def apply_discount_percentage(self, request, queryset):
         """Apply percentage discount to selected products"""
         if not request.user.is_staff:
             raise PermissionDenied("You do not have permission to perform this action")
 
-        from django.contrib.admin.helpers import ActionForm
         from django import forms
         from django.template.response import TemplateResponse
-        from decimal import Decimal
 
-        class DiscountForm(ActionForm):
+        # A plain form: ActionForm's action field has no choices outside the
+        # changelist, so it never validated here
+        class DiscountForm(forms.Form):
             discount_percentage = forms.IntegerField(
                 required=True,
                 min_value=1,
@@ -264,15 +255,7 @@ class ProductAdmin(admin.ModelAdmin):
             form = DiscountForm(request.POST)
             if form.is_valid():
                 percentage = form.cleaned_data["discount_percentage"]
-                count = 0
-
-                for product in queryset:
-                    # Calculate discounted price
-                    discount_factor = Decimal(percentage) / Decimal(100)
-                    discount_amount = product.price * discount_factor
-                    product.discount_price = product.price - discount_amount
-                    product.save()
-                    count += 1
+                count = apply_discount_percentage(queryset, percentage)
 
                 self.message_user(
                     request, f"Applied {percentage}% discount to {count} products."
@@ -300,9 +283,18 @@ class ProductAdmin(admin.ModelAdmin):
         if not request.user.is_staff:
             raise PermissionDenied("You do not have permission to perform this action")
 
-        queryset.update(discount_price=None)
+        queryset.update(discount_price=None, updated_at=timezone.now())
         self.message_user(
             request, f"Removed discount prices from {queryset.count()} products."
         )
 
     clear_discount_price.short_description = "Clear discount prices"
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ("product", "user", "quantity", "expires_at", "created_at")
+    list_filter = ("expires_at",)
+    search_fields = ("product__name", "user__username")
+    list_select_related = ("product", "user")
+    readonly_fields = ("created_at", "updated_at")
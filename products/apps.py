@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ProductsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "products"
+
+    def ready(self):
+        from . import signals
+        from .search import create_search_table
+
+        # The FTS5 table is not a model, so create it once migrations ran
+        post_migrate.connect(create_search_table, sender=self)
@@ -0,0 +1,73 @@
+"""
+Set-based catalog updates for admin bulk actions.
+
+Each update runs as a single UPDATE using F() and Case/When expressions
+instead of a save() per row, then performs the upkeep those saves would
+have triggered through ``products.signals`` once for the whole batch.
+Rows get a new ``updated_at`` so cached product cards are re-rendered.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import BooleanField, Case, DecimalField, F, Value, When
+from django.db.models.functions import Round
+from django.utils import timezone
+
+from .category_tree import bump_category_tree_version
+from .counts import refresh_category_counts
+from .models import Category, Product
+from .search import index_products
+
+
+def apply_discount_percentage(queryset, percentage):
+    """
+    Set the discount price of products to ``percentage`` off their price.
+
+    Returns:
+        int: Number of products updated
+    """
+    factor = (Decimal(100) - Decimal(percentage)) / Decimal(100)
+    with transaction.atomic():
+        product_ids = list(queryset.values_list("id", flat=True))
+        updated = Product.objects.filter(id__in=product_ids).update(
+            discount_price=Round(
+                F("price") * Value(factor),
+                2,
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            ),
+            updated_at=timezone.now(),
+        )
+        # Prices are not indexed and counts do not depend on them, but keep
+        # the index in step with what a save() would have written
+        index_products(product_ids)
+    return updated
+
+
+def toggle_category_active(queryset):
+    """
+    Flip the active flag of categories.
+
+    Returns:
+        tuple: Numbers of categories (activated, deactivated)
+    """
+    with transaction.atomic():
+        categories = list(queryset.values_list("id", "parent_id", "active"))
+        category_ids = [category_id for category_id, _, _ in categories]
+        Category.objects.filter(id__in=category_ids).update(
+            active=Case(
+                When(active=True, then=Value(False)),
+                default=Value(True),
+                output_field=BooleanField(),
+            ),
+            updated_at=timezone.now(),
+        )
+        # A category's flag changes its own counts and its parent's rollup
+        affected = set(category_ids) | {
+            parent_id for _, parent_id, _ in categories if parent_id
+        }
+        refresh_category_counts(affected)
+        bump_category_tree_version()
+
+    deactivated = sum(1 for _, _, active in categories if active)
+    return len(categories) - deactivated, deactivated
@@ -0,0 +1,66 @@
+"""
+Rendered product card fragment cache.
+
+Each card's HTML is cached under a key built from the card template, the
+product id and the ``updated_at`` stamps of the product and its category.
+Saving the product (price, discount, image, ...) or renaming its category
+therefore yields a new key and the stale fragment is simply never read
+again; it ages out after PRODUCT_CARD_CACHE_TIMEOUT seconds. A page fetches
+all of its cards with one ``get_many`` and renders only the misses.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+KEY_PREFIX = "product_card"
+
+
+def _stamp(value):
+    return f"{value.timestamp():.6f}" if value else "0"
+
+
+def card_cache_key(product, template_name):
+    """Cache key of one rendered card; changes whenever the card could"""
+    category = product.category
+    return ":".join(
+        [
+            KEY_PREFIX,
+            template_name,
+            str(product.id),
+            _stamp(product.updated_at),
+            str(category.id),
+            _stamp(category.updated_at),
+        ]
+    )
+
+
+def render_product_cards(products, template_name):
+    """
+    Render a card for each product, serving cached fragments where possible.
+
+    Products should come with their category (``select_related("category")``)
+    or the key lookups cost a query per product.
+
+    Returns:
+        list: Safe HTML strings, in the order of ``products``
+    """
+    products = list(products)
+    keys = [card_cache_key(product, template_name) for product in products]
+    cached = cache.get_many(keys)
+
+    missing = {}
+    cards = []
+    for product, key in zip(products, keys):
+        html = cached.get(key)
+        if html is None:
+            html = render_to_string(template_name, {"product": product})
+            missing[key] = html
+        cards.append(mark_safe(html))
+
+    if missing:
+        cache.set_many(
+            missing, getattr(settings, "PRODUCT_CARD_CACHE_TIMEOUT", 60 * 60)
+        )
+    return cards
@@ -0,0 +1,151 @@
+"""
+In-process category tree cache.
+
+Loads every active category once into an immutable CategoryTree indexed by
+id and slug, with child lists and descendant-id sets, so subcategory
+expansion and breadcrumbs cost no queries on the hot path.
+
+Each process keeps its own tree and compares it against a version stamp
+stored in the Django cache. Category saves and deletes bump the stamp (see
+``products.signals``); with a shared cache backend every worker picks up the
+change on its next request, with the default local-memory cache only the
+process that made the change does.
+"""
+
+import copy
+import threading
+import uuid
+from types import MappingProxyType
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Category
+
+VERSION_CACHE_KEY = "products:category_tree_version"
+
+_lock = threading.Lock()
+_tree = None
+
+
+class CategoryTree:
+    """Immutable snapshot of the active category hierarchy"""
+
+    def __init__(self, categories, version):
+        self.version = version
+        self._by_id = MappingProxyType({c.id: c for c in categories})
+        self._by_slug = MappingProxyType({c.slug: c.id for c in categories})
+
+        children = {}
+        for category in categories:
+            children.setdefault(category.parent_id, []).append(category.id)
+        self._children = MappingProxyType(
+            {parent_id: tuple(ids) for parent_id, ids in children.items()}
+        )
+
+        descendants = {}
+
+        def collect(category_id, seen):
+            if category_id not in descendants:
+                ids = set()
+                for child_id in self._children.get(category_id, ()):
+                    if child_id not in seen:
+                        ids.add(child_id)
+                        ids |= collect(child_id, seen | {child_id})
+                descendants[category_id] = frozenset(ids)
+            return descendants[category_id]
+
+        for category in categories:
+            collect(category.id, {category.id})
+        self._descendants = MappingProxyType(descendants)
+
+    def _copy(self, category_id):
+        # Hand out copies so per-request attributes (e.g. product_count) never
+        # leak into the shared snapshot
+        category = copy.copy(self._by_id[category_id])
+        if category.parent_id in self._by_id:
+            category.parent = self._copy(category.parent_id)
+        return category
+
+    def __contains__(self, category_id):
+        return category_id in self._by_id
+
+    def get(self, category_id):
+        """Return a copy of the active category with this id, or None"""
+        if category_id not in self._by_id:
+            return None
+        return self._copy(category_id)
+
+    def get_by_slug(self, slug):
+        """Return a copy of the active category with this slug, or None"""
+        category_id = self._by_slug.get(slug)
+        return self.get(category_id) if category_id is not None else None
+
+    def child_ids(self, category_id):
+        """Ids of the active children of a category, ordered by name"""
+        return self._children.get(category_id, ())
+
+    def children(self, category_id):
+        """Copies of the active children of a category, ordered by name"""
+        return [self._copy(child_id) for child_id in self.child_ids(category_id)]
+
+    def roots(self):
+        """Copies of the active top-level categories, ordered by name"""
+        return self.children(None)
+
+    def descendant_ids(self, category_id):
+        """Ids of all active categories below a category"""
+        return self._descendants.get(category_id, frozenset())
+
+    def ancestors(self, category_id):
+        """Copies of the active ancestors of a category, top-level first"""
+        ancestors = []
+        category = self._by_id.get(category_id)
+        while category is not None and category.parent_id in self._by_id:
+            if len(ancestors) > len(self._by_id):
+                break  # Guard against cycles in bad data
+            ancestors.insert(0, self._copy(category.parent_id))
+            category = self._by_id[category.parent_id]
+        return ancestors
+
+
+def _set_new_version():
+    global _tree
+    cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+    with _lock:
+        _tree = None
+
+
+def bump_category_tree_version():
+    """
+    Invalidate every process's category tree.
+
+    The stamp is bumped right away and again once the surrounding transaction
+    commits, so a tree rebuilt from uncommitted state does not stick.
+    """
+    _set_new_version()
+    transaction.on_commit(_set_new_version)
+
+
+def get_category_tree():
+    """
+    Return the current category tree, rebuilding it if the version changed.
+
+    Costs one cache read per call and a single query after invalidation.
+    """
+    global _tree
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(VERSION_CACHE_KEY, version, None):
+            version = cache.get(VERSION_CACHE_KEY, version)
+
+    tree = _tree
+    if tree is not None and tree.version == version:
+        return tree
+
+    with _lock:
+        if _tree is None or _tree.version != version:
+            categories = list(Category.objects.filter(active=True).order_by("name"))
+            _tree = CategoryTree(categories, version)
+        return _tree
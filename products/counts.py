@@ -0,0 +1,168 @@
+"""
+Materialized category product counts.
+
+CategoryProductCount rows hold, per category, the number of active parent
+products it contains directly, the rolled-up count including its active
+subcategories, and its number of active subcategories. Catalog pages read
+them in one query via ``get_category_counts``.
+
+Rows are maintained incrementally: product saves and deletes apply +1/-1
+deltas to the affected category and its parent, while category changes
+(rare) and bulk updates recompute just the affected rows with
+``refresh_category_counts``. ``rebuild_category_counts`` repairs any drift.
+"""
+
+from django.db.models import Count, F, Q, Sum
+
+from .models import Category, CategoryProductCount, Product
+
+
+def is_counted(is_active, parent_id):
+    """Whether a product with these values shows up in category counts"""
+    return bool(is_active) and parent_id is None
+
+
+def _direct_counts(category_ids):
+    """Active parent products per category, in one grouped query"""
+    return dict(
+        Product.objects.filter(
+            category_id__in=category_ids, is_active=True, parent__isnull=True
+        )
+        .values("category_id")
+        .annotate(total=Count("id"))
+        .values_list("category_id", "total")
+    )
+
+
+def refresh_category_counts(category_ids):
+    """
+    Recompute the count rows for the given categories from scratch.
+
+    Costs three queries plus one upsert regardless of how many categories
+    are refreshed. Ids of categories that no longer exist are ignored.
+    """
+    category_ids = set(category_ids)
+    if not category_ids:
+        return
+
+    category_ids = set(
+        Category.objects.filter(id__in=category_ids).values_list("id", flat=True)
+    )
+    if not category_ids:
+        return
+
+    children = {}
+    for child_id, parent_id in Category.objects.filter(
+        parent_id__in=category_ids, active=True
+    ).values_list("id", "parent_id"):
+        children.setdefault(parent_id, []).append(child_id)
+
+    child_ids = {child_id for ids in children.values() for child_id in ids}
+    direct = _direct_counts(category_ids | child_ids)
+
+    rows = []
+    for category_id in category_ids:
+        own = direct.get(category_id, 0)
+        subcategories = children.get(category_id, [])
+        rows.append(
+            CategoryProductCount(
+                category_id=category_id,
+                product_count=own,
+                total_product_count=own
+                + sum(direct.get(child_id, 0) for child_id in subcategories),
+                subcategory_count=len(subcategories),
+            )
+        )
+
+    CategoryProductCount.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=["category"],
+        update_fields=[
+            "product_count",
+            "total_product_count",
+            "subcategory_count",
+            "updated_at",
+        ],
+    )
+
+
+def rebuild_category_counts():
+    """Recompute every category's counts"""
+    refresh_category_counts(Category.objects.values_list("id", flat=True))
+    return CategoryProductCount.objects.count()
+
+
+def apply_product_count_deltas(deltas):
+    """
+    Apply per-category product count changes.
+
+    Only existing rows are touched; categories without a row yet are
+    computed from scratch the next time they are read.
+
+    Args:
+        deltas (dict): Mapping of category id to the change (+n/-n) in the
+            number of counted products directly in that category
+    """
+    deltas = {category_id: delta for category_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    categories = Category.objects.filter(id__in=deltas).values_list(
+        "id", "parent_id", "active"
+    )
+    for category_id, parent_id, active in categories:
+        delta = deltas[category_id]
+        CategoryProductCount.objects.filter(category_id=category_id).update(
+            product_count=F("product_count") + delta,
+            total_product_count=F("total_product_count") + delta,
+        )
+
+        # Products of an active subcategory roll up into its parent
+        if parent_id and active:
+            CategoryProductCount.objects.filter(category_id=parent_id).update(
+                total_product_count=F("total_product_count") + delta
+            )
+
+
+def get_category_counts(category_ids):
+    """
+    Fetch count rows for the given categories in one query.
+
+    Missing rows (e.g. before the first rebuild) are computed on the fly.
+
+    Returns:
+        dict: Mapping of category id to CategoryProductCount
+    """
+    category_ids = list(set(category_ids))
+    if not category_ids:
+        return {}
+
+    counts = CategoryProductCount.objects.in_bulk(category_ids)
+    missing = set(category_ids) - set(counts)
+    if missing:
+        refresh_category_counts(missing)
+        counts.update(CategoryProductCount.objects.in_bulk(list(missing)))
+    return counts
+
+
+def count_active_products():
+    """
+    Number of active parent products across all categories, from the count rows.
+
+    Categories without a row yet are computed first, so their products are
+    not left out of the total. Once every category has a row this is one
+    query.
+    """
+    totals = Category.objects.aggregate(
+        total=Sum("product_counts__product_count"),
+        missing=Count("id", filter=Q(product_counts__isnull=True)),
+    )
+    if totals["missing"]:
+        refresh_category_counts(
+            Category.objects.filter(product_counts__isnull=True).values_list(
+                "id", flat=True
+            )
+        )
+        totals = CategoryProductCount.objects.aggregate(total=Sum("product_count"))
+    return totals["total"] or 0
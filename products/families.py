@@ -0,0 +1,60 @@
+"""
+Product family index.
+
+Products listed separately but sold as one family ("Milk (1L)", "Milk (2L)",
+"Apple - Red", "Apple - Green") share a ``family_key``: their lower-cased
+base name. The key is stored on Product, set on every save by
+``products.signals`` and recomputed for the whole catalog by the
+``rebuild_product_families`` command, so the detail page finds a product's
+family with an indexed (category, family_key) lookup instead of a LIKE scan.
+Products with explicit ``variants`` keep using the parent FK.
+"""
+
+from .models import Product
+
+
+def family_key(name):
+    """
+    Normalized base name shared by the members of a product family.
+
+    The base name is the part before " - ", or else before " (".
+    """
+    name = name or ""
+    if " - " in name:
+        name = name.split(" - ")[0]
+    elif " (" in name:
+        name = name.split(" (")[0]
+    return name.strip().lower()[: Product._meta.get_field("family_key").max_length]
+
+
+def get_family_members(product):
+    """Other active parent products in the same category and family"""
+    return Product.objects.filter(
+        category_id=product.category_id,
+        family_key=product.family_key,
+        is_active=True,
+        parent__isnull=True,
+    ).exclude(id=product.id)
+
+
+def rebuild_product_families(batch_size=1000):
+    """
+    Recompute every product's family key.
+
+    Returns:
+        int: Number of products whose key changed
+    """
+    changed = []
+    updated = 0
+    products = Product.objects.only("id", "name", "family_key").order_by()
+    for product in products.iterator(chunk_size=batch_size):
+        key = family_key(product.name)
+        if key != product.family_key:
+            product.family_key = key
+            changed.append(product)
+        if len(changed) >= batch_size:
+            updated += Product.objects.bulk_update(changed, ["family_key"])
+            changed = []
+    if changed:
+        updated += Product.objects.bulk_update(changed, ["family_key"])
+    return updated
@@ -0,0 +1,150 @@
+"""
+Stock reservation service.
+
+Places short-lived holds (StockReservation rows) against Product.stock while
+a shopper goes through checkout, so other shoppers only see the
+available-to-promise quantity: stock minus active holds held by others.
+Expired holds are ignored by every read and removed in batches by the
+``release_expired_reservations`` management command.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Product, StockReservation
+
+
+def get_reservation_ttl():
+    """How long a checkout hold lasts, from STOCK_RESERVATION_TTL (minutes)"""
+    return timedelta(minutes=getattr(settings, "STOCK_RESERVATION_TTL", 15))
+
+
+def reserved_quantities(product_ids, exclude_user=None):
+    """
+    Sum the active holds for the given products in one query.
+
+    Args:
+        product_ids: Iterable of product ids
+        exclude_user: Optional user whose own holds should not be counted
+
+    Returns:
+        dict: Mapping of product id to reserved quantity
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return {}
+
+    reservations = StockReservation.objects.filter(
+        product_id__in=product_ids, expires_at__gt=timezone.now()
+    )
+    if exclude_user is not None and exclude_user.is_authenticated:
+        reservations = reservations.exclude(user=exclude_user)
+
+    return dict(
+        reservations.values("product_id")
+        .annotate(total=Sum("quantity"))
+        .values_list("product_id", "total")
+    )
+
+
+def annotate_available_stock(products, user=None):
+    """
+    Set ``available_stock`` on each product to its available-to-promise quantity.
+
+    Holds placed by ``user`` are not subtracted, so shoppers never see their
+    own checkout competing with them. Costs a single query.
+    """
+    products = list(products)
+    reserved = reserved_quantities({p.id for p in products}, exclude_user=user)
+    for product in products:
+        product.available_stock = max(product.stock - reserved.get(product.id, 0), 0)
+    return products
+
+
+def reserve_stock(user, quantities, ttl=None):
+    """
+    Place or refresh the user's holds for a checkout.
+
+    The user's previous holds are replaced: lines still in ``quantities`` are
+    upserted with a new expiry and holds for other products are dropped.
+    A line is only held up to its available-to-promise quantity.
+
+    Args:
+        user: The shopper placing the holds
+        quantities (dict): Mapping of product id to requested quantity
+        ttl (timedelta): Optional hold duration, defaults to the setting
+
+    Returns:
+        list: (product, requested_quantity, available_quantity) tuples for
+        lines that could not be held in full
+    """
+    expires_at = timezone.now() + (ttl or get_reservation_ttl())
+    shortages = []
+
+    with transaction.atomic():
+        products = Product.objects.select_for_update().in_bulk(list(quantities))
+        reserved = reserved_quantities(products, exclude_user=user)
+
+        reservations = []
+        for product_id, quantity in quantities.items():
+            product = products.get(product_id)
+            if product is None:
+                continue
+            available = max(product.stock - reserved.get(product_id, 0), 0)
+            if available < quantity:
+                shortages.append((product, quantity, available))
+            held = min(quantity, available)
+            if held > 0:
+                reservations.append(
+                    StockReservation(
+                        product=product,
+                        user=user,
+                        quantity=held,
+                        expires_at=expires_at,
+                    )
+                )
+
+        StockReservation.objects.filter(user=user).exclude(
+            product_id__in=[r.product_id for r in reservations]
+        ).delete()
+        if reservations:
+            StockReservation.objects.bulk_create(
+                reservations,
+                update_conflicts=True,
+                unique_fields=["product", "user"],
+                update_fields=["quantity", "expires_at", "updated_at"],
+            )
+
+    return shortages
+
+
+def release_reservations(user):
+    """Drop all holds placed by the user"""
+    return StockReservation.objects.filter(user=user).delete()[0]
+
+
+def release_expired_reservations(batch_size=1000):
+    """
+    Delete expired holds in bounded batches.
+
+    Returns:
+        int: Number of holds released
+    """
+    now = timezone.now()
+    released = 0
+    while True:
+        batch = list(
+            StockReservation.objects.filter(expires_at__lte=now).values_list(
+                "id", flat=True
+            )[:batch_size]
+        )
+        if not batch:
+            break
+        released += StockReservation.objects.filter(id__in=batch).delete()[0]
+        if len(batch) < batch_size:
+            break
+    return released
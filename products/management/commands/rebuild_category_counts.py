@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from products.counts import rebuild_category_counts
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized product counts for every category"
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild_category_counts()
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt product counts for {rebuilt} categories")
+        )
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from products.families import rebuild_product_families
+
+
+class Command(BaseCommand):
+    help = "Recompute the product family index used to group variations"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of products read and updated per batch (default: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        updated = rebuild_product_families(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Updated the family key of {updated} products")
+        )
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from products.search import rebuild_search_index, search_available
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text product search index"
+
+    def handle(self, *args, **options):
+        if not search_available():
+            self.stdout.write(
+                self.style.WARNING(
+                    "Full-text search needs SQLite FTS5; nothing to rebuild"
+                )
+            )
+            return
+        indexed = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} products for search"))
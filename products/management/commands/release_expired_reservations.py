@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from products.inventory import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = "Release expired checkout stock reservations in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of reservations deleted per statement (default: 1000)",
+        )
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations(batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Released {released} expired stock reservations")
+        )
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.1 on 2026-10-18 15:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0003_stockreservation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CategoryProductCount",
+            fields=[
+                (
+                    "category",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="product_counts",
+                        serialize=False,
+                        to="products.category",
+                    ),
+                ),
+                ("product_count", models.IntegerField(default=0)),
+                ("total_product_count", models.IntegerField(default=0)),
+                ("subcategory_count", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name": "Category Product Count",
+                "verbose_name_plural": "Category Product Counts",
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.1 on 2026-10-18 15:33
+
+from django.db import migrations, models
+
+
+def populate_family_keys(apps, schema_editor):
+    # The family key rule as of this migration, kept here so later changes
+    # to products.families do not alter what this migration does
+    Product = apps.get_model("products", "Product")
+    products = list(Product.objects.only("id", "name"))
+    for product in products:
+        name = product.name or ""
+        if " - " in name:
+            name = name.split(" - ")[0]
+        elif " (" in name:
+            name = name.split(" (")[0]
+        product.family_key = name.strip().lower()[:200]
+    Product.objects.bulk_update(products, ["family_key"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0005_product_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="family_key",
+            field=models.CharField(blank=True, editable=False, max_length=200),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["category", "family_key"], name="product_family_idx"
+            ),
+        ),
+        migrations.RunPython(populate_family_keys, migrations.RunPython.noop),
+    ]
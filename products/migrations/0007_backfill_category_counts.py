@@ -0,0 +1,50 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def backfill_category_counts(apps, schema_editor):
+    """Compute a count row for every category that has none yet"""
+    Category = apps.get_model("products", "Category")
+    CategoryProductCount = apps.get_model("products", "CategoryProductCount")
+    Product = apps.get_model("products", "Product")
+
+    direct = dict(
+        Product.objects.filter(is_active=True, parent__isnull=True)
+        .values("category_id")
+        .annotate(total=Count("id"))
+        .values_list("category_id", "total")
+    )
+    children = {}
+    for child_id, parent_id in Category.objects.filter(
+        parent__isnull=False, active=True
+    ).values_list("id", "parent_id"):
+        children.setdefault(parent_id, []).append(child_id)
+
+    existing = set(CategoryProductCount.objects.values_list("category_id", flat=True))
+    rows = []
+    for category_id in Category.objects.values_list("id", flat=True):
+        if category_id in existing:
+            continue
+        own = direct.get(category_id, 0)
+        subcategories = children.get(category_id, [])
+        rows.append(
+            CategoryProductCount(
+                category_id=category_id,
+                product_count=own,
+                total_product_count=own
+                + sum(direct.get(child_id, 0) for child_id in subcategories),
+                subcategory_count=len(subcategories),
+            )
+        )
+    CategoryProductCount.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0006_product_family_key"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_category_counts, migrations.RunPython.noop),
+    ]
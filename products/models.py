@@ -1,4 +1,5 @@
 from django.db import models
+from django.conf import settings
 from django.urls import reverse
 from django.utils.text import slugify
 
@@ -51,6 +52,8 @@ class Product(models.Model):
     parent = models.ForeignKey(
         "self", on_delete=models.CASCADE, null=True, blank=True, related_name="variants"
     )
+    # Lower-cased base name grouping name-based families (see products.families)
+    family_key = models.CharField(max_length=200, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -58,6 +61,15 @@ class Product(models.Model):
         verbose_name = "Product"
         verbose_name_plural = "Products"
         ordering = ["name"]
+        # Keyset pagination walks these in order (see products.pagination)
+        indexes = [
+            models.Index(fields=["name", "id"], name="product_name_keyset_idx"),
+            models.Index(fields=["price", "id"], name="product_price_keyset_idx"),
+            models.Index(
+                fields=["created_at", "id"], name="product_created_keyset_idx"
+            ),
+            models.Index(fields=["category", "family_key"], name="product_family_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -85,3 +97,57 @@ class Product(models.Model):
     @property
     def is_variant(self):
         return self.parent is not None
+
+
+class CategoryProductCount(models.Model):
+    """
+    Denormalized product counts per category.
+
+    Only active parent products (not variants) are counted, matching what the
+    catalog pages list. ``total_product_count`` rolls up the category's own
+    products plus those of its active subcategories.
+    """
+
+    category = models.OneToOneField(
+        Category,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="product_counts",
+    )
+    product_count = models.IntegerField(default=0)
+    total_product_count = models.IntegerField(default=0)
+    subcategory_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Category Product Count"
+        verbose_name_plural = "Category Product Counts"
+
+    def __str__(self):
+        return f"{self.category.name}: {self.total_product_count} products"
+
+
+class StockReservation(models.Model):
+    """Short-lived hold on product stock for an in-progress checkout"""
+
+    product = models.ForeignKey(
+        Product, on_delete=models.CASCADE, related_name="reservations"
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="stock_reservations",
+    )
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Stock Reservation"
+        verbose_name_plural = "Stock Reservations"
+        unique_together = ("product", "user")
+        indexes = [models.Index(fields=["product", "expires_at"])]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name} held until {self.expires_at}"
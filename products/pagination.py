@@ -0,0 +1,146 @@
+"""
+Keyset (cursor) pagination for product listings.
+
+Instead of OFFSET, each page continues strictly after the sort key of the
+last product of the previous page, with the product id as tie-breaker. Every
+page costs one indexed range query of ``per_page + 1`` rows however deep the
+shopper scrolls, and pages stay stable while products are added or removed.
+"""
+
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+
+# Sort key -> (field, descending); the id tie-breaker follows the field's direction
+SORT_OPTIONS = {
+    "name": ("name", False),
+    "price": ("price", False),
+    "price_desc": ("price", True),
+    "newest": ("created_at", True),
+}
+
+SORT_LABELS = {
+    "name": "Name",
+    "price": "Price: low to high",
+    "price_desc": "Price: high to low",
+    "newest": "Newest",
+}
+
+DEFAULT_SORT = "name"
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _decode_value(field, value):
+    if field == "created_at":
+        return datetime.fromisoformat(value)
+    if field == "price":
+        return Decimal(value)
+    if not isinstance(value, str):
+        raise TypeError(value)
+    return value
+
+
+def encode_cursor(sort, product):
+    """Build the opaque cursor pointing just after ``product``"""
+    field, _ = SORT_OPTIONS[sort]
+    payload = json.dumps([_encode_value(getattr(product, field)), product.id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(sort, cursor):
+    """
+    Decode a cursor into its (sort value, id) pair.
+
+    Raises:
+        InvalidCursor: If the cursor is malformed or belongs to another sort
+    """
+    field, _ = SORT_OPTIONS[sort]
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, product_id = json.loads(base64.urlsafe_b64decode(padded))
+        return _decode_value(field, value), int(product_id)
+    except (
+        binascii.Error,
+        InvalidOperation,
+        TypeError,
+        UnicodeDecodeError,
+        ValueError,
+    ) as exc:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from exc
+
+
+@dataclass(frozen=True)
+class KeysetPage:
+    """One page of a keyset-paginated listing"""
+
+    items: list
+    sort: str
+    per_page: int
+    next_cursor: str = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def normalize_sort(sort):
+    """Fall back to the default sort for unknown sort keys"""
+    return sort if sort in SORT_OPTIONS else DEFAULT_SORT
+
+
+def paginate_products(queryset, sort=DEFAULT_SORT, cursor=None, per_page=24):
+    """
+    Return the page of ``queryset`` following ``cursor``.
+
+    Args:
+        queryset: Products to paginate, already filtered
+        sort (str): One of SORT_OPTIONS; unknown keys use the default
+        cursor (str): Cursor from the previous page, or None for the first
+        per_page (int): Page size
+
+    Raises:
+        InvalidCursor: If the cursor cannot be decoded
+
+    Returns:
+        KeysetPage: The products of the page and the cursor of the next one
+    """
+    sort = normalize_sort(sort)
+    field, descending = SORT_OPTIONS[sort]
+
+    if cursor:
+        value, last_id = decode_cursor(sort, cursor)
+        lookup = "lt" if descending else "gt"
+        queryset = queryset.filter(
+            Q(**{f"{field}__{lookup}": value})
+            | Q(**{field: value, f"id__{lookup}": last_id})
+        )
+
+    prefix = "-" if descending else ""
+    rows = list(queryset.order_by(f"{prefix}{field}", f"{prefix}id")[: per_page + 1])
+    items = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        next_cursor = encode_cursor(sort, items[-1])
+    return KeysetPage(items=items, sort=sort, per_page=per_page, next_cursor=next_cursor)
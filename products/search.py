@@ -0,0 +1,219 @@
+"""
+Full-text product search.
+
+On SQLite the searchable products (active, non-variant) are mirrored into an
+FTS5 virtual table over product name, description and category name, keyed
+by product id. Queries match every term as a prefix and are ranked with
+BM25, weighting name matches above category and description matches.
+
+The table is created after ``migrate`` (and filled if it was missing), kept
+in sync by the product and category signals in ``products.signals`` and can
+be rebuilt with the ``rebuild_search_index`` management command. Other
+database backends fall back to ``icontains`` matching on the product name.
+"""
+
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .models import Category, Product
+
+SEARCH_TABLE = "products_product_fts"
+
+# BM25 column weights for name, description and category
+RANK_WEIGHTS = (10.0, 1.0, 4.0)
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def search_available(using=DEFAULT_DB_ALIAS):
+    """Whether the database supports the FTS5 index"""
+    return connections[using].vendor == "sqlite"
+
+
+def search_terms(query):
+    """Split a user query into lower-cased search terms"""
+    return [term.lower() for term in _TERM_RE.findall(query or "")]
+
+
+def build_match_expression(terms):
+    """
+    Build an FTS5 MATCH expression requiring every term as a prefix.
+
+    Terms are quoted so FTS5 operators in user input are matched literally.
+    """
+    return " ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+def _indexed_products_sql(where):
+    """SELECT of the index rows for the searchable products matching ``where``"""
+    return (
+        f"SELECT p.id, p.name, p.description, c.name "
+        f"FROM {Product._meta.db_table} p "
+        f"JOIN {Category._meta.db_table} c ON c.id = p.category_id "
+        f"WHERE p.is_active AND p.parent_id IS NULL AND ({where})"
+    )
+
+
+def ensure_search_table(using=DEFAULT_DB_ALIAS):
+    """
+    Create the FTS5 table if it does not exist yet.
+
+    Returns:
+        bool: True if the table was created
+    """
+    if not search_available(using):
+        return False
+    connection = connections[using]
+    if SEARCH_TABLE in connection.introspection.table_names():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+            f"name, description, category, "
+            f"tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+    return True
+
+
+def create_search_table(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """post_migrate handler creating and filling a missing search index"""
+    if ensure_search_table(using):
+        rebuild_search_index(using)
+
+
+def rebuild_search_index(using=DEFAULT_DB_ALIAS):
+    """
+    Repopulate the search index from scratch.
+
+    Returns:
+        int: Number of indexed products
+    """
+    if not search_available(using):
+        return 0
+    ensure_search_table(using)
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, name, description, category) "
+            + _indexed_products_sql("1")
+        )
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')"
+        )
+        cursor.execute(f"SELECT COUNT(*) FROM {SEARCH_TABLE}")
+        return cursor.fetchone()[0]
+
+
+def _reindex(where, params, using=DEFAULT_DB_ALIAS):
+    """Replace the index rows of the products matching ``where``"""
+    if not search_available(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN "
+            f"(SELECT p.id FROM {Product._meta.db_table} p WHERE {where})",
+            params,
+        )
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, name, description, category) "
+            + _indexed_products_sql(where),
+            params,
+        )
+
+
+def index_products(product_ids, using=DEFAULT_DB_ALIAS):
+    """Re-index the given products, dropping ones that are no longer searchable"""
+    product_ids = list(product_ids)
+    if product_ids:
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        _reindex(f"p.id IN ({placeholders})", product_ids, using)
+
+
+def index_category_products(category_id, using=DEFAULT_DB_ALIAS):
+    """Re-index every product of a category, e.g. after it was renamed"""
+    _reindex("p.category_id = %s", [category_id], using)
+
+
+def remove_products(product_ids, using=DEFAULT_DB_ALIAS):
+    """Drop the given products from the index"""
+    product_ids = list(product_ids)
+    if not product_ids or not search_available(using):
+        return
+    placeholders = ", ".join(["%s"] * len(product_ids))
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})",
+            product_ids,
+        )
+
+
+class ProductSearchResults:
+    """
+    Lazily evaluated, ranked search results.
+
+    Supports ``count()`` and slicing, so it can be handed straight to a
+    Paginator: only the requested page of ids is ranked and fetched.
+    """
+
+    def __init__(self, query, using=DEFAULT_DB_ALIAS):
+        self.query = query
+        self.terms = search_terms(query)
+        self.using = using
+        self._count = None
+
+    def _fallback_queryset(self):
+        products = Product.objects.filter(is_active=True, parent=None)
+        for term in self.terms:
+            products = products.filter(name__icontains=term)
+        return products.select_related("category").order_by("name")
+
+    def count(self):
+        if self._count is None:
+            if not self.terms:
+                self._count = 0
+            elif not search_available(self.using):
+                self._count = self._fallback_queryset().count()
+            else:
+                with connections[self.using].cursor() as cursor:
+                    cursor.execute(
+                        f"SELECT COUNT(*) FROM {SEARCH_TABLE} "
+                        f"WHERE {SEARCH_TABLE} MATCH %s",
+                        [build_match_expression(self.terms)],
+                    )
+                    self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def _ranked_ids(self, offset, limit):
+        weights = ", ".join(str(weight) for weight in RANK_WEIGHTS)
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s "
+                f"ORDER BY bm25({SEARCH_TABLE}, {weights}), rowid LIMIT %s OFFSET %s",
+                [build_match_expression(self.terms), limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key : key + 1][0]
+        offset = key.start or 0
+        limit = (key.stop - offset) if key.stop is not None else -1
+        if not self.terms or limit == 0:
+            return []
+        if not search_available(self.using):
+            return list(self._fallback_queryset()[key])
+
+        ids = self._ranked_ids(offset, limit)
+        products = (
+            Product.objects.using(self.using).select_related("category").in_bulk(ids)
+        )
+        return [products[product_id] for product_id in ids if product_id in products]
+
+
+def search_products(query, using=DEFAULT_DB_ALIAS):
+    """Search active products, best matches first"""
+    return ProductSearchResults(query, using)
@@ -0,0 +1,124 @@
+"""
+Signal handlers keeping denormalized catalog data in sync with products
+and categories.
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .category_tree import bump_category_tree_version
+from .counts import (
+    apply_product_count_deltas,
+    is_counted,
+    refresh_category_counts,
+)
+from .families import family_key
+from .models import Category, Product
+from .search import index_category_products, index_products, remove_products
+
+
+@receiver(pre_save, sender=Product)
+def set_product_family_key(sender, instance, raw=False, **kwargs):
+    """Keep the product's family key in step with its name"""
+    if not raw:
+        instance.family_key = family_key(instance.name)
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_count_state(sender, instance, raw=False, **kwargs):
+    """Record the category and counted state a product had before saving"""
+    instance._count_state = None
+    if raw or instance.pk is None:
+        return
+    previous = (
+        Product.objects.filter(pk=instance.pk)
+        .values_list("category_id", "is_active", "parent_id")
+        .first()
+    )
+    if previous:
+        category_id, is_active, parent_id = previous
+        instance._count_state = (category_id, is_counted(is_active, parent_id))
+
+
+@receiver(post_save, sender=Product)
+def update_counts_on_product_save(sender, instance, created, raw=False, **kwargs):
+    """Apply +1/-1 deltas for the product's old and new category"""
+    if raw:
+        return
+    deltas = {}
+    previous = getattr(instance, "_count_state", None)
+    if previous and previous[1]:
+        deltas[previous[0]] = deltas.get(previous[0], 0) - 1
+    if is_counted(instance.is_active, instance.parent_id):
+        deltas[instance.category_id] = deltas.get(instance.category_id, 0) + 1
+    apply_product_count_deltas(deltas)
+
+
+@receiver(post_delete, sender=Product)
+def update_counts_on_product_delete(sender, instance, **kwargs):
+    """Remove a deleted product from its category's counts"""
+    if is_counted(instance.is_active, instance.parent_id):
+        apply_product_count_deltas({instance.category_id: -1})
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_state(sender, instance, raw=False, **kwargs):
+    """Record the parent and name a category had before saving"""
+    instance._previous_parent_id = None
+    instance._previous_name = None
+    if raw or instance.pk is None:
+        return
+    previous = (
+        Category.objects.filter(pk=instance.pk).values_list("parent_id", "name").first()
+    )
+    if previous:
+        instance._previous_parent_id, instance._previous_name = previous
+
+
+@receiver(post_save, sender=Category)
+def update_counts_on_category_save(sender, instance, raw=False, **kwargs):
+    """Recompute the category and the parents it rolls up into"""
+    if raw:
+        return
+    affected = {instance.pk, instance.parent_id, instance._previous_parent_id}
+    refresh_category_counts(affected - {None})
+
+
+@receiver(post_delete, sender=Category)
+def update_counts_on_category_delete(sender, instance, **kwargs):
+    """Recompute the parent of a deleted category"""
+    if instance.parent_id:
+        refresh_category_counts({instance.parent_id})
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, raw=False, **kwargs):
+    """Make every process reload the category tree on its next read"""
+    if not raw:
+        bump_category_tree_version()
+
+
+@receiver(post_save, sender=Product)
+def update_search_index_on_product_save(sender, instance, raw=False, **kwargs):
+    """Index, re-index or drop the product depending on whether it is searchable"""
+    if not raw:
+        index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def update_search_index_on_product_delete(sender, instance, **kwargs):
+    """Drop a deleted product from the search index"""
+    remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def update_search_index_on_category_save(
+    sender, instance, created, raw=False, **kwargs
+):
+    """Re-index the category's products when its name changes"""
+    if raw or created:
+        return
+    previous_name = getattr(instance, "_previous_name", None)
+    if previous_name is not None and previous_name != instance.name:
+        index_category_products(instance.pk)
@@ -0,0 +1,17 @@
+from django import template
+
+from products.card_cache import render_product_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def product_cards(products, template_name):
+    """
+    Render product cards through the fragment cache.
+
+    Usage:
+        {% product_cards products "products/cards/list.html" as cards %}
+        {% for card in cards %}{{ card }}{% endfor %}
+    """
+    return render_product_cards(products, template_name)
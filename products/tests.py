@@ -1,3 +1,643 @@
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .card_cache import render_product_cards
+from .category_tree import bump_category_tree_version, get_category_tree
+from .counts import (
+    count_active_products,
+    get_category_counts,
+    rebuild_category_counts,
+)
+from .families import family_key, get_family_members
+from .inventory import (
+    annotate_available_stock,
+    release_expired_reservations,
+    reserve_stock,
+)
+from .models import Category, CategoryProductCount, Product, StockReservation
+from .pagination import InvalidCursor, paginate_products
+from .search import search_products
+
+
+class StockReservationTest(TestCase):
+    """Tests for checkout stock reservations"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username="alice", password="secret")
+        self.bob = User.objects.create_user(username="bob", password="secret")
+        category = Category.objects.create(name="Bakery")
+        self.bread = Product.objects.create(
+            name="Bread",
+            slug="bread",
+            price=Decimal("3.00"),
+            category=category,
+            stock=5,
+        )
+
+    def test_reservation_reduces_available_stock_for_others(self):
+        """Test that a hold is visible to other shoppers only"""
+        reserve_stock(self.alice, {self.bread.id: 3})
+
+        [for_bob] = annotate_available_stock([self.bread], self.bob)
+        self.assertEqual(for_bob.available_stock, 2)
+
+        [for_alice] = annotate_available_stock([self.bread], self.alice)
+        self.assertEqual(for_alice.available_stock, 5)
+
+    def test_reservation_reports_shortages(self):
+        """Test that lines are only held up to the available quantity"""
+        reserve_stock(self.alice, {self.bread.id: 4})
+
+        shortages = reserve_stock(self.bob, {self.bread.id: 2})
+
+        self.assertEqual(shortages, [(self.bread, 2, 1)])
+        self.assertEqual(StockReservation.objects.get(user=self.bob).quantity, 1)
+
+    def test_reservation_is_refreshed_not_duplicated(self):
+        """Test that re-reserving replaces the user's previous holds"""
+        reserve_stock(self.alice, {self.bread.id: 1})
+        reserve_stock(self.alice, {self.bread.id: 2})
+
+        self.assertEqual(StockReservation.objects.get(user=self.alice).quantity, 2)
+
+    def test_expired_reservations_are_ignored_and_released(self):
+        """Test that expired holds neither block stock nor survive the sweep"""
+        reserve_stock(self.alice, {self.bread.id: 5}, ttl=timedelta(minutes=-1))
+
+        [for_bob] = annotate_available_stock([self.bread], self.bob)
+        self.assertEqual(for_bob.available_stock, 5)
+
+        self.assertEqual(release_expired_reservations(batch_size=1), 1)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_release_command(self):
+        """Test the release_expired_reservations management command"""
+        StockReservation.objects.create(
+            product=self.bread,
+            user=self.alice,
+            quantity=1,
+            expires_at=timezone.now() - timedelta(minutes=1),
+        )
+
+        call_command("release_expired_reservations", stdout=StringIO())
+
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class CategoryProductCountTest(TestCase):
+    """Tests for the materialized category product counts"""
+
+    def setUp(self):
+        self.food = Category.objects.create(name="Food")
+        self.fruit = Category.objects.create(name="Fruit", parent=self.food)
+        self.veg = Category.objects.create(name="Vegetables", parent=self.food)
+        rebuild_category_counts()
+
+    def add_product(self, slug, category, **kwargs):
+        return Product.objects.create(
+            name=slug.title(),
+            slug=slug,
+            price=Decimal("1.00"),
+            category=category,
+            **kwargs,
+        )
+
+    def counts(self, category):
+        return CategoryProductCount.objects.get(category=category)
+
+    def test_product_save_updates_direct_and_rolled_up_counts(self):
+        """Test that new products are counted in their category and its parent"""
+        self.add_product("apple", self.fruit)
+        self.add_product("carrot", self.veg)
+        self.add_product("rice", self.food)
+
+        self.assertEqual(self.counts(self.fruit).product_count, 1)
+        self.assertEqual(self.counts(self.food).product_count, 1)
+        self.assertEqual(self.counts(self.food).total_product_count, 3)
+        self.assertEqual(self.counts(self.food).subcategory_count, 2)
+
+    def test_variants_and_inactive_products_are_not_counted(self):
+        """Test that only active parent products count"""
+        apple = self.add_product("apple", self.fruit)
+        self.add_product("apple-large", self.fruit, parent=apple)
+        self.add_product("pear", self.fruit, is_active=False)
+
+        self.assertEqual(self.counts(self.fruit).product_count, 1)
+
+    def test_moving_and_deactivating_products(self):
+        """Test that category moves and deactivation adjust counts"""
+        apple = self.add_product("apple", self.fruit)
+
+        apple.category = self.veg
+        apple.save()
+        self.assertEqual(self.counts(self.fruit).product_count, 0)
+        self.assertEqual(self.counts(self.veg).product_count, 1)
+
+        apple.is_active = False
+        apple.save()
+        self.assertEqual(self.counts(self.veg).product_count, 0)
+        self.assertEqual(self.counts(self.food).total_product_count, 0)
+
+    def test_product_delete_updates_counts(self):
+        """Test that deleting a product decrements its counts"""
+        apple = self.add_product("apple", self.fruit)
+
+        apple.delete()
+
+        self.assertEqual(self.counts(self.food).total_product_count, 0)
+
+    def test_deactivating_subcategory_updates_parent(self):
+        """Test that an inactive subcategory drops out of the rollup"""
+        self.add_product("apple", self.fruit)
+
+        self.fruit.active = False
+        self.fruit.save()
+
+        self.assertEqual(self.counts(self.food).total_product_count, 0)
+        self.assertEqual(self.counts(self.food).subcategory_count, 1)
+
+    def test_deleting_category_with_products(self):
+        """Test that cascading deletes keep the counts consistent"""
+        self.add_product("apple", self.fruit)
+
+        self.fruit.delete()
+
+        self.assertEqual(self.counts(self.food).subcategory_count, 1)
+        self.assertEqual(self.counts(self.food).total_product_count, 0)
+
+    def test_missing_rows_are_computed_on_read(self):
+        """Test that counts are rebuilt for categories without a row"""
+        self.add_product("apple", self.fruit)
+        CategoryProductCount.objects.all().delete()
+
+        counts = get_category_counts([self.food.id, self.fruit.id])
+
+        self.assertEqual(counts[self.food.id].total_product_count, 1)
+        self.assertEqual(counts[self.fruit.id].product_count, 1)
+
+    def test_total_includes_categories_without_a_row(self):
+        """Test that the overall total computes missing rows first"""
+        self.add_product("apple", self.fruit)
+        self.add_product("rice", self.food)
+        CategoryProductCount.objects.filter(category=self.fruit).delete()
+
+        self.assertEqual(count_active_products(), 2)
+        self.assertTrue(
+            CategoryProductCount.objects.filter(category=self.fruit).exists()
+        )
+
+    def test_categories_page_reads_counts_in_constant_queries(self):
+        """Test that the categories page does not count per category"""
+        for i in range(5):
+            Category.objects.create(name=f"Extra {i}", parent=self.food)
+        self.client.get("/categories/")
+
+        # Categories come from the cached tree, leaving only the counts read
+        with self.assertNumQueries(1):
+            response = self.client.get("/categories/")
+
+        self.assertEqual(response.status_code, 200)
+
+
+class CategoryTreeTest(TestCase):
+    """Tests for the in-process category tree cache"""
+
+    def setUp(self):
+        self.produce = Category.objects.create(name="Produce")
+        self.fruit = Category.objects.create(name="Fruit", parent=self.produce)
+        self.citrus = Category.objects.create(name="Citrus", parent=self.fruit)
+        self.hidden = Category.objects.create(
+            name="Hidden", parent=self.produce, active=False
+        )
+        self.bakery = Category.objects.create(name="Bakery")
+        # Earlier tests may have left a tree built from rolled-back rows
+        bump_category_tree_version()
+
+    def test_tree_structure(self):
+        """Test that lookups only expose active categories"""
+        tree = get_category_tree()
+
+        self.assertEqual([c.name for c in tree.roots()], ["Bakery", "Produce"])
+        self.assertEqual(tree.child_ids(self.produce.id), (self.fruit.id,))
+        self.assertEqual(
+            tree.descendant_ids(self.produce.id), {self.fruit.id, self.citrus.id}
+        )
+        self.assertEqual(
+            [c.name for c in tree.ancestors(self.citrus.id)], ["Produce", "Fruit"]
+        )
+        self.assertIsNone(tree.get_by_slug(self.hidden.slug))
+
+    def test_cached_tree_costs_no_queries(self):
+        """Test that reads after the first build never hit the database"""
+        get_category_tree()
+
+        with self.assertNumQueries(0):
+            tree = get_category_tree()
+            fruit = tree.get_by_slug("fruit")
+            self.assertEqual(fruit.parent.name, "Produce")
+
+    def test_copies_do_not_leak_into_tree(self):
+        """Test that per-request attributes stay off the shared snapshot"""
+        get_category_tree().get(self.fruit.id).product_count = 42
+
+        self.assertFalse(
+            hasattr(get_category_tree().get(self.fruit.id), "product_count")
+        )
+
+    def test_category_changes_invalidate_tree(self):
+        """Test that saving or deleting a category rebuilds the tree"""
+        get_category_tree()
+
+        self.hidden.active = True
+        self.hidden.save()
+        self.assertEqual(
+            set(get_category_tree().child_ids(self.produce.id)),
+            {self.fruit.id, self.hidden.id},
+        )
+
+        self.bakery.delete()
+        self.assertEqual([c.name for c in get_category_tree().roots()], ["Produce"])
+
+    def test_category_detail_uses_tree(self):
+        """Test that category pages resolve categories from the tree"""
+        response = self.client.get(reverse("category_detail", args=["fruit"]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["category"].parent.name, "Produce")
+
+        response = self.client.get(reverse("category_detail", args=["hidden"]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductSearchTest(TestCase):
+    """Tests for the FTS5 product search"""
+
+    def setUp(self):
+        self.dairy = Category.objects.create(name="Dairy")
+        self.bakery = Category.objects.create(name="Bakery")
+        self.milk = Product.objects.create(
+            name="Fresh Milk",
+            slug="fresh-milk",
+            description="Full cream milk from local farms",
+            price=Decimal("6.50"),
+            category=self.dairy,
+        )
+        self.bread = Product.objects.create(
+            name="Milk Bread",
+            slug="milk-bread",
+            description="Soft loaf",
+            price=Decimal("4.00"),
+            category=self.bakery,
+        )
+        self.cheese = Product.objects.create(
+            name="Cheddar",
+            slug="cheddar",
+            description="Aged cheese, pairs well with milk bread",
+            price=Decimal("12.00"),
+            category=self.dairy,
+        )
+
+    def names(self, query):
+        return [product.name for product in search_products(query)[:10]]
+
+    def test_prefix_matching_and_ranking(self):
+        """Test that partial terms match and name hits outrank descriptions"""
+        self.assertEqual(self.names("mil")[-1], "Cheddar")
+        self.assertEqual(set(self.names("mil")[:2]), {"Fresh Milk", "Milk Bread"})
+        self.assertEqual(self.names("milk bre"), ["Milk Bread", "Cheddar"])
+
+    def test_category_name_is_searchable(self):
+        """Test that products are found by category name, including renames"""
+        self.assertEqual(set(self.names("dairy")), {"Fresh Milk", "Cheddar"})
+
+        self.dairy.name = "Chilled"
+        self.dairy.save()
+
+        self.assertEqual(self.names("dairy"), [])
+        self.assertEqual(set(self.names("chilled")), {"Fresh Milk", "Cheddar"})
+
+    def test_index_follows_product_changes(self):
+        """Test that inactive, variant and deleted products drop out"""
+        self.milk.is_active = False
+        self.milk.save()
+        Product.objects.create(
+            name="Milk 2L",
+            slug="milk-2l",
+            price=Decimal("11.00"),
+            category=self.dairy,
+            parent=self.bread,
+        )
+        self.bread.name = "Sourdough"
+        self.bread.save()
+        self.cheese.delete()
+
+        self.assertEqual(self.names("milk"), [])
+        self.assertEqual(self.names("sour"), ["Sourdough"])
+
+    def test_operators_in_query_are_literal(self):
+        """Test that FTS5 syntax in user input cannot break the query"""
+        self.assertEqual(self.names('milk" OR NOT * ('), [])
+        self.assertEqual(self.names("   "), [])
+
+    def test_rebuild_command(self):
+        """Test that the rebuild command repopulates the index"""
+        out = StringIO()
+        call_command("rebuild_search_index", stdout=out)
+
+        self.assertIn("Indexed 3 products", out.getvalue())
+        self.assertEqual(len(self.names("milk")), 3)
+
+    def test_search_views(self):
+        """Test the search page and the paginated JSON API"""
+        response = self.client.get(reverse("products:search"), {"q": "milk"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["total_count"], 3)
+
+        response = self.client.get(
+            reverse("products:api_search"), {"q": "milk", "per_page": 2, "page": 2}
+        )
+        data = response.json()
+        self.assertEqual(data["count"], 3)
+        self.assertEqual(data["num_pages"], 2)
+        self.assertEqual([r["name"] for r in data["results"]], ["Cheddar"])
+        self.assertFalse(data["has_next"])
+
+
+class KeysetPaginationTest(TestCase):
+    """Tests for cursor-based product listings"""
+
+    def setUp(self):
+        self.category = Category.objects.create(name="Snacks")
+        self.other = Category.objects.create(name="Drinks")
+        # Duplicate names and prices exercise the id tie-breaker
+        for i in range(7):
+            Product.objects.create(
+                name=f"Chips {i // 2}",
+                slug=f"chips-{i}",
+                price=Decimal("3.00") + i % 3,
+                category=self.category,
+            )
+        Product.objects.create(
+            name="Cola", slug="cola", price=Decimal("2.00"), category=self.other
+        )
+        bump_category_tree_version()
+
+    def walk(self, sort, per_page=3):
+        products = Product.objects.filter(category=self.category)
+        slugs, cursor = [], None
+        while True:
+            page = paginate_products(products, sort, cursor, per_page=per_page)
+            slugs.extend(product.slug for product in page)
+            if not page.has_next:
+                return slugs
+            cursor = page.next_cursor
+
+    def test_pages_cover_listing_once_in_order(self):
+        """Test that walking every page matches the full ordered listing"""
+        products = Product.objects.filter(category=self.category)
+        for sort, ordering in [
+            ("name", ["name", "id"]),
+            ("price", ["price", "id"]),
+            ("price_desc", ["-price", "-id"]),
+            ("newest", ["-created_at", "-id"]),
+        ]:
+            expected = list(products.order_by(*ordering).values_list("slug", flat=True))
+            self.assertEqual(self.walk(sort), expected, sort)
+
+    def test_invalid_cursor(self):
+        """Test that garbage cursors are rejected"""
+        with self.assertRaises(InvalidCursor):
+            paginate_products(Product.objects.all(), "price", "not-a-cursor")
+
+    def test_list_view_is_bounded(self):
+        """Test that the listing renders one page with a link to the next"""
+        response = self.client.get(
+            reverse("products:product_list"), {"category": "snacks", "sort": "price"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["products"]), 7)
+        self.assertEqual(response.context["total_count"], 7)
+        self.assertIsNone(response.context["next_page_url"])
+
+    def test_api_infinite_scroll(self):
+        """Test that the API pages through a category by cursor"""
+        url = reverse("api_product_list")
+        data = self.client.get(url, {"category": "snacks", "per_page": 5}).json()
+        self.assertEqual(len(data["results"]), 5)
+        self.assertTrue(data["has_next"])
+
+        data = self.client.get(
+            url, {"category": "snacks", "per_page": 5, "cursor": data["next_cursor"]}
+        ).json()
+        self.assertEqual(len(data["results"]), 2)
+        self.assertIsNone(data["next_cursor"])
+
+        response = self.client.get(url, {"cursor": "bogus"})
+        self.assertEqual(response.status_code, 400)
+
+
+class ProductFamilyTest(TestCase):
+    """Tests for the precomputed product family index"""
+
+    def setUp(self):
+        self.dairy = Category.objects.create(name="Dairy")
+        self.bakery = Category.objects.create(name="Bakery")
+        for name, category in [
+            ("Milk (1L)", self.dairy),
+            ("Milk (2L)", self.dairy),
+            ("Milk - Skimmed", self.dairy),
+            ("Milk Bread", self.dairy),
+            ("Milk (Loaf)", self.bakery),
+        ]:
+            Product.objects.create(
+                name=name, slug=slugify(name), price=Decimal("5.00"), category=category
+            )
+
+    def test_family_key_rules(self):
+        """Test the base-name rules behind family keys"""
+        self.assertEqual(family_key("Milk (1L)"), "milk")
+        self.assertEqual(family_key("Apple - Red (1kg)"), "apple")
+        self.assertEqual(family_key("Milk Bread"), "milk bread")
+
+    def test_family_members_share_category_and_base_name(self):
+        """Test that families stay within a category and skip lookalikes"""
+        product = Product.objects.get(name="Milk (1L)")
+
+        members = {p.name for p in get_family_members(product)}
+
+        self.assertEqual(members, {"Milk (2L)", "Milk - Skimmed"})
+
+    def test_key_follows_renames(self):
+        """Test that saving a product updates its family key"""
+        product = Product.objects.get(name="Milk Bread")
+        product.name = "Milk (500ml)"
+        product.save()
+
+        self.assertEqual(Product.objects.get(pk=product.pk).family_key, "milk")
+
+    def test_rebuild_command(self):
+        """Test that the rebuild command repairs stale keys"""
+        Product.objects.update(family_key="")
+        out = StringIO()
+
+        call_command("rebuild_product_families", stdout=out)
+
+        self.assertIn("of 5 products", out.getvalue())
+        self.assertEqual(Product.objects.filter(family_key="milk").count(), 4)
+
+    def test_detail_page_groups_family(self):
+        """Test that the detail page lists the family as variations"""
+        response = self.client.get(reverse("product_detail", args=["milk-1l"]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["product_variations"]), 3)
+        self.assertEqual(
+            [p.name for p in response.context["related_products"]], ["Milk Bread"]
+        )
+
+
+class ProductCardCacheTest(TestCase):
+    """Tests for the rendered product card fragment cache"""
+
+    template_name = "products/cards/list.html"
+
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name="Frozen")
+        self.product = Product.objects.create(
+            name="Ice Cream",
+            slug="ice-cream",
+            price=Decimal("9.90"),
+            category=self.category,
+        )
+
+    def render(self):
+        products = Product.objects.select_related("category").filter(pk=self.product.pk)
+        return render_product_cards(products, self.template_name)[0]
+
+    def test_cards_are_served_from_cache(self):
+        """Test that a warm page renders no templates and uses one cache read"""
+        self.render()
+
+        with patch("products.card_cache.render_to_string") as render_to_string:
+            with patch.object(cache, "get_many", wraps=cache.get_many) as get_many:
+                html = self.render()
+
+        render_to_string.assert_not_called()
+        get_many.assert_called_once()
+        self.assertIn("Ice Cream", html)
+
+    def test_product_change_invalidates_card(self):
+        """Test that a new price shows up immediately"""
+        self.assertIn("9.90", self.render())
+
+        self.product.price = Decimal("7.50")
+        self.product.save()
+
+        self.assertIn("7.50", self.render())
+
+    def test_category_change_invalidates_card(self):
+        """Test that renaming the category re-renders its cards"""
+        self.render()
+
+        self.category.name = "Freezer"
+        self.category.save()
+
+        self.assertIn("Freezer", self.render())
+
+
+class BulkAdminActionTest(TestCase):
+    """Tests for the set-based admin bulk actions"""
+
+    def setUp(self):
+        self.food = Category.objects.create(name="Food")
+        self.fruit = Category.objects.create(name="Fruit", parent=self.food)
+        self.products = [
+            Product.objects.create(
+                name=f"Apple {i}",
+                slug=f"apple-{i}",
+                price=Decimal("3.33") * (i + 1),
+                category=self.fruit,
+            )
+            for i in range(20)
+        ]
+        rebuild_category_counts()
+        User.objects.create_superuser("admin", "admin@example.com", "adminpass")
+        self.client.login(username="admin", password="adminpass")
+
+    def run_action(self, model, action, ids, **data):
+        return self.client.post(
+            reverse(f"admin:products_{model}_changelist"),
+            {"action": action, "_selected_action": ids, **data},
+        )
+
+    def test_discount_runs_in_constant_queries(self):
+        """Test that the discount is one UPDATE however many products"""
+        from .bulk import apply_discount_percentage
+
+        before = Product.objects.get(pk=self.products[0].pk).updated_at
+        # ids, UPDATE, search index delete and insert, plus savepoints
+        with self.assertNumQueries(6):
+            updated = apply_discount_percentage(Product.objects.all(), 15)
+
+        self.assertEqual(updated, 20)
+        first = Product.objects.get(pk=self.products[0].pk)
+        self.assertEqual(first.discount_price, Decimal("2.83"))
+        self.assertGreater(first.updated_at, before)
+
+    def test_discount_action(self):
+        """Test the admin action's form submission"""
+        ids = [product.pk for product in self.products[:2]]
+
+        self.run_action(
+            "product",
+            "apply_discount_percentage",
+            ids,
+            apply="1",
+            discount_percentage="50",
+        )
+
+        self.assertEqual(
+            list(
+                Product.objects.filter(pk__in=ids)
+                .order_by("pk")
+                .values_list("discount_price", flat=True)
+            ),
+            [Decimal("1.67"), Decimal("3.33")],
+        )
+
+    def test_toggle_keeps_counts_and_tree_in_sync(self):
+        """Test that toggling categories refreshes counts and the tree"""
+        self.assertEqual(
+            get_category_counts([self.food.pk])[self.food.pk].total_product_count,
+            20,
+        )
+        self.assertIsNotNone(get_category_tree().get(self.fruit.pk))
+
+        self.run_action("category", "toggle_active_status", [self.fruit.pk])
+
+        self.fruit.refresh_from_db()
+        self.assertFalse(self.fruit.active)
+        counts = get_category_counts([self.food.pk])[self.food.pk]
+        self.assertEqual(counts.total_product_count, 0)
+        self.assertEqual(counts.subcategory_count, 0)
+        self.assertIsNone(get_category_tree().get(self.fruit.pk))
+
+        self.run_action(
+            "category", "toggle_active_status", [self.fruit.pk, self.food.pk]
+        )
 
-# Create your tests here.
+        self.assertEqual(
+            dict(Category.objects.values_list("name", "active")),
+            {"Food": False, "Fruit": True},
+        )
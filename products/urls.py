@@ -6,6 +6,8 @@ app_name = "products"
 urlpatterns = [
     # Regular products URL patterns
     path("", views.product_list_view, name="product_list"),
+    path("search/", views.search_view, name="search"),
+    path("api/search/", views.api_search, name="api_search"),
     # Remove duplicate paths that now exist at the top level
     # path("categories/", views.categories_view, name="category_list"),
     # path("category/<slug:slug>/", views.category_detail_view, name="category_detail"),
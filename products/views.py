@@ -1,5 +1,13 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.http import Http404, JsonResponse
 from .models import Category, Product
+from .category_tree import get_category_tree
+from .counts import count_active_products, get_category_counts
+from .families import get_family_members
+from .inventory import annotate_available_stock
+from .pagination import SORT_LABELS, InvalidCursor, paginate_products
+from .search import search_products
 from django.contrib import messages
 from django.urls import reverse
 from django.urls import reverse_lazy
@@ -7,10 +15,79 @@ from django.urls import reverse
 from django.urls import reverse_lazy
 
 
+def _per_page(request, default, maximum):
+    """Read a bounded page size from the ``per_page`` parameter"""
+    try:
+        return min(max(int(request.GET.get("per_page", default)), 1), maximum)
+    except ValueError:
+        return default
+
+
+def _keyset_page(request, products, per_page=24):
+    """
+    Paginate a product listing by cursor and build the navigation links.
+
+    A stale or tampered cursor falls back to the first page.
+    """
+    products = products.select_related("category")
+    sort = request.GET.get("sort")
+    try:
+        page = paginate_products(
+            products, sort, request.GET.get("cursor"), per_page=per_page
+        )
+    except InvalidCursor:
+        page = paginate_products(products, sort, per_page=per_page)
+
+    params = request.GET.copy()
+    params.pop("cursor", None)
+    context = {
+        "page": page,
+        "sort": page.sort,
+        "sort_options": SORT_LABELS.items(),
+        # Filters the sort form has to carry over
+        "filter_params": [
+            (name, value)
+            for name, value in params.items()
+            if name not in ("sort", "cursor")
+        ],
+        "first_page_url": f"?{params.urlencode()}" if "cursor" in request.GET else None,
+        "next_page_url": None,
+    }
+    if page.has_next:
+        params["cursor"] = page.next_cursor
+        context["next_page_url"] = f"?{params.urlencode()}"
+    return context
+
+
+def _product_json(product):
+    """Serialize a product for the JSON APIs"""
+    return {
+        "id": product.id,
+        "name": product.name,
+        "slug": product.slug,
+        "price": float(product.price),
+        "discount_price": (
+            float(product.discount_price) if product.discount_price else None
+        ),
+        "image": product.image.url if product.image else None,
+        "category": product.category.name,
+        "url": reverse("product_detail", args=[product.slug]),
+    }
+
+
+def _category_products(category_tree, category):
+    """Active parent products of a category and its active subcategories"""
+    all_category_ids = [category.id] + list(category_tree.child_ids(category.id))
+    return Product.objects.filter(
+        category__id__in=all_category_ids, is_active=True, parent=None
+    )
+
+
 # Create your views here.
 def product_list_view(request):
     """View for displaying all products, optionally filtered"""
-    categories = Category.objects.filter(active=True, parent=None)
+    category_tree = get_category_tree()
+    categories = category_tree.roots()
     products = Product.objects.filter(is_active=True, parent=None)
 
     # Get category filter from URL parameters
@@ -18,31 +95,117 @@ def product_list_view(request):
     selected_category = None
 
     if category_filter:
-        try:
-            selected_category = Category.objects.get(slug=category_filter, active=True)
-            # Filter products by the selected category and its subcategories
-            subcategory_ids = list(
-                selected_category.children.filter(active=True).values_list(
-                    "id", flat=True
-                )
-            )
-            all_category_ids = [selected_category.id] + subcategory_ids
-            products = products.filter(category__id__in=all_category_ids)
-        except Category.DoesNotExist:
-            # If category doesn't exist, show all products
-            pass
+        # If category doesn't exist, show all products
+        selected_category = category_tree.get_by_slug(category_filter)
+
+    # Totals come from the materialized counts rather than a COUNT(*) scan
+    if selected_category:
+        # Filter products by the selected category and its subcategories
+        products = _category_products(category_tree, selected_category)
+        total_count = get_category_counts([selected_category.id])[
+            selected_category.id
+        ].total_product_count
+    else:
+        total_count = count_active_products()
 
+    pagination = _keyset_page(request, products)
     return render(
         request,
         "products/product_list.html",
         {
             "categories": categories,
-            "products": products,
+            "products": pagination["page"],
             "selected_category": selected_category,
+            "total_count": total_count,
+            **pagination,
         },
     )
 
 
+def api_product_list(request):
+    """JSON API for infinite scrolling through product listings"""
+    products = Product.objects.filter(is_active=True, parent=None)
+    category_filter = request.GET.get("category")
+    if category_filter:
+        category_tree = get_category_tree()
+        category = category_tree.get_by_slug(category_filter)
+        if category is None:
+            return JsonResponse(
+                {"success": False, "error": "Category not found"}, status=404
+            )
+        products = _category_products(category_tree, category)
+
+    try:
+        page = paginate_products(
+            products.select_related("category"),
+            request.GET.get("sort"),
+            request.GET.get("cursor"),
+            per_page=_per_page(request, 24, 100),
+        )
+    except InvalidCursor:
+        return JsonResponse({"success": False, "error": "Invalid cursor"}, status=400)
+
+    return JsonResponse(
+        {
+            "success": True,
+            "sort": page.sort,
+            "results": [_product_json(product) for product in page],
+            "next_cursor": page.next_cursor,
+            "has_next": page.has_next,
+        }
+    )
+
+
+def _search_page(request, default_per_page=12, max_per_page=50):
+    """Run the search in ``q`` and return the requested page of results"""
+    query = request.GET.get("q", "").strip()
+    per_page = _per_page(request, default_per_page, max_per_page)
+
+    paginator = Paginator(search_products(query), per_page)
+    page = request.GET.get("page", 1)
+
+    try:
+        products = paginator.page(page)
+    except PageNotAnInteger:
+        # If page is not an integer, deliver first page
+        products = paginator.page(1)
+    except EmptyPage:
+        # If page is out of range, deliver last page
+        products = paginator.page(paginator.num_pages)
+    return query, products
+
+
+def search_view(request):
+    """View for full-text product search with ranked, paginated results"""
+    query, products = _search_page(request)
+    return render(
+        request,
+        "products/search.html",
+        {
+            "query": query,
+            "products": products,
+            "total_count": products.paginator.count,
+        },
+    )
+
+
+def api_search(request):
+    """JSON API for full-text product search"""
+    query, products = _search_page(request, default_per_page=20)
+    results = [_product_json(product) for product in products]
+    return JsonResponse(
+        {
+            "success": True,
+            "query": query,
+            "results": results,
+            "count": products.paginator.count,
+            "page": products.number,
+            "num_pages": products.paginator.num_pages,
+            "has_next": products.has_next(),
+        }
+    )
+
+
 def product_detail_view(request, slug):
     """View for displaying a single product's details with variations support"""
     product = get_object_or_404(Product, slug=slug, is_active=True)
@@ -52,34 +215,16 @@ def product_detail_view(request, slug):
         return redirect("product_detail", slug=product.parent.slug)
 
     # Get all active variations for this product
-    product_variations = product.variants.filter(is_active=True).order_by("price")
-
-    # If this product has no variations, create a list with just itself for consistency
-    if not product_variations.exists():
-        # Check if this product is actually a variation that should be grouped
-        # by looking for products with the same name pattern
-        base_name = (
-            product.name.split(" - ")[0]
-            if " - " in product.name
-            else product.name.split(" (")[0] if " (" in product.name else product.name
-        )
+    product_variations = list(product.variants.filter(is_active=True).order_by("price"))
 
-        potential_variations = Product.objects.filter(
-            name__icontains=base_name,
-            category=product.category,
-            is_active=True,
-            parent__isnull=True,  # Only look at parent products
-        ).exclude(id=product.id)
-
-        if potential_variations.exists():
-            # Include the current product and potential variations
-            all_variations = [product] + list(potential_variations)
-            product_variations = all_variations
-        else:
-            product_variations = []
-    else:
+    if product_variations:
         # Add the parent product to the variations list
-        product_variations = [product] + list(product_variations)
+        product_variations = [product] + product_variations
+    else:
+        # Group products sold separately under the same base name, using the
+        # precomputed family index
+        family_members = list(get_family_members(product))
+        product_variations = [product] + family_members if family_members else []
 
     # Get truly related products (same category, different product family)
     related_products = Product.objects.filter(
@@ -95,6 +240,9 @@ def product_detail_view(request, slug):
 
     related_products = related_products[:4]
 
+    # Show available-to-promise stock (stock minus other shoppers' checkout holds)
+    annotate_available_stock([product] + list(product_variations), request.user)
+
     return render(
         request,
         "products/product_detail.html",
@@ -109,27 +257,24 @@ def product_detail_view(request, slug):
 
 def categories_view(request):
     """View for displaying all parent categories"""
-    categories = Category.objects.filter(active=True, parent=None)
+    category_tree = get_category_tree()
+    categories = category_tree.roots()
+
+    # Read the materialized product counts for every category shown in one query
+    category_ids = []
     for category in categories:
-        category.subcategory_count = category.children.filter(active=True).count()
-        # Add product count for the main category (including all subcategories)
-        # Get all subcategory IDs for this category
-        subcategory_ids = list(
-            category.children.filter(active=True).values_list("id", flat=True)
-        )
-        # Include the main category ID as well
-        all_category_ids = [category.id] + subcategory_ids
-        # Count products from main category and all its subcategories
-        category.product_count = Product.objects.filter(
-            category__id__in=all_category_ids, is_active=True, parent=None
-        ).count()
-        # Add the subcategories to each category with product counts
-        subcategories = category.children.filter(active=True)
-        for subcategory in subcategories:
-            subcategory.product_count = Product.objects.filter(
-                category=subcategory, is_active=True, parent=None
-            ).count()
-        category.subcategories = subcategories
+        category.subcategories = category_tree.children(category.id)
+        category_ids.append(category.id)
+        category_ids.extend(subcategory.id for subcategory in category.subcategories)
+    counts = get_category_counts(category_ids)
+
+    for category in categories:
+        category_counts = counts[category.id]
+        category.subcategory_count = category_counts.subcategory_count
+        # Product count for the main category (including all subcategories)
+        category.product_count = category_counts.total_product_count
+        for subcategory in category.subcategories:
+            subcategory.product_count = counts[subcategory.id].product_count
     return render(request, "products/categories.html", {"categories": categories})
 
 
@@ -145,16 +290,13 @@ def category_detail_view(request, slug):
         Rendered category detail page
     """
     try:
-        category = get_object_or_404(Category, slug=slug, active=True)
+        category_tree = get_category_tree()
+        category = category_tree.get_by_slug(slug)
+        if category is None:
+            raise Http404("No Category matches the given query.")
 
         # Get active subcategories
-        subcategories = category.children.filter(active=True)
-
-        # Add product count to each subcategory
-        for subcategory in subcategories:
-            subcategory.product_count = Product.objects.filter(
-                category=subcategory, is_active=True, parent=None
-            ).count()
+        subcategories = category_tree.children(category.id)
 
         # Add the subcategories property to the category object for consistency
         category.subcategories = subcategories
@@ -164,102 +306,66 @@ def category_detail_view(request, slug):
         selected_subcategory = None
 
         # Determine which products to show based on filtering
-        if subcategory_filter and subcategories.exists():
-            try:
-                selected_subcategory = subcategories.get(slug=subcategory_filter)
-                # Show products from the selected subcategory only
-                products = Product.objects.filter(
-                    category=selected_subcategory,
-                    is_active=True,
-                    parent=None,  # Only show parent products, not variants
-                )
-            except Category.DoesNotExist:
-                # If subcategory doesn't exist, show all products in the main category
-                # Get all products from this category and its subcategories
-                subcategory_ids = list(subcategories.values_list("id", flat=True))
-                all_category_ids = [category.id] + subcategory_ids
-                products = Product.objects.filter(
-                    category__id__in=all_category_ids,
-                    is_active=True,
-                    parent=None,
-                )
+        if subcategory_filter and subcategories:
+            selected_subcategory = next(
+                (s for s in subcategories if s.slug == subcategory_filter), None
+            )
+
+        if selected_subcategory:
+            # Show products from the selected subcategory only
+            products = Product.objects.filter(
+                category=selected_subcategory,
+                is_active=True,
+                parent=None,  # Only show parent products, not variants
+            )
         else:
             # Show all products from this category and its subcategories
-            if subcategories.exists():
-                subcategory_ids = list(subcategories.values_list("id", flat=True))
-                all_category_ids = [category.id] + subcategory_ids
-                products = Product.objects.filter(
-                    category__id__in=all_category_ids,
-                    is_active=True,
-                    parent=None,
-                )
-            else:
-                # No subcategories, just show products from this category
-                products = Product.objects.filter(
-                    category=category,
-                    is_active=True,
-                    parent=None,
-                )
+            products = _category_products(category_tree, category)
 
         # Get related categories
-        related_categories = []
-        if category.parent:
+        if category.parent_id:
             # If this is a subcategory, get sibling categories
-            related_categories = category.parent.children.filter(active=True).exclude(
-                id=category.id
-            )[
-                :6
-            ]  # Limit to 6 related categories
+            related_categories = category_tree.children(category.parent_id)
         else:
             # If this is a parent category, get other parent categories
-            related_categories = Category.objects.filter(
-                parent=None, active=True
-            ).exclude(id=category.id)[
-                :6
-            ]  # Limit to 6 related categories
+            related_categories = category_tree.roots()
+        related_categories = [
+            related for related in related_categories if related.id != category.id
+        ][
+            :6
+        ]  # Limit to 6 related categories
+
+        # Get all parent categories (for breadcrumb navigation)
+        parent_categories = category_tree.roots()
 
-        # Add product counts to related categories
+        # Read the materialized product counts in one query
+        counts = get_category_counts(
+            [category.id]
+            + [subcategory.id for subcategory in subcategories]
+            + [related_category.id for related_category in related_categories]
+        )
+        for subcategory in subcategories:
+            subcategory.product_count = counts[subcategory.id].product_count
         for related_category in related_categories:
-            if related_category.children.exists():
-                # Include products from subcategories
-                subcategory_ids = list(
-                    related_category.children.filter(active=True).values_list(
-                        "id", flat=True
-                    )
-                )
-                all_category_ids = [related_category.id] + subcategory_ids
-                related_category.product_count = Product.objects.filter(
-                    category__id__in=all_category_ids, is_active=True, parent=None
-                ).count()
-            else:
-                related_category.product_count = Product.objects.filter(
-                    category=related_category, is_active=True, parent=None
-                ).count()
+            # Includes products from active subcategories
+            related_category.product_count = counts[
+                related_category.id
+            ].total_product_count
 
-        # Get all parent categories (for breadcrumb navigation)
-        parent_categories = Category.objects.filter(parent=None, active=True)
-
-        # Calculate total product count for this category (including subcategories)
-        if subcategories.exists():
-            subcategory_ids = list(subcategories.values_list("id", flat=True))
-            all_category_ids = [category.id] + subcategory_ids
-            total_product_count = Product.objects.filter(
-                category__id__in=all_category_ids, is_active=True, parent=None
-            ).count()
-        else:
-            total_product_count = Product.objects.filter(
-                category=category, is_active=True, parent=None
-            ).count()
+        # Total product count for this category (including subcategories)
+        total_product_count = counts[category.id].total_product_count
 
+        pagination = _keyset_page(request, products)
         context = {
             "category": category,
             "subcategories": subcategories,
             "selected_subcategory": selected_subcategory,
             "related_categories": related_categories,
             "parent_categories": parent_categories,
-            "products": products,
+            "products": pagination["page"],
             "total_product_count": total_product_count,
-            "has_subcategories": subcategories.exists(),
+            "has_subcategories": bool(subcategories),
+            **pagination,
         }
         return render(request, "products/category_detail.html", context)
     except Category.DoesNotExist:
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the browse -> cart -> checkout flow.
+
+Concurrent virtual users log in as the seeded shoppers and repeatedly walk
+home -> category -> product detail -> add to cart -> update quantity ->
+checkout against a running server. Latency percentiles (p50/p95/p99),
+throughput and error rate are reported per endpoint as JSON, so runs of two
+releases can be compared side by side.
+
+Uses only the standard library. Typical run against a fresh database:
+
+    python manage.py migrate --settings=...
+    python manage.py seed_benchmark_data --shoppers 20
+    python manage.py runserver --noreload 8000
+    python scripts/benchmark_flows.py --users 20 --duration 60 --output run.json
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib import error, parse, request
+
+STEPS = [
+    "home",
+    "category",
+    "product_detail",
+    "add_to_cart",
+    "update_quantity",
+    "checkout",
+]
+
+
+class NoRedirect(request.HTTPRedirectHandler):
+    """Report redirects as responses instead of following them"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Recorder:
+    """Thread-safe collection of (latency, ok) samples per endpoint"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+
+    def add(self, endpoint, latency_ms, ok):
+        with self.lock:
+            self.samples[endpoint].append((latency_ms, ok))
+
+
+class VirtualUser:
+    """One shopper with their own cookies (session and CSRF token)"""
+
+    def __init__(self, base_url, recorder, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.recorder = recorder
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = request.build_opener(
+            request.HTTPCookieProcessor(self.cookies), NoRedirect()
+        )
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == "csrftoken":
+                return cookie.value
+        return ""
+
+    def call(self, endpoint, path, data=None, ajax=False):
+        """Request ``path``, POSTing ``data`` if given, and record the result"""
+        headers = {"User-Agent": "grocerygo-benchmark"}
+        body = None
+        if data is not None:
+            data = {"csrfmiddlewaretoken": self.csrf_token(), **data}
+            body = parse.urlencode(data).encode()
+            headers["X-CSRFToken"] = self.csrf_token()
+            headers["Referer"] = self.base_url + path
+        if ajax:
+            headers["X-Requested-With"] = "XMLHttpRequest"
+
+        req = request.Request(self.base_url + path, data=body, headers=headers)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                response.read()
+                status = response.status
+        except error.HTTPError as e:
+            # Redirects land here too, since they are not followed
+            e.read()
+            status = e.code
+        except (error.URLError, OSError):
+            status = None
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        ok = status is not None and status < 400
+        if endpoint:
+            self.recorder.add(endpoint, latency_ms, ok)
+        return status
+
+    def login(self, username, password):
+        self.call(None, "/accounts/login/")
+        status = self.call(
+            "login",
+            "/accounts/login/",
+            data={"username": username, "password": password},
+        )
+        # A successful login redirects; a failed one re-renders the form
+        return status == 302
+
+    def run_flow(self, category, product):
+        self.call("home", "/")
+        self.call("category", f"/category/{category}/")
+        self.call("product_detail", f"/product/{product}/")
+        self.call("add_to_cart", f"/cart/add/{product}/", data={"quantity": "1"})
+        self.call(
+            "update_quantity",
+            f"/cart/update/{product}/",
+            data={"quantity": "2"},
+            ajax=True,
+        )
+        self.call("checkout", "/orders/checkout/")
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return round(sorted_values[rank - 1], 2)
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(latency for latency, _ in samples)
+    errors = sum(1 for _, ok in samples if not ok)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": round(errors / len(samples), 4) if samples else 0.0,
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "mean": (round(sum(latencies) / len(latencies), 2) if latencies else None),
+            "max": round(latencies[-1], 2) if latencies else None,
+        },
+    }
+
+
+def run(args, fixture):
+    recorder = Recorder()
+    shoppers = fixture["shoppers"][: args.users]
+    if len(shoppers) < args.users:
+        sys.exit(
+            f"The fixture has {len(shoppers)} shoppers; seed at least "
+            f"{args.users} or lower --users"
+        )
+
+    deadline = time.monotonic() + args.duration
+    failed_logins = []
+
+    def virtual_user(index, username):
+        rng = random.Random(args.seed + index)
+        user = VirtualUser(args.url, recorder, args.timeout)
+        if not user.login(username, fixture["password"]):
+            failed_logins.append(username)
+            return
+        flows = 0
+        while time.monotonic() < deadline:
+            if args.iterations and flows >= args.iterations:
+                break
+            user.run_flow(
+                rng.choice(fixture["categories"]), rng.choice(fixture["products"])
+            )
+            flows += 1
+            if args.think_ms:
+                time.sleep(args.think_ms / 1000)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=len(shoppers)) as pool:
+        for index, username in enumerate(shoppers):
+            pool.submit(virtual_user, index, username)
+    elapsed = time.monotonic() - started
+
+    samples = recorder.samples
+    flow_samples = [sample for step in STEPS for sample in samples.get(step, [])]
+    return {
+        "base_url": args.url,
+        "users": len(shoppers),
+        "duration_s": round(elapsed, 2),
+        "failed_logins": len(failed_logins),
+        "endpoints": {
+            step: summarize(samples.get(step, []), elapsed)
+            for step in ["login"] + STEPS
+        },
+        "overall": summarize(flow_samples, elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument(
+        "--fixture",
+        default="benchmark_fixture.json",
+        help="Fixture written by `manage.py seed_benchmark_data`",
+    )
+    parser.add_argument("--users", type=int, default=10, help="Concurrent users")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run for")
+    parser.add_argument(
+        "--iterations",
+        type=int,
+        default=0,
+        help="Stop each user after this many flows (0: run for --duration)",
+    )
+    parser.add_argument("--think-ms", type=int, default=0, help="Pause between flows")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    with open(args.fixture) as f:
+        fixture = json.load(f)
+
+    report = run(args, fixture)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()